@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify, send_file, current_app
-from models import db, Transaction, InventoryItem, Business 
-from business import get_user_id, get_member_role, role_required
+from models import db, Transaction, InventoryItem, Business, ItemDailySales
+from business import get_token_member, role_required
 from sqlalchemy import func
 from datetime import datetime, timedelta
 import numpy as np
@@ -10,6 +10,8 @@ import io
 import pandas as pd
 from fpdf import FPDF
 from ai_forecaster import run_analysis
+import rollups
+from analytics_cache import cached_response, cached_view, etag_view
 
 ai_bp = Blueprint("ai", __name__)
 
@@ -38,14 +40,15 @@ def get_dashboard_stats(business_id):
         return jsonify({"error": "Unauthorized"}), 401
 
     token = auth.split(" ")[1]
-    user_id = get_user_id(token)
-
-    role = get_member_role(user_id, business_id)
+    user_id, role = get_token_member(token, business_id)
     if not role:
         return jsonify({"error": "Forbidden"}), 403
 
     granularity = request.args.get("granularity", "monthly") # daily, weekly, monthly
+    return cached_response("dashboard", business_id, {"granularity": granularity},
+                           lambda: _dashboard_stats(business_id, granularity))
 
+def _dashboard_stats(business_id, granularity):
     # Date Filtering
     end_date = datetime.utcnow()
     if granularity == 'daily':
@@ -55,25 +58,24 @@ def get_dashboard_stats(business_id):
     else: # monthly (default)
         start_date = end_date - timedelta(days=30)
 
-    # 1. CORE STATS
-    total_sales = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.business_id == business_id, 
-        Transaction.type == "Sale",
-        Transaction.timestamp >= start_date
-    ).scalar() or 0
+    today = datetime.now()
+    first_of_this_month = today.replace(day=1)
+    last_month_end = first_of_this_month - timedelta(days=1)
+    first_of_last_month = last_month_end.replace(day=1)
+
+    # 1. CORE STATS + 2. RECENT PERFORMANCE
+    # One conditional-aggregate pass over the daily rollup; windows are whole days ending today.
+    totals = rollups.window_totals(business_id, {
+        "period": (start_date.date() + timedelta(days=1), end_date.date()),
+        "this_month": (first_of_this_month.date(), None),
+        "last_month": (first_of_last_month.date(), last_month_end.date()),
+    })
+    total_sales = totals["period"]["sales"]
 
     # Total COGS
-    total_cogs = db.session.query(func.sum(Transaction.cogs)).filter(
-        Transaction.business_id == business_id, 
-        Transaction.type == "Sale",
-        Transaction.timestamp >= start_date
-    ).scalar() or 0
-
-    total_expenses = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.business_id == business_id, 
-        Transaction.type == "Expense",
-        Transaction.timestamp >= start_date
-    ).scalar() or 0
+    total_cogs = totals["period"]["cogs"]
+
+    total_expenses = totals["period"]["expenses"]
 
     gross_profit = total_sales - total_cogs
     # Net Profit = Gross - Expenses
@@ -83,64 +85,51 @@ def get_dashboard_stats(business_id):
     # db.session.query(func.sum(Transaction.profit))... should equal net_profit ideally.
     # We stick to calculated for consistency with user code style.
 
-    # 2. RECENT PERFORMANCE
-    today = datetime.now()
-    first_of_this_month = today.replace(day=1)
-    last_month_end = first_of_this_month - timedelta(days=1)
-    first_of_last_month = last_month_end.replace(day=1)
+    recent_sales = totals["this_month"]["sales"]
+    recent_expenses = totals["this_month"]["expenses"]
+
+    last_month_sales = totals["last_month"]["sales"]
+    last_month_expenses = totals["last_month"]["expenses"]
+
+    # Chart buckets (period analysis, 6-month trend, 60-day sales series) all come
+    # from one GROUP BY day read of the rollup, summed per bucket in memory.
+    if granularity == "daily":
+        points = 7
+        delta_unit = timedelta(days=1)
+        label_fmt = "%a"
+    elif granularity == "monthly":
+        points = 6
+        delta_unit = timedelta(days=30)
+        label_fmt = "%b"
+    else: # weekly
+        points = 4
+        delta_unit = timedelta(weeks=1)
+        label_fmt = "Week %w"
+
+    sixty_days_ago = today - timedelta(days=60)
+    trend_start = (today.replace(day=1) - timedelta(days=5*30)).replace(day=1)
+    chart_start = today - delta_unit * points
+    series_start = min(sixty_days_ago, trend_start, chart_start).date()
+    daily = rollups.daily_totals(business_id, series_start, None)
 
-    recent_sales = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.business_id == business_id,
-        Transaction.type == "Sale",
-        Transaction.timestamp >= first_of_this_month
-    ).scalar() or 0
-
-    recent_expenses = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.business_id == business_id,
-        Transaction.type == "Expense",
-        Transaction.timestamp >= first_of_this_month
-    ).scalar() or 0
-
-    last_month_sales = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.business_id == business_id,
-        Transaction.type == "Sale",
-        Transaction.timestamp >= first_of_last_month,
-        Transaction.timestamp <= last_month_end
-    ).scalar() or 0
-
-    last_month_expenses = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.business_id == business_id,
-        Transaction.type == "Expense",
-        Transaction.timestamp >= first_of_last_month,
-        Transaction.timestamp <= last_month_end
-    ).scalar() or 0
+    def bucket_sum(start_day, end_day, txn_type):
+        return sum(row[2] for row in daily if row[1] == txn_type and start_day <= row[0] <= end_day)
 
     # 3. AI DEMAND FORECASTING (Linear Regression)
     # Get daily sales for the last 60 days to train the model
-    sixty_days_ago = today - timedelta(days=60)
-    daily_sales = db.session.query(
-        func.date(Transaction.timestamp),
-        func.sum(Transaction.amount)
-    ).filter(
-        Transaction.business_id == business_id,
-        Transaction.type == "Sale",
-        Transaction.timestamp >= sixty_days_ago
-    ).group_by(func.date(Transaction.timestamp)).order_by(func.date(Transaction.timestamp)).all()
-
-    sales_series = [float(s[1]) for s in daily_sales]
+    sales_series = [row[2] for row in daily if row[1] == "Sale" and row[0] >= sixty_days_ago.date()]
     predicted_monthly_revenue = predict_demand(sales_series) * 30 if sales_series else 0
 
     # 4. REORDER RECOMMENDATIONS
     products = Product.query.filter_by(business_id=business_id).all()
     reorder_list = []
+
+    # Units sold per product over the last 28 days, one grouped read of the item rollup
+    sold_28d = rollups.item_quantities(business_id, (today - timedelta(days=28)).date(), None)
     
     for p in products:
         # Get weekly sales velocity for this product
-        p_sales = db.session.query(func.sum(Transaction.quantity)).filter(
-            Transaction.inventory_item_id == p.id,
-            Transaction.type == "Sale",
-            Transaction.timestamp >= (today - timedelta(days=28))
-        ).scalar() or 0
+        p_sales = sold_28d.get(p.id, 0)
         
         # Simple velocity: units per week
         vel = p_sales / 4
@@ -164,11 +153,7 @@ def get_dashboard_stats(business_id):
     
     for p in products:
         # Get sales velocity (units/day)
-        p_sales_28d = db.session.query(func.sum(Transaction.quantity)).filter(
-            Transaction.inventory_item_id == p.id,
-            Transaction.type == "Sale",
-            Transaction.timestamp >= (today - timedelta(days=28))
-        ).scalar() or 0
+        p_sales_28d = sold_28d.get(p.id, 0)
         
         velocity = p_sales_28d / 28
         # Using selling_price - cost_price (calculated profit margin)
@@ -226,32 +211,12 @@ def get_dashboard_stats(business_id):
     period_analysis = []
     expense_series = [] # For expense forecasting
 
-    if granularity == "daily":
-        points = 7
-        delta_unit = timedelta(days=1)
-        label_fmt = "%a"
-    elif granularity == "monthly":
-        points = 6
-        delta_unit = timedelta(days=30)
-        label_fmt = "%b"
-    else: # weekly
-        points = 4
-        delta_unit = timedelta(weeks=1)
-        label_fmt = "Week %w"
-
     for i in range(points):
         end_date = today - (delta_unit * (points - 1 - i))
         start_date = end_date - delta_unit
         
-        p_sales = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.business_id == business_id, Transaction.type == "Sale",
-            Transaction.timestamp > start_date, Transaction.timestamp <= end_date
-        ).scalar() or 0
-        
-        p_expenses = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.business_id == business_id, Transaction.type == "Expense",
-            Transaction.timestamp > start_date, Transaction.timestamp <= end_date
-        ).scalar() or 0
+        p_sales = bucket_sum(start_date.date() + timedelta(days=1), end_date.date(), "Sale")
+        p_expenses = bucket_sum(start_date.date() + timedelta(days=1), end_date.date(), "Expense")
         
         expense_series.append(float(p_expenses))
 
@@ -267,13 +232,7 @@ def get_dashboard_stats(business_id):
         })
 
     # 7. EXPENSE BREAKDOWN (Category-wise)
-    expense_breakdown = db.session.query(
-        Transaction.category,
-        func.sum(Transaction.amount)
-    ).filter(
-        Transaction.business_id == business_id,
-        Transaction.type == "Expense"
-    ).group_by(Transaction.category).all()
+    expense_breakdown = [(c, a) for c, _, a in rollups.category_totals(business_id, txn_type="Expense")]
 
     # 8. MONTHLY PROFIT TREND (Last 6 Months)
     monthly_profit_trend = []
@@ -281,15 +240,8 @@ def get_dashboard_stats(business_id):
         m_start = (today.replace(day=1) - timedelta(days=i*30)).replace(day=1)
         m_end = (m_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
         
-        m_sales = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.business_id == business_id, Transaction.type == "Sale",
-            Transaction.timestamp >= m_start, Transaction.timestamp <= m_end
-        ).scalar() or 0
-        
-        m_expenses = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.business_id == business_id, Transaction.type == "Expense",
-            Transaction.timestamp >= m_start, Transaction.timestamp <= m_end
-        ).scalar() or 0
+        m_sales = bucket_sum(m_start.date(), m_end.date(), "Sale")
+        m_expenses = bucket_sum(m_start.date(), m_end.date(), "Expense")
         
         monthly_profit_trend.append({
             "month": m_start.strftime("%b"),
@@ -327,16 +279,15 @@ def get_dashboard_stats(business_id):
                 {"name": n, "total_profit": float(tp)}
                 for n, tp in db.session.query(
                     Product.name,
-                    func.sum(Transaction.profit)
-                ).join(Transaction, Transaction.inventory_item_id == Product.id).filter(
-                    Product.business_id == business_id, Transaction.type == "Sale"
-                ).group_by(Product.id).order_by(func.sum(Transaction.profit).desc()).limit(5).all()
+                    func.sum(ItemDailySales.profit)
+                ).join(ItemDailySales, ItemDailySales.inventory_item_id == Product.id).filter(
+                    Product.business_id == business_id
+                ).group_by(Product.id).order_by(func.sum(ItemDailySales.profit).desc()).limit(5).all()
             ],
             "low_stock": [
-                {"name": n, "stock": s}
-                for n, s in db.session.query(Product.name, Product.stock_quantity).filter(
-                    Product.business_id == business_id, Product.stock_quantity <= Product.reorder_level
-                ).all()
+                {"name": p.name, "stock": p.stock_quantity}
+                for p in products
+                if p.stock_quantity is not None and p.reorder_level is not None and p.stock_quantity <= p.reorder_level
             ]
         }
     })
@@ -348,9 +299,10 @@ def get_csv_analysis(business_id):
     
     granularity = request.args.get("granularity", "weekly")
     
-    # Check uploads in backend dir
+    # Check uploads in the import folder (backend dir by default)
     backend_dir = os.path.dirname(os.path.abspath(__file__))
-    backend_csv = os.path.join(backend_dir, f"sales_data_{business_id}.csv")
+    import_dir = current_app.config.get("IMPORT_FOLDER", backend_dir)
+    backend_csv = os.path.join(import_dir, f"sales_data_{business_id}.csv")
     
     file_path = backend_csv
     
@@ -365,10 +317,9 @@ def get_csv_analysis(business_id):
     return jsonify(result)
 
 @ai_bp.route("/businesses/<int:business_id>/ai/export-data", methods=["GET"])
+@role_required(['Owner', 'Accountant', 'Analyst'])
+@etag_view("export-data")
 def export_ai_data(business_id):
-    auth = request.headers.get("Authorization")
-    if not auth: return jsonify({"error": "Unauthorized"}), 401
-
     results = db.session.query(
         Transaction.timestamp, Transaction.category, Product.name,
         Transaction.quantity, Transaction.amount, Transaction.cogs
@@ -395,8 +346,7 @@ def export_report_excel(business_id):
     if not auth: return jsonify({"error": "Unauthorized"}), 401
 
     token = auth.split(" ")[1]
-    user_id = get_user_id(token)
-    role = get_member_role(user_id, business_id)
+    user_id, role = get_token_member(token, business_id)
     if not role: return jsonify({"error": "Forbidden"}), 403
 
     # Fetch Data
@@ -466,20 +416,20 @@ def export_report_pdf(business_id):
         if not auth: return jsonify({"error": "Unauthorized"}), 401
 
         token = auth.split(" ")[1]
-        user_id = get_user_id(token)
-        role = get_member_role(user_id, business_id)
+        user_id, role = get_token_member(token, business_id)
         if not role: return jsonify({"error": "Forbidden"}), 403
 
         business = Business.query.get(business_id)
         if not business: return jsonify({"error": "Business not found"}), 404
         
         # Financial Stats
-        total_sales = db.session.query(func.sum(Transaction.amount)).filter_by(business_id=business_id, type='Sale').scalar() or 0
-        total_expenses = db.session.query(func.sum(Transaction.amount)).filter_by(business_id=business_id, type='Expense').scalar() or 0
+        totals = rollups.period_totals(business_id)
+        total_sales = totals["sales"]
+        total_expenses = totals["expenses"]
         net_profit = total_sales - total_expenses
         
         # Category breakdown for PDF
-        expenses = db.session.query(Transaction.category, func.sum(Transaction.amount)).filter_by(business_id=business_id, type='Expense').group_by(Transaction.category).all()
+        expenses = [(c, a) for c, _, a in rollups.category_totals(business_id, txn_type='Expense')]
 
         class PDF(FPDF):
             def header(self):
@@ -557,26 +507,15 @@ def export_report_pdf(business_id):
 
 @ai_bp.route("/businesses/<int:business_id>/ai/advanced-analytics", methods=["GET"])
 @role_required(['Owner', 'Accountant', 'Analyst'])
+@cached_view('advanced-analytics')
 def get_advanced_analytics(business_id):
     # Fetch Daily Trends (Last 30 Days)
     end_date = datetime.now()
     start_date = end_date - timedelta(days=30)
     
-    daily_txns = db.session.query(
-        func.date(Transaction.timestamp).label('date'),
-        Transaction.type,
-        func.sum(Transaction.amount).label('total')
-    ).filter(
-        Transaction.business_id == business_id,
-        Transaction.timestamp >= start_date,
-        Transaction.timestamp <= end_date
-    ).group_by(
-        func.date(Transaction.timestamp), 
-        Transaction.type
-    ).all()
-    
     daily_data = {}
-    for date_str, txn_type, amount in daily_txns:
+    for day, txn_type, amount, _, _, _ in rollups.daily_totals(business_id, start_date.date(), end_date.date()):
+        date_str = day.isoformat()
         if date_str not in daily_data:
             daily_data[date_str] = {"date": date_str, "sales": 0, "expenses": 0}
         
@@ -588,16 +527,7 @@ def get_advanced_analytics(business_id):
     sorted_daily = sorted(daily_data.values(), key=lambda x: x['date'])
     
     # Category Breakdown
-    cat_txns = db.session.query(
-        Transaction.category,
-        Transaction.type,
-        func.sum(Transaction.amount)
-    ).filter(
-        Transaction.business_id == business_id
-    ).group_by(
-        Transaction.category,
-        Transaction.type
-    ).all()
+    cat_txns = rollups.category_totals(business_id)
     
     sales_by_cat = []
     expenses_by_cat = []
@@ -4,50 +4,162 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import Pipeline
 from datetime import datetime, timedelta
+from analytics_cache import MemoryCacheBackend
+import model_registry
+import business_classifier
 import json
+import re
+import threading
 
 # Pre-defined categories for classification
 EXPENSE_CATEGORIES = ["Rent", "Utilities", "Inventory", "Salaries", "Marketing", "Others"]
+# Below this probability a suggestion falls back to "Others"
+CLASSIFY_MIN_CONFIDENCE = 0.4
+# Shop descriptions repeat heavily ("Electricity bill", "Milk stock"), so suggestions
+# are memoised per normalised description; cleared whenever the model changes
+CLASSIFY_CACHE_MAX_ENTRIES = 4096
+CLASSIFY_CACHE_TTL = 24 * 3600
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+# Basic training data for bootstrap
+CLASSIFIER_TRAINING_DATA = [
+    ("Monthly store rent payment", "Rent"),
+    ("Electricity bill for January", "Utilities"),
+    ("Water and sewage bill", "Utilities"),
+    ("Bulk purchase of groceries", "Inventory"),
+    ("Buying milk and bread for stock", "Inventory"),
+    ("Salary payment for staff", "Salaries"),
+    ("Employee monthly wages", "Salaries"),
+    ("Google Ads campaign", "Marketing"),
+    ("Facebook promotion", "Marketing"),
+    ("Office supplies and stationery", "Others"),
+    ("Cleaning services", "Others")
+]
+# Bump when the pipeline itself changes, so saved artefacts are refitted
+CLASSIFIER_VERSION = 1
+
+
+def normalise_description(description):
+    """Lower-case, punctuation-free, single-spaced form used as the cache key."""
+    return _NON_WORD.sub(' ', str(description or '').lower()).strip()
+
+def item_sales_from_transactions(inventory_items, transactions, days=90):
+    """
+    Build the same dense per-item structure as rollups.item_sales() from an in-memory
+    transaction list (dicts with inventory_item_id/type/quantity/amount/profit/timestamp).
+    """
+    item_ids = [i['id'] for i in inventory_items]
+    index = {item_id: n for n, item_id in enumerate(item_ids)}
+    end_day = datetime.utcnow().date()
+    start_day = end_day - timedelta(days=days - 1)
+
+    quantity = np.zeros((len(item_ids), days))
+    volume = np.zeros(len(item_ids))
+    revenue = np.zeros(len(item_ids))
+    profit = np.zeros(len(item_ids))
+    count = np.zeros(len(item_ids), dtype=int)
+    for t in transactions:
+        k = index.get(t.get('inventory_item_id'))
+        if k is None or t.get('type') != 'Sale':
+            continue
+        qty = t.get('quantity', 0) or 0
+        volume[k] += qty
+        revenue[k] += t.get('amount', 0) or 0
+        profit[k] += t.get('profit', 0) or 0
+        count[k] += 1
+        day = datetime.fromisoformat(t['timestamp']).date()
+        if start_day <= day <= end_day:
+            quantity[k, (day - start_day).days] += qty
+
+    return {
+        "item_ids": item_ids, "start_day": start_day, "end_day": end_day,
+        "quantity": quantity, "volume": volume, "revenue": revenue, "profit": profit, "count": count
+    }
+
+def fit_expense_classifier(samples):
+    X, y = zip(*samples)
+
+    pipeline = Pipeline([
+        ('tfidf', TfidfVectorizer()),
+        ('clf', LogisticRegression())
+    ])
+
+    pipeline.fit(X, y)
+    return pipeline
+
 
 class BulkBinsAIService:
     def __init__(self):
-        self.classifier = self._initialize_classifier()
-
-    def _initialize_classifier(self):
-        # Basic training data for bootstrap
-        data = [
-            ("Monthly store rent payment", "Rent"),
-            ("Electricity bill for January", "Utilities"),
-            ("Water and sewage bill", "Utilities"),
-            ("Bulk purchase of groceries", "Inventory"),
-            ("Buying milk and bread for stock", "Inventory"),
-            ("Salary payment for staff", "Salaries"),
-            ("Employee monthly wages", "Salaries"),
-            ("Google Ads campaign", "Marketing"),
-            ("Facebook promotion", "Marketing"),
-            ("Office supplies and stationery", "Others"),
-            ("Cleaning services", "Others")
-        ]
-        X, y = zip(*data)
-        
-        pipeline = Pipeline([
-            ('tfidf', TfidfVectorizer()),
-            ('clf', LogisticRegression())
-        ])
-        
-        pipeline.fit(X, y)
-        return pipeline
-
-    def classify_expense(self, description):
-        if not description:
-            return "Others"
-        
-        prediction = self.classifier.predict([description])[0]
-        # Get probability to check confidence (optional)
-        probs = self.classifier.predict_proba([description])[0]
-        confidence = np.max(probs)
-        
-        return prediction if confidence > 0.4 else "Others"
+        # Nothing is fitted here: the classifier is loaded from the model registry
+        # (or trained once and saved) on first use
+        self._classifier = None
+        self._classifier_lock = threading.Lock()
+        self.classify_cache = MemoryCacheBackend(max_entries=CLASSIFY_CACHE_MAX_ENTRIES, ttl=CLASSIFY_CACHE_TTL)
+
+    @property
+    def classifier(self):
+        if self._classifier is None:
+            with self._classifier_lock:
+                if self._classifier is None:
+                    self._classifier = model_registry.get_or_train(
+                        'expense_classifier', CLASSIFIER_TRAINING_DATA, fit_expense_classifier,
+                        version=CLASSIFIER_VERSION)
+                    self.classify_cache.clear()
+        return self._classifier
+
+    def classify_expense(self, description, business_id=None):
+        return self.classify_expenses([description], business_id=business_id)[0]
+
+    def classify_expenses(self, descriptions, business_id=None):
+        """Suggested category for each description, in order.
+
+        Cached descriptions are answered from the LRU; the rest are de-duplicated and
+        go through one TF-IDF transform and one predict_proba call. With a business_id
+        whose own model has learned enough, its confident answers take precedence.
+        """
+        keys = [normalise_description(d) for d in descriptions]
+        model = self.business_model(business_id)
+        # Business answers are keyed by the model's feed position, so a refit misses the cache
+        prefix = f"{business_id}@{model['seq']}:" if model else ""
+        results = {}
+        misses = []
+        for key in set(keys):
+            if not key:
+                results[key] = "Others"
+                continue
+            cached = self.classify_cache.get(prefix + key)
+            if cached is not None:
+                self.classify_cache.stats.incr('hits')
+                results[key] = cached
+            else:
+                misses.append(key)
+
+        if misses:
+            self.classify_cache.stats.incr('misses', len(misses))
+            probs = self.classifier.predict_proba(misses)
+            best = probs.argmax(axis=1)
+            classes = self.classifier.classes_
+            suggestions = [str(classes[k]) if row[k] > CLASSIFY_MIN_CONFIDENCE else "Others"
+                           for k, row in zip(best, probs)]
+            if model:
+                for n, (category, p) in enumerate(business_classifier.predict(model, misses)):
+                    if p > CLASSIFY_MIN_CONFIDENCE:
+                        suggestions[n] = category
+            for key, suggestion in zip(misses, suggestions):
+                self.classify_cache.set(prefix + key, suggestion)
+                results[key] = suggestion
+
+        return [results[key] for key in keys]
+
+    def business_model(self, business_id):
+        """The business's own classifier once it has learned from enough rows, else None."""
+        if not business_id:
+            return None
+        model = business_classifier.load(business_id)
+        if model is None or model["samples"] < business_classifier.MIN_SAMPLES:
+            return None
+        return model
 
     def predict_profit(self, transactions):
         """
@@ -110,72 +222,62 @@ class BulkBinsAIService:
             "expense_forecast": round(expense_forecast, 2)
         }
 
-    def get_demand_forecast(self, item_id, transactions):
+    def get_demand_forecast(self, daily_qty):
         """
         Predict next 7 and 30 day quantity demand for a specific item.
+        `daily_qty` is a dense per-day sales array for the item (oldest first, last = today),
+        e.g. one row of rollups.item_sales()['quantity'].
         Includes a simple seasonality heuristic (weekend vs weekday).
         """
-        if not transactions:
-            return {"7_day": 0, "30_day": 0, "velocity": 0, "predicted_demand": 0}
-
-        # Filter sales for this item
-        item_sales = [t for t in transactions if t.get('inventory_item_id') == item_id and t.get('type') == 'Sale']
-        if not item_sales:
+        series = np.asarray(daily_qty, dtype=float)
+        active = np.flatnonzero(series)
+        if active.size == 0:
             return {"7_day": 0, "30_day": 0, "velocity": 0, "predicted_demand": 0}
 
-        df = pd.DataFrame([{
-            'date': datetime.fromisoformat(t['timestamp']).date(),
-            'weekday': datetime.fromisoformat(t['timestamp']).weekday(), # 0-6
-            'quantity': t.get('quantity', 1)
-        } for t in item_sales])
-
-        daily_qty = df.groupby(['date', 'weekday'])['quantity'].sum().reset_index()
-        
-        # Velocity calculation (avg daily sales over last 30 active days)
-        velocity = daily_qty['quantity'].mean()
+        # Velocity calculation (avg quantity over the days that had sales)
+        quantity = series[active]
+        velocity = quantity.mean()
         
-        if len(daily_qty) < 2:
+        if len(quantity) < 2:
             val = round(velocity * 30, 2)
             return {"7_day": round(velocity * 7, 2), "30_day": val, "velocity": round(velocity, 2), "predicted_demand": val}
 
-        # Simple Trend/Linear Fit
-        daily_qty['day_num'] = (pd.to_datetime(daily_qty['date']) - pd.to_datetime(daily_qty['date'].min())).dt.days
-        z = np.polyfit(daily_qty['day_num'], daily_qty['quantity'], 1)
+        # Simple Trend/Linear Fit over the selling days, keeping their spacing
+        day_num = active - active[0]
+        z = np.polyfit(day_num, quantity, 1)
         p = np.poly1d(z)
 
-        last_day = daily_qty['day_num'].max()
-        pred_7 = sum(p(last_day + i) for i in range(1, 8))
-        pred_30 = sum(p(last_day + i) for i in range(1, 31))
+        preds = p(day_num[-1] + np.arange(1, 31))
+        pred_7 = preds[:7].sum()
 
         # Adjust for weekend seasonality (if weekends usually have 30% more volume)
         weekend_mult = 1.3
-        predicted_days = [datetime.now().date() + timedelta(days=i) for i in range(1, 31)]
-        pred_30_seasonal = 0
-        for i, dt in enumerate(predicted_days):
-            day_val = p(last_day + i + 1)
-            if dt.weekday() >= 5: # Sat/Sun
-                day_val *= weekend_mult
-            pred_30_seasonal += max(0, day_val)
-            
-        final_30 = max(0, round(pred_30_seasonal, 2))
+        today = datetime.now().date()
+        weekdays = np.array([(today + timedelta(days=i)).weekday() for i in range(1, 31)])
+        seasonal = np.where(weekdays >= 5, preds * weekend_mult, preds) # Sat/Sun
+        final_30 = max(0, round(float(np.maximum(seasonal, 0).sum()), 2))
 
         return {
-            "7_day": max(0, round(pred_7, 2)),
+            "7_day": max(0, round(float(pred_7), 2)),
             "30_day": final_30,
-            "velocity": round(velocity, 2),
+            "velocity": round(float(velocity), 2),
             "predicted_demand": final_30
         }
 
-    def recommend_reorders(self, inventory_items, transactions):
+    def recommend_reorders(self, inventory_items, item_sales):
         """
         Calculates optimal reorder quantities and categorizes urgency based on financial risk.
+        `item_sales` is the dense per-item structure from rollups.item_sales().
         Categories: 'Critical', 'Warning', 'Insight'
         """
         recommendations = []
-        profit_insights = self.get_profitability_insights(inventory_items, transactions)
+        profit_insights = {i['id']: i for i in self.get_profitability_insights(inventory_items, item_sales)}
+        row_of = {item_id: n for n, item_id in enumerate(item_sales['item_ids'])}
+        no_sales = np.zeros(item_sales['quantity'].shape[1])
         
         for item in inventory_items:
-            forecast = self.get_demand_forecast(item['id'], transactions)
+            k = row_of.get(item['id'])
+            forecast = self.get_demand_forecast(item_sales['quantity'][k] if k is not None else no_sales)
             daily_demand = forecast['30_day'] / 30
             lead_time = item.get('lead_time', 1)
             current_qty = item['stock_quantity']
@@ -184,7 +286,7 @@ class BulkBinsAIService:
             days_to_stockout = current_qty / daily_demand if daily_demand > 0 else 999
             
             # Fetch profitability for this item
-            item_profit = next((i for i in profit_insights if i['id'] == item['id']), {"margin": 0, "is_star": False, "total_profit": 0})
+            item_profit = profit_insights.get(item['id'], {"margin": 0, "is_star": False, "total_profit": 0})
             avg_daily_profit = (item_profit['total_profit'] / 30) if daily_demand > 0 else 0
             
             # Estimated Lost Profit if we don't reorder now
@@ -243,49 +345,34 @@ class BulkBinsAIService:
         # Sort by urgency
         return sorted(recommendations, key=lambda x: (x['priority'] == 'High', x['priority'] == 'Medium'), reverse=True)
 
-    def get_profitability_insights(self, inventory_items, transactions):
+    def get_profitability_insights(self, inventory_items, item_sales):
         """
         Identifies 'Profit Stars' - items with high margin and high sales volume.
+        Works on the all-time per-item totals in `item_sales` (see rollups.item_sales()).
         """
-        if not transactions:
-            return []
-
-        # Ensure we have required keys in the dictionaries
-        safe_txns = []
-        for t in transactions:
-            if t.get('type') == 'Sale':
-                safe_txns.append({
-                    'inventory_item_id': t.get('inventory_item_id'),
-                    'profit': t.get('profit', 0) or 0,
-                    'quantity': t.get('quantity', 0) or 0,
-                    'amount': t.get('amount', 0) or 0
-                })
-
-        df = pd.DataFrame(safe_txns)
-        if df.empty:
+        sold = item_sales['count'] > 0
+        if not sold.any():
             return []
 
-        # Aggregate profit by item
-        item_stats = df.groupby('inventory_item_id').agg({
-            'profit': 'sum',
-            'quantity': 'sum',
-            'amount': 'sum'
-        }).reset_index()
+        volume = item_sales['volume']
+        revenue = item_sales['revenue']
+        profit = item_sales['profit']
+        margin = np.divide(profit * 100, revenue, out=np.zeros_like(revenue, dtype=float), where=revenue > 0)
+        star_volume = np.quantile(volume[sold], 0.7)
 
         # Map names and calculate margin
+        items_by_id = {i['id']: i for i in inventory_items}
         insights = []
-        for _, row in item_stats.iterrows():
-            item = next((i for i in inventory_items if i['id'] == row['inventory_item_id']), None)
+        for k in np.flatnonzero(sold):
+            item = items_by_id.get(item_sales['item_ids'][k])
             if item:
-                margin = (row['profit'] / row['amount'] * 100) if row['amount'] > 0 else 0
-                is_star = bool(margin > 20 and row['quantity'] >= item_stats['quantity'].quantile(0.7))
                 insights.append({
                     "id": item['id'],
                     "name": item['name'],
-                    "total_profit": float(row['profit']),
-                    "volume": int(row['quantity']),
-                    "margin": round(margin, 2),
-                    "is_star": is_star
+                    "total_profit": float(profit[k]),
+                    "volume": int(volume[k]),
+                    "margin": round(float(margin[k]), 2),
+                    "is_star": bool(margin[k] > 20 and volume[k] >= star_volume)
                 })
 
         return sorted(insights, key=lambda x: x['total_profit'], reverse=True)
@@ -323,7 +410,8 @@ class BulkBinsAIService:
 
         # 2. Predictions & Recommendations
         prediction = self.predict_profit(transactions)
-        reorders = self.recommend_reorders(inventory_items, transactions)
+        item_sales = item_sales_from_transactions(inventory_items, transactions)
+        reorders = self.recommend_reorders(inventory_items, item_sales)
         
         # 3. Time Series Analysis
         df = pd.DataFrame([{
@@ -431,7 +519,7 @@ class BulkBinsAIService:
             })
 
         # Product Performance
-        profit_insights = self.get_profitability_insights(inventory_items, transactions)
+        profit_insights = self.get_profitability_insights(inventory_items, item_sales)
         
         return {
             "total_sales": round(total_sales, 2),
@@ -0,0 +1,269 @@
+from flask import current_app, request
+from functools import wraps
+from models import db, Business
+from sqlalchemy import select, update
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import urlencode
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# Analytics responses are memoised per (endpoint, business, params, data version).
+# Every write path calls bump_data_version() in the same DB transaction as the
+# change, so a new version simply stops matching the old keys; stale entries age
+# out through the LRU / TTL limits. The version lives on the Business row, which
+# keeps it consistent across gunicorn workers.
+#
+# Backends:
+#   memory - per-process LRU (default, single worker)
+#   sqlite - a local SQLite file shared by every worker on the host
+#
+# The same key doubles as a strong ETag, so a poll whose If-None-Match still
+# matches gets a 304 after one version lookup, before the view runs at all.
+
+
+def bump_data_version(business_id=None):
+    """Mark a business's data (or every business's, if None) as changed."""
+    stmt = update(Business).values(data_version=Business.data_version + 1)
+    if business_id is not None:
+        stmt = stmt.where(Business.id == business_id)
+    db.session.execute(stmt)
+
+
+def get_data_version(business_id):
+    return db.session.execute(select(Business.data_version).where(Business.id == business_id)).scalar() or 0
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def incr(self, name, n=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0
+        }
+
+
+class MemoryCacheBackend:
+    name = 'memory'
+
+    def __init__(self, max_entries=512, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.time():
+                del self._data[key]
+                self.stats.incr('expired')
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.time() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats.incr('evictions')
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCacheBackend:
+    name = 'sqlite'
+
+    def __init__(self, path, max_entries=2048, ttl=300):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires REAL, accessed REAL)"
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS ix_cache_accessed ON cache (accessed)")
+
+    def _conn(self):
+        # One connection per thread; autocommit so other workers see writes immediately
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        now = time.time()
+        if expires < now:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self.stats.incr('expired')
+            return None
+        conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        return value
+
+    def set(self, key, value):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+            (key, value, now + self.ttl, now)
+        )
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            cur = conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)", (excess,)
+            )
+            self.stats.incr('evictions', cur.rowcount)
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache")
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+def init_app(app):
+    """Pick the backend from config: ANALYTICS_CACHE_BACKEND = memory | sqlite | none."""
+    backend = app.config.get('ANALYTICS_CACHE_BACKEND', 'memory')
+    max_entries = int(app.config.get('ANALYTICS_CACHE_MAX_ENTRIES', 512))
+    ttl = int(app.config.get('ANALYTICS_CACHE_TTL', 300))
+    if backend == 'sqlite':
+        path = app.config.get('ANALYTICS_CACHE_PATH') or os.path.join(app.root_path, 'analytics_cache.db')
+        cache = SQLiteCacheBackend(path, max_entries=max_entries, ttl=ttl)
+    elif backend == 'none':
+        cache = None
+    else:
+        cache = MemoryCacheBackend(max_entries=max_entries, ttl=ttl)
+    app.extensions['analytics_cache'] = cache
+    return cache
+
+
+def get_cache():
+    return current_app.extensions.get('analytics_cache')
+
+
+def cache_stats():
+    cache = get_cache()
+    if cache is None:
+        return {"backend": "none"}
+    stats = cache.stats.as_dict()
+    stats.update({"backend": cache.name, "entries": len(cache), "max_entries": cache.max_entries, "ttl": cache.ttl})
+    return stats
+
+
+def _cache_key(endpoint, business_id, params, version):
+    # Results depend on "today" as well as on the data, so the day is part of the key
+    query = urlencode(sorted((k, str(v)) for k, v in params.items()))
+    return f"{endpoint}:{business_id}:v{version}:{datetime.utcnow().date().isoformat()}:{query}"
+
+
+def _etag(key):
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _not_modified(etag):
+    resp = current_app.response_class(status=304)
+    resp.set_etag(etag)
+    resp.headers['Vary'] = 'Authorization'
+    return resp
+
+
+def versioned_response(endpoint, business_id, params, build, cache=True):
+    """Serve 304 for a matching If-None-Match, else the cached/built JSON response tagged with an ETag."""
+    key = _cache_key(endpoint, business_id, params, get_data_version(business_id))
+    etag = _etag(key)
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+
+    store = get_cache() if cache else None
+    body = store.get(key) if store is not None else None
+    if body is not None:
+        store.stats.incr('hits')
+        resp = current_app.response_class(body, status=200, mimetype='application/json')
+    else:
+        if store is not None:
+            store.stats.incr('misses')
+        resp = current_app.make_response(build())
+        if resp.status_code != 200 or resp.mimetype != 'application/json':
+            return resp
+        if store is not None:
+            store.set(key, resp.get_data(as_text=True))
+
+    resp.set_etag(etag)
+    resp.headers['Vary'] = 'Authorization'
+    return resp
+
+
+def cached_response(endpoint, business_id, params, build):
+    """Return the cached JSON response for this key, or call build() and cache a 200 result."""
+    return versioned_response(endpoint, business_id, params, build, cache=True)
+
+
+def _versioned_view(endpoint, cache, extra=None):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(business_id, *args, **kwargs):
+            params = request.args.to_dict()
+            if extra is not None:
+                params.update(extra())
+            return versioned_response(endpoint, business_id, params,
+                                      lambda: f(business_id, *args, **kwargs), cache=cache)
+        return decorated_function
+    return decorator
+
+
+def cached_view(endpoint):
+    """Decorator for business-scoped GET analytics views: caches on the query string and sets an ETag. Put it below the auth decorator."""
+    return _versioned_view(endpoint, cache=True)
+
+
+def etag_view(endpoint, extra=None):
+    """Decorator for business-scoped GET list views: ETag / 304 only, the body itself is not cached.
+
+    extra() may return more key parts for bodies that depend on something besides the
+    data (e.g. the signing window of embedded receipt URLs).
+    """
+    return _versioned_view(endpoint, cache=False, extra=extra)
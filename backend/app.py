@@ -1,15 +1,15 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, g
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, verify_jwt_in_request
-from models import db, User, Business, BusinessMember, Transaction, InventoryItem
+from sqlalchemy import or_, and_
+from models import db, User, Business, BusinessMember, Transaction, InventoryItem, DailySummary, ImportJob, RecomputeJob
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 from datetime import datetime, timedelta
-from werkzeug.utils import secure_filename
-from flask import send_from_directory
+from collections import defaultdict
 from functools import wraps
 
 from flask_cors import CORS
@@ -29,12 +29,29 @@ if app.config['SQLALCHEMY_DATABASE_URI'].startswith("postgres://"):
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'bulkbins-premium-key-2026')
 app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'jwt-secret-bulkbins-2026')
-app.config['UPLOAD_FOLDER'] = os.path.join(basedir, 'uploads/receipts')
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', os.path.join(basedir, 'uploads/receipts'))
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Uploaded sales CSVs are kept here for the CSV forecaster (ai/csv-analysis)
+app.config['IMPORT_FOLDER'] = os.environ.get('IMPORT_FOLDER', basedir)
+app.config['IMPORT_CHUNK_SIZE'] = int(os.environ.get('IMPORT_CHUNK_SIZE', 5000))
+# Receipt delivery: '' serves from Python; 'nginx' (X-Accel-Redirect to an internal
+# location aliased to UPLOAD_FOLDER) or 'apache' (mod_xsendfile) hand the bytes to the proxy
+app.config['RECEIPT_SENDFILE'] = os.environ.get('RECEIPT_SENDFILE', '')
+app.config['RECEIPT_ACCEL_PREFIX'] = os.environ.get('RECEIPT_ACCEL_PREFIX', '/protected-receipts/')
+
+# Analytics result cache: 'memory' for a single worker, 'sqlite' to share across gunicorn workers
+app.config['ANALYTICS_CACHE_BACKEND'] = os.environ.get('ANALYTICS_CACHE_BACKEND', 'memory')
+app.config['ANALYTICS_CACHE_MAX_ENTRIES'] = int(os.environ.get('ANALYTICS_CACHE_MAX_ENTRIES', 512))
+app.config['ANALYTICS_CACHE_TTL'] = int(os.environ.get('ANALYTICS_CACHE_TTL', 300))
+app.config['ANALYTICS_CACHE_PATH'] = os.environ.get('ANALYTICS_CACHE_PATH', os.path.join(basedir, 'analytics_cache.db'))
 
 db.init_app(app)
 jwt = JWTManager(app)
 
+import analytics_cache
+from analytics_cache import cached_view, etag_view, bump_data_version
+analytics_cache.init_app(app)
+
 # Flask-Mail Configuration
 from flask_mail import Mail
 app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -55,13 +72,38 @@ app.register_blueprint(export_bp, url_prefix='/api')
 CORS(
     app,
     resources={r"/api/*": {"origins": "*"}},
-    allow_headers=["Content-Type", "Authorization"],
+    allow_headers=["Content-Type", "Authorization", "If-None-Match"],
+    expose_headers=["ETag"],
     methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"]
 )
 # Initialize database
+import rollups
+import importer
+import import_jobs
+import stock
+import changes
+import recompute_jobs
+import receipts
+import receipt_images
+import business_classifier
 with app.app_context():
     db.create_all()
-from business import role_required, get_member_role
+    # One-time backfill of the P&L rollup for databases that predate it
+    try:
+        if not db.session.query(DailySummary.id).first() and db.session.query(Transaction.id).first():
+            rollups.rebuild()
+            bump_data_version()
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Rollup backfill skipped: {e}")
+# Pick up background imports / recomputations interrupted by a restart
+try:
+    import_jobs.resume_interrupted(app)
+    recompute_jobs.resume_interrupted(app)
+except Exception as e:
+    print(f"Import job resume skipped: {e}")
+from business import role_required, membership_claims, bump_membership_version, resolve_user, get_member_role, forget_user, identity_stats
 
 def master_admin_required():
     def decorator(f):
@@ -69,9 +111,8 @@ def master_admin_required():
         def decorated_function(*args, **kwargs):
             try:
                 verify_jwt_in_request()
-                current_user_email = get_jwt_identity()
-                user = User.query.filter_by(email=current_user_email).first()
-                if not user or not user.is_master_admin:
+                user_id, is_master_admin = resolve_user(get_jwt_identity())
+                if not user_id or not is_master_admin:
                     return jsonify({"message": "Master Admin access required"}), 403
                 return f(*args, **kwargs)
             except Exception as e:
@@ -100,7 +141,7 @@ def signup():
     db.session.add(new_user)
     db.session.commit()
     
-    access_token = create_access_token(identity=new_user.email)
+    access_token = create_access_token(identity=new_user.email, additional_claims=membership_claims(new_user))
     return jsonify({
         "token": access_token, 
         "user": {"email": new_user.email, "name": new_user.username},
@@ -117,7 +158,7 @@ def login():
     user = User.query.filter_by(email=data.get('email')).first()
     
     if user and user.check_password(data.get('password')):
-        access_token = create_access_token(identity=user.email)
+        access_token = create_access_token(identity=user.email, additional_claims=membership_claims(user))
         # Also return businesses they are members of
         memberships = BusinessMember.query.filter_by(user_id=user.id).all()
         biz_list = [{"id": m.business_id, "name": m.business.name, "role": m.role, "currency": m.business.currency} for m in memberships]
@@ -143,6 +184,8 @@ def verify():
         memberships = BusinessMember.query.filter_by(user_id=user.id).all()
         biz_list = [{"id": m.business_id, "name": m.business.name, "role": m.role, "currency": m.business.currency} for m in memberships]
         return jsonify({
+            # Fresh token so clients can pick up membership changes made since login
+            "token": create_access_token(identity=user.email, additional_claims=membership_claims(user)),
             "user": {
                 "email": user.email, 
                 "name": user.username,
@@ -163,6 +206,17 @@ def admin_overview():
         "total_businesses": business_count
     }), 200
 
+@app.route('/api/admin/cache-stats', methods=['GET'])
+@master_admin_required()
+def admin_cache_stats():
+    # Counters are per worker process
+    stats = analytics_cache.cache_stats()
+    stats["identity"] = identity_stats()
+    classify_cache = ai_service.classify_cache
+    stats["classifier"] = dict(classify_cache.stats.as_dict(), entries=len(classify_cache))
+    stats["business_classifiers"] = business_classifier.cache_stats()
+    return jsonify(stats), 200
+
 @app.route('/api/admin/users', methods=['GET'])
 @master_admin_required()
 def admin_get_users():
@@ -193,6 +247,8 @@ def admin_delete_user(user_id):
     # Actually User.memberships has backref.
     # When user is deleted, their memberships are deleted.
     
+    forget_user(user)
+    BusinessMember.query.filter_by(user_id=user.id).delete()
     db.session.delete(user)
     db.session.commit()
     return jsonify({"message": "User deleted"}), 200
@@ -219,6 +275,7 @@ def admin_get_businesses():
 def admin_delete_business(business_id):
     biz = Business.query.get(business_id)
     if not biz: return jsonify({"message": "Business not found"}), 404
+    bump_membership_version(*[m.user_id for m in biz.members], business_id=business_id)
     db.session.delete(biz)
     db.session.commit()
     return jsonify({"message": "Business deleted"}), 200
@@ -228,15 +285,15 @@ def admin_delete_business(business_id):
 @jwt_required()
 def create_business():
     data = request.get_json()
-    current_user_email = get_jwt_identity()
-    user = User.query.filter_by(email=current_user_email).first()
+    user_id, _ = resolve_user(get_jwt_identity())
     
     new_biz = Business(name=data.get('name'))
     db.session.add(new_biz)
     db.session.flush() # Get ID before commit
     
-    membership = BusinessMember(user_id=user.id, business_id=new_biz.id, role='Owner')
+    membership = BusinessMember(user_id=user_id, business_id=new_biz.id, role='Owner')
     db.session.add(membership)
+    bump_membership_version(user_id, business_id=new_biz.id)
     db.session.commit()
     
     return jsonify({"id": new_biz.id, "name": new_biz.name, "role": "Owner"}), 201
@@ -265,6 +322,8 @@ def add_member(business_id):
             
     new_membership = BusinessMember(user_id=user_to_add.id, business_id=business_id, role=role)
     db.session.add(new_membership)
+    bump_membership_version(user_to_add.id, business_id=business_id)
+    bump_data_version(business_id)
     db.session.commit()
     
     return jsonify({"message": f"User {new_member_email} added as {role}"}), 201
@@ -272,25 +331,25 @@ def add_member(business_id):
 @app.route('/api/businesses/<int:business_id>', methods=['PUT', 'DELETE'])
 @jwt_required()
 def manage_business(business_id):
-    current_user_email = get_jwt_identity()
-    user = User.query.filter_by(email=current_user_email).first()
+    user_id, _ = resolve_user(get_jwt_identity())
     
     # Custom role check because DELETE is Owner only, PUT is Owner/Accountant
-    membership = BusinessMember.query.filter_by(user_id=user.id, business_id=business_id).first()
-    if not membership:
+    role = get_member_role(user_id, business_id)
+    if not role:
         return jsonify({"message": "Access denied"}), 403
 
     if request.method == 'DELETE':
-        if membership.role != 'Owner':
+        if role != 'Owner':
             return jsonify({"message": "Only Owners can delete a business"}), 403
         biz = Business.query.get(business_id)
         if not biz: return jsonify({"message": "Business not found"}), 404
+        bump_membership_version(*[m.user_id for m in biz.members], business_id=business_id)
         db.session.delete(biz)
         db.session.commit()
         return jsonify({"message": "Business deleted successfully"}), 200
 
     if request.method == 'PUT':
-        if membership.role not in ['Owner', 'Accountant']:
+        if role not in ['Owner', 'Accountant']:
              return jsonify({"message": "Access denied"}), 403
         
         data = request.get_json()
@@ -306,6 +365,7 @@ def manage_business(business_id):
 
 @app.route('/api/businesses/<int:business_id>/members', methods=['GET'])
 @role_required(['Owner', 'Accountant', 'Analyst', 'Staff'])
+@etag_view('members')
 def get_members(business_id):
     members = BusinessMember.query.filter_by(business_id=business_id).all()
     result = []
@@ -334,6 +394,8 @@ def manage_member(business_id, user_id):
 
     if request.method == 'DELETE':
         db.session.delete(member)
+        bump_membership_version(user_id, business_id=business_id)
+        bump_data_version(business_id)
         db.session.commit()
         return jsonify({"message": "Member removed"}), 200
 
@@ -344,24 +406,30 @@ def manage_member(business_id, user_id):
             return jsonify({"message": "Invalid role"}), 400
             
         member.role = new_role
+        bump_membership_version(user_id, business_id=business_id)
+        bump_data_version(business_id)
         db.session.commit()
         return jsonify({"message": f"Member role updated to {new_role}"}), 200
 
 # Inventory Management
+# Public name -> column for the inventory listing (and the changes feed)
+INVENTORY_FIELDS = {
+    "id": InventoryItem.id,
+    "name": InventoryItem.name,
+    "description": InventoryItem.description,
+    "stock_quantity": InventoryItem.stock_quantity,
+    "reorder_level": InventoryItem.reorder_level,
+    "cost_price": InventoryItem.cost_price,
+    "selling_price": InventoryItem.selling_price,
+    "category": InventoryItem.category
+}
+
 @app.route('/api/businesses/<int:business_id>/inventory', methods=['GET'])
 @role_required(['Owner', 'Accountant', 'Analyst', 'Staff'])
+@etag_view('inventory')
 def get_inventory(business_id):
-    items = InventoryItem.query.filter_by(business_id=business_id).all()
-    return jsonify([{
-        "id": item.id,
-        "name": item.name,
-        "description": item.description,
-        "stock_quantity": item.stock_quantity,
-        "reorder_level": item.reorder_level,
-        "cost_price": item.cost_price,
-        "selling_price": item.selling_price,
-        "category": item.category
-    } for item in items]), 200
+    rows = db.session.query(*INVENTORY_FIELDS.values()).filter(InventoryItem.business_id == business_id).all()
+    return jsonify([dict(zip(INVENTORY_FIELDS, row)) for row in rows]), 200
 
 @app.route('/api/businesses/<int:business_id>/inventory', methods=['POST'])
 @role_required(['Owner'])
@@ -387,6 +455,9 @@ def add_inventory(business_id):
             lead_time=safe_int(data.get('lead_time'), 1)
         )
         db.session.add(new_item)
+        db.session.flush()
+        changes.record(business_id, changes.INVENTORY_ITEM, [new_item.id])
+        bump_data_version(business_id)
         db.session.commit()
         return jsonify({"message": "Item added to inventory", "id": new_item.id}), 201
     except Exception as e:
@@ -402,9 +473,6 @@ def update_inventory(business_id, item_id):
         return jsonify({"message": "Item not found"}), 404
         
     data = request.get_json()
-    current_user_email = get_jwt_identity()
-    user = User.query.filter_by(email=current_user_email).first()
-    membership = BusinessMember.query.filter_by(user_id=user.id, business_id=business_id).first()
     
     def safe_float(val, default=0.0):
         try: return float(val) if val is not None and val != '' else default
@@ -413,11 +481,12 @@ def update_inventory(business_id, item_id):
         try: return int(val) if val is not None and val != '' else default
         except: return default
 
-    if membership.role == 'Accountant':
+    if g.member_role == 'Accountant':
         # Accountants can ONLY update quantity (restock)
         if 'stock_quantity' in data:
             item.stock_quantity = safe_int(data['stock_quantity'], item.stock_quantity)
     else: # Owner
+        old_cost = item.cost_price
         item.name = data.get('name', item.name)
         item.description = data.get('description', item.description)
         item.stock_quantity = safe_int(data.get('stock_quantity'), item.stock_quantity)
@@ -427,7 +496,22 @@ def update_inventory(business_id, item_id):
         item.category = data.get('category', item.category)
         item.lead_time = safe_int(data.get('lead_time'), item.lead_time)
         
+    changes.record(business_id, changes.INVENTORY_ITEM, [item.id])
+    bump_data_version(business_id)
+
+    # A cost correction is pushed back into the profit/COGS of past sales unless the
+    # caller says it is a new price going forward ("recompute_history": false)
+    job = None
+    if g.member_role != 'Accountant' and item.cost_price != old_cost and data.get('recompute_history', True) is not False:
+        job = recompute_jobs.create_job(business_id, inventory_item_id=item.id)
     db.session.commit()
+    if job:
+        recompute_jobs.enqueue(app, job.id)
+        return jsonify({
+            "message": "Item updated successfully; recalculating profit for past sales",
+            "recompute_job_id": job.id,
+            "status_url": f"/api/businesses/{business_id}/recompute-jobs/{job.id}"
+        }), 200
     return jsonify({"message": "Item updated successfully"}), 200
 
 @app.route('/api/businesses/<int:business_id>/inventory/<int:item_id>', methods=['DELETE'])
@@ -438,37 +522,96 @@ def delete_inventory(business_id, item_id):
         return jsonify({"message": "Item not found"}), 404
     
     db.session.delete(item)
+    changes.record(business_id, changes.INVENTORY_ITEM, [item_id], op='delete')
+    bump_data_version(business_id)
     db.session.commit()
     return jsonify({"message": "Item deleted successfully"}), 200
 
 # Transactions
+# Public name -> column for the transaction listing (and its ?fields= projection)
+TRANSACTION_FIELDS = {
+    "id": Transaction.id,
+    "amount": Transaction.amount,
+    "category": Transaction.category,
+    "type": Transaction.type,
+    "timestamp": Transaction.timestamp,
+    "description": Transaction.description,
+    "receipt_url": Transaction.receipt_url,
+    "ai_metadata": Transaction.ai_metadata,
+    "profit": Transaction.profit,
+    "cogs": Transaction.cogs,
+    "inventory_item_id": Transaction.inventory_item_id,
+    "quantity": Transaction.quantity
+}
+
+# Largest ?limit= served in one page (cursor or offset mode); smaller values are raised to 1
+MAX_TRANSACTION_PAGE = 5000
+
 @app.route('/api/businesses/<int:business_id>/transactions', methods=['GET'])
 @role_required(['Owner', 'Accountant', 'Analyst', 'Staff'])
+@etag_view('transactions', extra=lambda: {"receipt_window": receipts.signing_window()})
 def get_transactions(business_id):
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('limit', 100, type=int)
-    
-    query = Transaction.query.filter_by(business_id=business_id).order_by(Transaction.timestamp.desc())
+    per_page = min(max(request.args.get('limit', 100, type=int), 1), MAX_TRANSACTION_PAGE)
+
+    # ?fields=amount,type,... selects just those columns (id and timestamp always come back).
+    # Rows are built straight from result tuples; no Transaction objects are hydrated.
+    fields = request.args.get('fields')
+    if fields:
+        names = [f.strip() for f in fields.split(',') if f.strip()]
+        unknown = [f for f in names if f not in TRANSACTION_FIELDS]
+        if unknown:
+            return jsonify({"message": f"Unknown fields: {', '.join(unknown)}"}), 400
+        names = ['id', 'timestamp'] + [f for f in names if f not in ('id', 'timestamp')]
+    else:
+        names = list(TRANSACTION_FIELDS)
+    columns = [TRANSACTION_FIELDS[f] for f in names]
+    ts_idx = names.index('timestamp')
+
+    def serialize(row):
+        data = dict(zip(names, row))
+        data['timestamp'] = row[ts_idx].isoformat()
+        if 'receipt_url' in data:
+            receipts.sign_urls(data, business_id)
+        return data
+
+    query = db.session.query(*columns).filter(Transaction.business_id == business_id)
+
+    # Cursor mode: ?after=<timestamp,id> (empty for the first page). Seeks on
+    # (business_id, timestamp, id) instead of OFFSET, so deep pages cost the same as page 1.
+    if 'after' in request.args:
+        after = request.args.get('after')
+        if after:
+            try:
+                after_ts, after_id = after.rsplit(',', 1)
+                after_ts, after_id = datetime.fromisoformat(after_ts), int(after_id)
+            except ValueError:
+                return jsonify({"message": "Invalid cursor"}), 400
+            query = query.filter(or_(
+                Transaction.timestamp < after_ts,
+                and_(Transaction.timestamp == after_ts, Transaction.id < after_id)
+            ))
+        rows = query.order_by(Transaction.timestamp.desc(), Transaction.id.desc()).limit(per_page + 1).all()
+        txns = rows[:per_page]
+        next_cursor = None
+        if len(rows) > per_page:
+            last = txns[-1]
+            next_cursor = f"{last[ts_idx].isoformat()},{last[0]}"
+
+        result = {"transactions": [serialize(t) for t in txns], "next_cursor": next_cursor}
+        # Total is opt-in and read from the daily rollup rather than COUNT(*) over the ledger
+        if request.args.get('include_total') in ('1', 'true'):
+            result["total"] = rollups.period_totals(business_id)["count"]
+        return jsonify(result), 200
+
+    query = query.order_by(Transaction.timestamp.desc())
     
     # Pagination
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     txns = pagination.items
 
     return jsonify({
-        "transactions": [{
-            "id": t.id,
-            "amount": t.amount,
-            "category": t.category,
-            "type": t.type,
-            "timestamp": t.timestamp.isoformat(),
-            "description": t.description,
-            "receipt_url": t.receipt_url,
-            "ai_metadata": t.ai_metadata,
-            "profit": t.profit,
-            "cogs": t.cogs,
-            "inventory_item_id": t.inventory_item_id,
-            "quantity": t.quantity
-        } for t in txns],
+        "transactions": [serialize(t) for t in txns],
         "total": pagination.total,
         "pages": pagination.pages,
         "current_page": page
@@ -494,42 +637,36 @@ def create_transaction(business_id):
     txn_type = data.get('type') # Sale or Expense
     inventory_item_id = data.get('inventory_item_id')
     quantity = safe_int(data.get('quantity'), 1)
-    
-    # Handle Receipt Upload
-    receipt_url = None
-    if 'receipt' in request.files:
-        file = request.files['receipt']
-        if file and file.filename != '':
-            filename = secure_filename(f"{datetime.utcnow().timestamp()}_{file.filename}")
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-            receipt_url = f"/api/receipts/{filename}"
 
-    # Inventory Logic for Sales
+    # Inventory Logic for Sales, then Profit and COGS
+    profit = 0.0
+    cogs = 0.0
     if txn_type == 'Sale' and inventory_item_id:
-        item = InventoryItem.query.filter_by(id=inventory_item_id, business_id=business_id).first()
-        if not item:
-            return jsonify({"message": "Inventory item not found"}), 404
-        if item.stock_quantity < quantity:
-            return jsonify({"message": f"Insufficient stock. Available: {item.stock_quantity}"}), 400
-        
-        item.stock_quantity -= quantity
+        # Stock check and decrement in one statement, so concurrent sales cannot oversell
+        item = stock.take(business_id, inventory_item_id, quantity)
+        if item is None:
+            available = stock.available(business_id, inventory_item_id)
+            if available is None:
+                return jsonify({"message": "Inventory item not found"}), 404
+            return jsonify({"message": f"Insufficient stock. Available: {available}"}), 400
+
         # If amount not provided, calculate from selling_price
         if amount == 0:
             amount = item.selling_price * quantity
-            
-    # Calculate Profit and COGS
-    profit = 0.0
-    cogs = 0.0
-    if txn_type == 'Sale' and inventory_item_id:
-        item = InventoryItem.query.get(inventory_item_id)
-        if item:
-            item_cost = item.cost_price * quantity
-            profit = amount - item_cost
-            cogs = item_cost
+        item_cost = item.cost_price * quantity
+        profit = amount - item_cost
+        cogs = item_cost
     elif txn_type == 'Expense':
         profit = -amount
         cogs = amount # Expenses are essentially COGS for the business operation
 
+    # Handle Receipt Upload (once the entry is known to be valid)
+    receipt_url = None
+    if 'receipt' in request.files:
+        file = request.files['receipt']
+        if file and file.filename != '':
+            receipt_url = receipts.store(file)
+
     timestamp_str = data.get('timestamp')
     if timestamp_str:
         try:
@@ -560,12 +697,163 @@ def create_transaction(business_id):
         ai_metadata=data.get('metadata') # Storing JSON as string
     )
     db.session.add(new_txn)
+    db.session.flush()
+    changes.record(business_id, changes.TRANSACTION, [new_txn.id])
+    rollups.record_transaction(new_txn)
+    bump_data_version(business_id)
     db.session.commit()
+    receipt_images.enqueue(app, receipt_url)
     return jsonify({"message": "Transaction recorded", "id": new_txn.id}), 201
 
+# Upper bound on one POS sync request; terminals split longer offline queues
+MAX_TRANSACTION_BATCH = 1000
+
+@app.route('/api/businesses/<int:business_id>/transactions/batch', methods=['POST'])
+@role_required(['Owner', 'Staff', 'Accountant'])
+def create_transactions_batch(business_id):
+    """Record many transactions in one request (POS offline queue replay).
+
+    Body: {"transactions": [...], "mode": "atomic" | "best_effort"}. Each entry takes
+    the same fields as POST /transactions. All referenced inventory items are loaded
+    in one query, stock / profit / COGS are worked out in memory, and everything is
+    committed once. In atomic mode any rejected entry rolls back the whole batch.
+    """
+    data = request.get_json(silent=True) or {}
+    entries = data if isinstance(data, list) else data.get('transactions')
+    mode = 'atomic' if isinstance(data, list) else data.get('mode', 'atomic')
+    if mode not in ('atomic', 'best_effort'):
+        return jsonify({"message": "mode must be 'atomic' or 'best_effort'"}), 400
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"message": "transactions must be a non-empty list"}), 400
+    if len(entries) > MAX_TRANSACTION_BATCH:
+        return jsonify({"message": f"At most {MAX_TRANSACTION_BATCH} transactions per batch"}), 400
+
+    def safe_float(val, default=0.0):
+        try: return float(val) if val else default
+        except: return default
+    def safe_int(val, default=1):
+        try: return int(val) if val else default
+        except: return default
+    def parse_timestamp(value):
+        for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+            try:
+                return datetime.strptime(value, fmt)
+            except (TypeError, ValueError):
+                pass
+        return datetime.utcnow()
+
+    item_ids = {safe_int(e.get('inventory_item_id'), None) for e in entries
+                if isinstance(e, dict) and e.get('type') == 'Sale'}
+    item_ids.discard(None)
+    items = {}
+    if item_ids:
+        items = {i.id: i for i in InventoryItem.query.filter(
+            InventoryItem.business_id == business_id, InventoryItem.id.in_(item_ids))}
+    remaining = {item_id: item.stock_quantity or 0 for item_id, item in items.items()}
+
+    results, created = [], []
+    for index, e in enumerate(entries):
+        if not isinstance(e, dict):
+            results.append({"index": index, "status": "rejected", "message": "Entry must be an object"})
+            continue
+        txn_type = e.get('type')
+        if txn_type not in ('Sale', 'Expense'):
+            results.append({"index": index, "status": "rejected", "message": "type must be 'Sale' or 'Expense'"})
+            continue
+
+        amount = safe_float(e.get('amount'), 0.0)
+        quantity = safe_int(e.get('quantity'), 1)
+        item_id = safe_int(e.get('inventory_item_id'), None) if txn_type == 'Sale' else None
+        profit = cogs = 0.0
+        if item_id:
+            item = items.get(item_id)
+            if not item:
+                results.append({"index": index, "status": "rejected", "message": "Inventory item not found"})
+                continue
+            if remaining[item_id] < quantity:
+                results.append({"index": index, "status": "rejected",
+                                "message": f"Insufficient stock. Available: {remaining[item_id]}"})
+                continue
+            # Later entries in the batch see the stock left by earlier ones
+            remaining[item_id] -= quantity
+            if amount == 0:
+                amount = item.selling_price * quantity
+            cogs = item.cost_price * quantity
+            profit = amount - cogs
+        elif txn_type == 'Expense':
+            profit = -amount
+            cogs = amount
+
+        txn = Transaction(
+            business_id=business_id,
+            inventory_item_id=item_id,
+            amount=amount,
+            quantity=quantity if txn_type == 'Sale' else 1,
+            category=e.get('category'),
+            type=txn_type,
+            description=e.get('description'),
+            timestamp=parse_timestamp(e.get('timestamp')),
+            profit=profit,
+            cogs=cogs,
+            ai_metadata=e.get('metadata')
+        )
+        created.append((index, txn))
+        results.append({"index": index, "status": "created"})
+
+    # Apply the planned decrements as one conditional UPDATE per item. If another
+    # terminal sold the same item since it was read, that item's entries are rejected
+    sold = defaultdict(int)
+    for _, txn in created:
+        if txn.inventory_item_id:
+            sold[txn.inventory_item_id] += txn.quantity
+    # (in id order, so two concurrent batches lock rows in the same order on Postgres)
+    short = {item_id for item_id in sorted(sold) if stock.take(business_id, item_id, sold[item_id]) is None}
+    if short:
+        for index, txn in created:
+            if txn.inventory_item_id in short:
+                results[index] = {"index": index, "status": "rejected",
+                                  "message": "Stock changed during the sync; retry this entry"}
+        created = [(index, txn) for index, txn in created if txn.inventory_item_id not in short]
+    created = [txn for _, txn in created]
+
+    rejected = len(entries) - len(created)
+    if mode == 'atomic' and rejected:
+        db.session.rollback()
+        return jsonify({"message": "Batch rejected; nothing was recorded", "created": 0,
+                        "rejected": rejected, "results": [r for r in results if r["status"] == "rejected"]}), 400
+
+    if created:
+        db.session.add_all(created)
+        db.session.flush()
+        rollups.record_transactions(created)
+        changes.record(business_id, changes.TRANSACTION, [t.id for t in created])
+        bump_data_version(business_id)
+        db.session.commit()
+        ids = iter(t.id for t in created)
+        for r in results:
+            if r["status"] == "created":
+                r["id"] = next(ids)
+
+    return jsonify({
+        "message": f"Recorded {len(created)} of {len(entries)} transactions",
+        "created": len(created),
+        "rejected": rejected,
+        "results": results
+    }), 201 if not rejected else 207
+
 @app.route('/api/receipts/<filename>')
 def get_receipt(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    # Signed link (as returned in transaction payloads), or a Bearer token of a member
+    # of a business that has a transaction using this receipt
+    if not receipts.verify_signature(filename, request.args):
+        try:
+            verify_jwt_in_request()
+        except Exception:
+            return jsonify({"message": "Receipt link expired or missing authorization"}), 401
+        user_id, _ = resolve_user(get_jwt_identity())
+        if not any(get_member_role(user_id, bid) for bid in receipts.business_ids_using(filename)):
+            return jsonify({"message": "Access denied"}), 403
+    return receipts.serve(filename)
 
 @app.route('/api/businesses/<int:business_id>/transactions/<int:transaction_id>', methods=['PUT'])
 @role_required(['Owner', 'Accountant'])
@@ -581,15 +869,14 @@ def update_transaction(business_id, transaction_id):
         data = request.get_json()
     
     # Store old values for inventory adjustment
+    old_entry = rollups.entry(txn)
     old_type = txn.type
     old_qty = txn.quantity or 0
     old_item_id = txn.inventory_item_id
     
     # 1. Revert Old Inventory Impact
     if old_type == 'Sale' and old_item_id:
-        old_item = InventoryItem.query.get(old_item_id)
-        if old_item:
-            old_item.stock_quantity += old_qty
+        stock.give_back(business_id, old_item_id, old_qty)
             
     def safe_float(val, default=0.0):
         try: return float(val) if val else default
@@ -601,6 +888,8 @@ def update_transaction(business_id, transaction_id):
     # 2. Update Transaction Fields
     txn.amount = safe_float(data.get('amount'), txn.amount)
     txn.category = data.get('category', txn.category)
+    if 'category' in data:
+        txn.category_suggested = False # Confirmed by a person; the shop's classifier may learn from it
     txn.type = data.get('type', txn.type)
     txn.description = data.get('description', txn.description)
     txn.quantity = safe_int(data.get('quantity'), txn.quantity or 1)
@@ -619,40 +908,40 @@ def update_transaction(business_id, transaction_id):
                 except ValueError:
                     pass # Keep old timestamp if invalid
             
-    # Handle Receipt Update
-    if 'receipt' in request.files:
-        file = request.files['receipt']
-        if file and file.filename != '':
-            filename = secure_filename(f"{datetime.utcnow().timestamp()}_{file.filename}")
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-            txn.receipt_url = f"/api/receipts/{filename}"
-            
-    # 3. Apply New Inventory Impact
+    # 3. Apply New Inventory Impact, then Recalculate Profit and COGS
     if txn.type == 'Sale' and txn.inventory_item_id:
-        new_item = InventoryItem.query.get(txn.inventory_item_id)
-        if not new_item:
+        item = stock.take(business_id, txn.inventory_item_id, txn.quantity)
+        if item is None:
+            available = stock.available(business_id, txn.inventory_item_id)
             db.session.rollback()
-            return jsonify({"message": "New inventory item not found"}), 404
-        if new_item.stock_quantity < txn.quantity:
-            db.session.rollback()
-            return jsonify({"message": f"Insufficient stock for update. Available: {new_item.stock_quantity}"}), 400
-        new_item.stock_quantity -= txn.quantity
-        
-    # Recalculate Profit and COGS
-    if txn.type == 'Sale' and txn.inventory_item_id:
-        item = InventoryItem.query.get(txn.inventory_item_id)
-        if item:
-            item_cost = item.cost_price * txn.quantity
-            txn.profit = txn.amount - item_cost
-            txn.cogs = item_cost
+            if available is None:
+                return jsonify({"message": "New inventory item not found"}), 404
+            return jsonify({"message": f"Insufficient stock for update. Available: {available}"}), 400
+        item_cost = item.cost_price * txn.quantity
+        txn.profit = txn.amount - item_cost
+        txn.cogs = item_cost
     elif txn.type == 'Expense':
         txn.profit = -txn.amount
         txn.cogs = txn.amount
     else:
         txn.profit = 0.0
         txn.cogs = 0.0
-        
+
+    # Handle Receipt Update (after the stock check, so a rejected edit stores nothing)
+    new_receipt = None
+    if 'receipt' in request.files:
+        file = request.files['receipt']
+        if file and file.filename != '':
+            old_receipt = txn.receipt_url
+            txn.receipt_url = new_receipt = receipts.store(file)
+            receipts.release(old_receipt)
+
+    rollups.apply_entries([old_entry], -1)
+    rollups.record_transaction(txn)
+    changes.record(business_id, changes.TRANSACTION, [txn.id])
+    bump_data_version(business_id)
     db.session.commit()
+    receipt_images.enqueue(app, new_receipt)
     return jsonify({"message": "Transaction updated successfully"}), 200
 
 @app.route('/api/businesses/<int:business_id>/transactions/<int:transaction_id>', methods=['DELETE'])
@@ -664,14 +953,71 @@ def delete_transaction(business_id, transaction_id):
         
     # Revert Inventory Impact if it's a Sale
     if txn.type == 'Sale' and txn.inventory_item_id and txn.quantity:
-        item = InventoryItem.query.get(txn.inventory_item_id)
-        if item:
-            item.stock_quantity += txn.quantity
+        stock.give_back(business_id, txn.inventory_item_id, txn.quantity)
             
+    rollups.unrecord_transaction(txn)
+    receipts.release(txn.receipt_url)
     db.session.delete(txn)
+    changes.record(business_id, changes.TRANSACTION, [transaction_id], op='delete')
+    bump_data_version(business_id)
     db.session.commit()
+    # Remove receipt files that have been unreferenced for longer than the grace period
+    try:
+        receipts.reclaim_orphans(limit=50)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Receipt reclaim skipped: {e}")
     return jsonify({"message": "Transaction deleted successfully"}), 200
 
+@app.route('/api/businesses/<int:business_id>/changes', methods=['GET'])
+@role_required(['Owner', 'Accountant', 'Analyst', 'Staff'])
+@etag_view('changes', extra=lambda: {"receipt_window": receipts.signing_window()})
+def get_changes(business_id):
+    """Transactions and inventory items changed after ?since=<seq>, with tombstones for deletes.
+
+    Without `since` only the current seq comes back: load the full lists once, then poll
+    with that value. Each poll returns at most `limit` log entries; keep following
+    next_since while has_more is true.
+    """
+    if 'since' not in request.args:
+        return jsonify({"changes": [], "next_since": changes.current_seq(business_id), "has_more": False}), 200
+    since = request.args.get('since', type=int)
+    if since is None or since < 0:
+        return jsonify({"message": "since must be a non-negative integer"}), 400
+    limit = min(max(request.args.get('limit', 500, type=int), 1), 5000)
+
+    latest, next_since, has_more = changes.since(business_id, since, limit)
+
+    # Current state of everything that was upserted, one IN query per entity
+    sources = {
+        changes.TRANSACTION: (TRANSACTION_FIELDS, Transaction),
+        changes.INVENTORY_ITEM: (INVENTORY_FIELDS, InventoryItem)
+    }
+    current = {}
+    for entity, (fields, model) in sources.items():
+        ids = [entity_id for (e, entity_id), (_, op) in latest.items() if e == entity and op == 'upsert']
+        if not ids:
+            continue
+        rows = db.session.query(*fields.values()).filter(model.business_id == business_id, model.id.in_(ids)).all()
+        for row in rows:
+            data = dict(zip(fields, row))
+            if isinstance(data.get('timestamp'), datetime):
+                data['timestamp'] = data['timestamp'].isoformat()
+            if 'receipt_url' in data:
+                receipts.sign_urls(data, business_id)
+            current[(entity, data['id'])] = data
+
+    feed = []
+    for (entity, entity_id), (seq, op) in sorted(latest.items(), key=lambda kv: kv[1][0]):
+        data = current.get((entity, entity_id))
+        if op == 'upsert' and data is not None:
+            feed.append({"seq": seq, "entity": entity, "op": "upsert", "id": entity_id, "data": data})
+        else:
+            # Deleted (possibly after this page's upsert of it)
+            feed.append({"seq": seq, "entity": entity, "op": "delete", "id": entity_id})
+
+    return jsonify({"changes": feed, "next_since": next_since, "has_more": has_more}), 200
+
 # AI Integration Endpoints
 @app.route('/api/ai/classify', methods=['POST'])
 @jwt_required()
@@ -681,8 +1027,48 @@ def ai_classify():
     suggestion = ai_service.classify_expense(description)
     return jsonify({"suggestion": suggestion}), 200
 
+MAX_CLASSIFY_BATCH = 1000
+
+@app.route('/api/ai/classify/batch', methods=['POST'])
+@jwt_required()
+def ai_classify_batch():
+    data = request.get_json(silent=True) or {}
+    descriptions = data.get('descriptions')
+    if not isinstance(descriptions, list):
+        return jsonify({"message": "descriptions must be a list"}), 400
+    if len(descriptions) > MAX_CLASSIFY_BATCH:
+        return jsonify({"message": f"At most {MAX_CLASSIFY_BATCH} descriptions per batch"}), 400
+    return jsonify({"suggestions": ai_service.classify_expenses(descriptions)}), 200
+
+def _refresh_business_classifier(business_id):
+    # Answer with the model we have; bring it up to date in the background
+    if business_classifier.is_stale(business_id, business_classifier.load(business_id)):
+        business_classifier.enqueue(app, business_id)
+
+@app.route('/api/businesses/<int:business_id>/ai/classify', methods=['POST'])
+@role_required(['Owner', 'Accountant', 'Analyst', 'Staff'])
+def ai_classify_business(business_id):
+    data = request.get_json(silent=True) or {}
+    suggestion = ai_service.classify_expense(data.get('description', ''), business_id=business_id)
+    _refresh_business_classifier(business_id)
+    return jsonify({"suggestion": suggestion}), 200
+
+@app.route('/api/businesses/<int:business_id>/ai/classify/batch', methods=['POST'])
+@role_required(['Owner', 'Accountant', 'Analyst', 'Staff'])
+def ai_classify_business_batch(business_id):
+    data = request.get_json(silent=True) or {}
+    descriptions = data.get('descriptions')
+    if not isinstance(descriptions, list):
+        return jsonify({"message": "descriptions must be a list"}), 400
+    if len(descriptions) > MAX_CLASSIFY_BATCH:
+        return jsonify({"message": f"At most {MAX_CLASSIFY_BATCH} descriptions per batch"}), 400
+    suggestions = ai_service.classify_expenses(descriptions, business_id=business_id)
+    _refresh_business_classifier(business_id)
+    return jsonify({"suggestions": suggestions}), 200
+
 @app.route('/api/businesses/<int:business_id>/ai/predictions', methods=['GET'])
 @role_required(['Owner', 'Analyst'])
+@cached_view('predictions')
 def ai_predictions(business_id):
     txns = Transaction.query.filter_by(business_id=business_id).all()
     txn_data = [{
@@ -715,6 +1101,7 @@ def ai_predictions(business_id):
 
 @app.route('/api/businesses/<int:business_id>/ai/predictions', methods=['GET'])
 @role_required(['Owner', 'Accountant', 'Analyst'])
+@cached_view('predictions')
 def get_predictions(business_id):
     # Fetch all transactions for analysis
     txns = Transaction.query.filter_by(business_id=business_id).all()
@@ -731,6 +1118,7 @@ def get_predictions(business_id):
 
 @app.route('/api/businesses/<int:business_id>/ai/pnl', methods=['GET'])
 @role_required(['Owner', 'Accountant', 'Analyst'])
+@cached_view('pnl')
 def get_pnl_data(business_id):
     # Get granularity from query params
     granularity = request.args.get('granularity', 'monthly')
@@ -751,30 +1139,25 @@ def get_pnl_data(business_id):
         start_date = now - timedelta(days=180)
         label_fmt = '%Y-%m'
 
-    txns = Transaction.query.filter(
-        Transaction.business_id == business_id,
-        Transaction.timestamp >= start_date,
-        Transaction.timestamp <= now
-    ).all()
-    
-    for t in txns:
+    # Read the daily rollup instead of the raw ledger
+    for day, txn_type, amount, cogs, profit, _ in rollups.daily_totals(business_id, start_date.date(), now.date()):
         if granularity == 'daily':
-            key = t.timestamp.strftime('%Y-%m-%d')
+            key = day.strftime('%Y-%m-%d')
         elif granularity == 'weekly':
             # ISO Year + Week number
-            key = t.timestamp.strftime('%Y-W%U') 
+            key = day.strftime('%Y-W%U') 
         else:
-            key = t.timestamp.strftime('%Y-%m')
+            key = day.strftime('%Y-%m')
             
         if key not in data:
-            data[key] = {"sales": 0, "expenses": 0, "profit": 0, "cogs": 0, "date": t.timestamp}
+            data[key] = {"sales": 0, "expenses": 0, "profit": 0, "cogs": 0, "date": day}
 
-        if t.type == 'Sale':
-            data[key]["sales"] += t.amount
-            data[key]["cogs"] += (t.cogs or 0)
+        if txn_type == 'Sale':
+            data[key]["sales"] += amount
+            data[key]["cogs"] += cogs
         else:
-            data[key]["expenses"] += t.amount
-        data[key]["profit"] += (t.profit or 0)
+            data[key]["expenses"] += amount
+        data[key]["profit"] += profit
             
     sorted_keys = sorted(data.keys())
     
@@ -794,6 +1177,7 @@ def get_pnl_data(business_id):
 
 @app.route('/api/businesses/<int:business_id>/ai/inventory-insights', methods=['GET'])
 @role_required(['Owner', 'Accountant', 'Analyst'])
+@cached_view('inventory-insights')
 def get_inventory_insights(business_id):
     items = InventoryItem.query.filter_by(business_id=business_id).all()
     inventory_data = [{
@@ -804,15 +1188,10 @@ def get_inventory_insights(business_id):
         "lead_time": item.lead_time
     } for item in items]
     
-    txns = Transaction.query.filter_by(business_id=business_id).all()
-    txn_data = [{
-        "inventory_item_id": t.inventory_item_id,
-        "type": t.type,
-        "quantity": t.quantity,
-        "timestamp": t.timestamp.isoformat()
-    } for t in txns]
+    # Dense per-item daily sales straight from the item rollup
+    item_sales = rollups.item_sales(business_id, [item.id for item in items])
     
-    reorders = ai_service.recommend_reorders(inventory_data, txn_data)
+    reorders = ai_service.recommend_reorders(inventory_data, item_sales)
     
     return jsonify({
         "reorder_recommendations": reorders
@@ -820,21 +1199,14 @@ def get_inventory_insights(business_id):
 
 @app.route('/api/businesses/<int:business_id>/ai/profit-stars', methods=['GET'])
 @role_required(['Owner', 'Accountant', 'Analyst'])
+@cached_view('profit-stars')
 def get_profit_stars(business_id):
     items = InventoryItem.query.filter_by(business_id=business_id).all()
     inventory_data = [{"id": item.id, "name": item.name} for item in items]
     
-    txns = Transaction.query.filter_by(business_id=business_id).all()
-    txn_data = [{
-        "inventory_item_id": t.inventory_item_id,
-        "type": t.type,
-        "quantity": t.quantity,
-        "profit": t.profit,
-        "amount": t.amount,
-        "timestamp": t.timestamp.isoformat()
-    } for t in txns]
+    item_sales = rollups.item_sales(business_id, [item.id for item in items])
     
-    stars = ai_service.get_profitability_insights(inventory_data, txn_data)
+    stars = ai_service.get_profitability_insights(inventory_data, item_sales)
     
     return jsonify({
         "profit_stars": stars
@@ -850,100 +1222,81 @@ def import_transactions(business_id):
     if file.filename == '':
         return jsonify({"message": "No selected file"}), 400
     
-    if file and file.filename.endswith('.csv'):
+    fmt = importer.detect_format(file.filename)
+    if file and fmt:
         try:
-            # Save file for AI Forecaster usage (Persist it)
-            # Use a fixed name 'sales_data.csv' so get_csv_analysis can find it
-            filepath = os.path.join(basedir, f'sales_data_{business_id}.csv') 
-            file.save(filepath)
-            
-            # Parse CSV to import into DB
-            import csv
-            count = 0
-            
-            # Re-open the saved file
-            with open(filepath, 'r', encoding='utf-8-sig') as csvfile: # Handle BOM
-                # Sniff header
-                sample = csvfile.read(1024)
-                csvfile.seek(0)
-                has_header = csv.Sniffer().has_header(sample)
-                
-                reader = csv.reader(csvfile)
-                if has_header:
-                    header = next(reader)
-                    # Simple mapping strategy: Look for keywords in header position
-                    # Default map: date=0, type=1, category=2, amount=3, description=4
-                    # Or just use DictReader with normalized keys
-                
-                csvfile.seek(0)
-                dict_reader = csv.DictReader(csvfile)
-                
-                # Normalize keys to lowercase for robustness
-                normalized_rows = []
-                for row in dict_reader:
-                    lower_row = {k.lower().strip(): v for k, v in row.items() if k}
-                    normalized_rows.append(lower_row)
-                
-                for row in normalized_rows:
-                    try:
-                        # Flexible key matching
-                        date_str = row.get('date') or row.get('timestamp') or row.get('txn_date')
-                        amount_str = row.get('amount') or row.get('revenue') or row.get('cost') or row.get('value')
-                        category = row.get('category') or row.get('expense_type') or 'Others'
-                        txn_type = row.get('type') or ('Expense' if row.get('expense_type') else 'Sale')
-                        description = row.get('description') or row.get('notes') or 'Imported'
-                        
-                        if not date_str or not amount_str:
-                            continue # Skip empty rows
-                            
-                        # Handle Date Formats
-                        try:
-                            # Try standard formats including DD-MM-YYYY
-                            for fmt in ('%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d', '%d-%m-%y'):
-                                try:
-                                    dt = datetime.strptime(date_str, fmt)
-                                    break
-                                except ValueError:
-                                    pass
-                            else:
-                                dt = datetime.now() # Fallback
-                        except:
-                            dt = datetime.now()
-
-                        # Map transaction type standard
-                        raw_type = txn_type.capitalize().strip()
-                        if 'Sale' in raw_type:
-                            final_type = 'Sale'
-                        elif 'Expense' in raw_type:
-                            final_type = 'Expense'
-                        else:
-                            final_type = 'Expense' # Default fallback
-
-                        txn = Transaction(
-                            business_id=business_id,
-                            timestamp=dt,
-                            type=txn_type.capitalize(), # Ensure Sale/Expense
-                            category=category,
-                            amount=float(amount_str),
-                            description=description,
-                            quantity=1,
-                            inventory_item_id=None # Importing generic transactions
-                        )
-                        db.session.add(txn)
-                        count += 1
-                    except Exception as row_error:
-                        print(f"Skipping row {row}: {row_error}")
-                        continue
-            
+            # Import runs in the background; poll the status URL for progress
+            job = import_jobs.create_job(app, business_id, g.user_id, file, fmt)
             db.session.commit()
-            # Do NOT remove filepath, kept for AI analysis
-            return jsonify({"message": f"Successfully imported {count} transactions. AI models updated."}), 201
+            import_jobs.enqueue(app, job.id)
+            return jsonify({
+                "message": f"Import of {job.total_rows} rows queued.",
+                "job_id": job.id,
+                "status_url": f"/api/businesses/{business_id}/import-jobs/{job.id}"
+            }), 202
             
         except Exception as e:
             db.session.rollback()
             return jsonify({"message": f"Import failed: {str(e)}"}), 500
     else:
-        return jsonify({"message": "Invalid file type. Please upload a CSV."}), 400
+        return jsonify({"message": "Invalid file type. Please upload a CSV, CSV.GZ, XLSX or Parquet file."}), 400
+
+@app.route('/api/businesses/<int:business_id>/recompute-profit', methods=['POST'])
+@role_required(['Owner', 'Accountant'])
+def recompute_profit(business_id):
+    """Recalculate profit/COGS of past sales from current cost prices, in the background.
+
+    Body (all optional): inventory_item_id, start_date, end_date (YYYY-MM-DD, inclusive).
+    """
+    data = request.get_json(silent=True) or {}
+    item_id = data.get('inventory_item_id')
+    if item_id:
+        if not InventoryItem.query.filter_by(id=item_id, business_id=business_id).first():
+            return jsonify({"message": "Inventory item not found"}), 404
+    try:
+        start_date = datetime.strptime(data['start_date'], "%Y-%m-%d").date() if data.get('start_date') else None
+        end_date = datetime.strptime(data['end_date'], "%Y-%m-%d").date() if data.get('end_date') else None
+    except (TypeError, ValueError):
+        return jsonify({"message": "Dates must be YYYY-MM-DD"}), 400
+
+    job = recompute_jobs.create_job(business_id, inventory_item_id=item_id or None,
+                                    start_date=start_date, end_date=end_date)
+    db.session.commit()
+    recompute_jobs.enqueue(app, job.id)
+    return jsonify({
+        "message": "Profit recalculation queued.",
+        "job_id": job.id,
+        "status_url": f"/api/businesses/{business_id}/recompute-jobs/{job.id}"
+    }), 202
+
+@app.route('/api/businesses/<int:business_id>/recompute-jobs/<int:job_id>', methods=['GET'])
+@role_required(['Owner', 'Accountant', 'Analyst'])
+def get_recompute_job(business_id, job_id):
+    job = RecomputeJob.query.filter_by(id=job_id, business_id=business_id).first()
+    if not job:
+        return jsonify({"message": "Recompute job not found"}), 404
+    return jsonify(recompute_jobs.job_status(job)), 200
+
+@app.route('/api/businesses/<int:business_id>/import-jobs/<int:job_id>', methods=['GET'])
+@role_required(['Owner', 'Analyst'])
+def get_import_job(business_id, job_id):
+    job = ImportJob.query.filter_by(id=job_id, business_id=business_id).first()
+    if not job:
+        return jsonify({"message": "Import job not found"}), 404
+    return jsonify(import_jobs.job_status(job)), 200
+
+@app.route('/api/businesses/<int:business_id>/import-jobs/<int:job_id>/resume', methods=['POST'])
+@role_required(['Owner', 'Analyst'])
+def resume_import_job(business_id, job_id):
+    job = ImportJob.query.filter_by(id=job_id, business_id=business_id).first()
+    if not job:
+        return jsonify({"message": "Import job not found"}), 404
+    if job.status != 'failed':
+        return jsonify({"message": f"Only failed jobs can be resumed (job is {job.status})"}), 400
+    job.status = 'queued'
+    db.session.commit()
+    import_jobs.enqueue(app, job.id)
+    return jsonify({"message": f"Resuming import from row {job.processed}", "job_id": job.id}), 202
 
 
 
@@ -0,0 +1,38 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from app import app
+from models import ReceiptBlob
+import receipts
+import receipt_images
+
+# Build thumbnails and viewing copies for receipts stored before the image
+# pipeline existed. Work is spread over a process pool (one per core by default),
+# since decoding and resizing photos is CPU-bound. Existing variants are skipped.
+# Usage: python backfill_receipt_images.py [workers] [--force]
+
+def backfill(workers=None, force=False):
+    with app.app_context():
+        folder = app.config['UPLOAD_FOLDER']
+        blobs = [(b.sha256, b.ext) for b in ReceiptBlob.query.filter(
+            ReceiptBlob.ext.in_(receipts.IMAGE_EXTENSIONS), ReceiptBlob.refcount > 0)]
+    workers = workers or os.cpu_count() or 1
+    print(f"Building receipt variants for {len(blobs)} images on {workers} processes...")
+
+    written = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(receipt_images.build_variants, folder, sha256, ext, force): sha256
+                   for sha256, ext in blobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                written += future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Error for {futures[future]}: {str(e)}")
+            if done % 100 == 0:
+                print(f"  {done}/{len(blobs)} receipts processed")
+    print(f"Backfill complete: {written} files written, {failed} receipts failed.")
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != '--force']
+    backfill(int(args[0]) if args else None, '--force' in sys.argv)
@@ -0,0 +1,87 @@
+"""
+Benchmark for concurrent sales of one SKU: the old read-check-write path
+(serialised with a process-wide lock, the only way to keep it from overselling)
+vs the conditional UPDATE in stock.take().
+Runs against a throwaway SQLite database unless BENCH_DATABASE_URL is set
+(e.g. a local Postgres), so it never touches bulkbins.db.
+Usage: python bench_stock.py [threads] [sales_per_thread]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+_tmp = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['DATABASE_URL'] = os.environ.get('BENCH_DATABASE_URL', 'sqlite:///' + _tmp.name)
+
+from app import app
+from models import db, Business, InventoryItem
+import stock
+
+THREADS = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+SALES_PER_THREAD = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+_legacy_lock = threading.Lock()
+
+
+def seed(units):
+    biz = Business(name='Bench Store')
+    db.session.add(biz)
+    db.session.flush()
+    item = InventoryItem(business_id=biz.id, name='Bench SKU', stock_quantity=units,
+                         cost_price=10.0, selling_price=15.0)
+    db.session.add(item)
+    db.session.commit()
+    return biz.id, item.id
+
+
+def legacy_sale(business_id, item_id):
+    with _legacy_lock:
+        item = InventoryItem.query.filter_by(id=item_id, business_id=business_id).first()
+        if item.stock_quantity < 1:
+            db.session.rollback()
+            return False
+        item.stock_quantity -= 1
+        db.session.commit()
+        return True
+
+
+def conditional_sale(business_id, item_id):
+    ok = stock.take(business_id, item_id, 1) is not None
+    db.session.commit()
+    return ok
+
+
+def run(sale):
+    with app.app_context():
+        # Leave some headroom so both paths run out of stock part-way through
+        units = THREADS * SALES_PER_THREAD * 3 // 4
+        business_id, item_id = seed(units)
+    sold = []
+
+    def terminal():
+        with app.app_context():
+            n = sum(sale(business_id, item_id) for _ in range(SALES_PER_THREAD))
+            db.session.remove()
+        sold.append(n)
+
+    threads = [threading.Thread(target=terminal) for _ in range(THREADS)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        left = db.session.get(InventoryItem, item_id).stock_quantity
+    attempts = THREADS * SALES_PER_THREAD
+    print(f"{sale.__name__:<18} {attempts / elapsed:>10.0f} attempts/s  sold={sum(sold)}/{units}  "
+          f"stock_left={left}  oversold={max(0, sum(sold) - units)}")
+
+
+if __name__ == '__main__':
+    print(f"{THREADS} threads x {SALES_PER_THREAD} sales on {app.config['SQLALCHEMY_DATABASE_URI'].split(':')[0]}")
+    run(legacy_sale)
+    run(conditional_sale)
+    os.unlink(_tmp.name)
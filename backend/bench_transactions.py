@@ -0,0 +1,106 @@
+"""
+Benchmark for the transaction listing: full ORM entities (the old path) vs
+column tuples with all fields vs a lean ?fields= projection.
+Runs against a throwaway SQLite database, so it never touches bulkbins.db.
+Usage: python bench_transactions.py [rows_in_ledger]
+"""
+import os
+import sys
+import json
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+_tmp = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['DATABASE_URL'] = 'sqlite:///' + _tmp.name
+
+from app import app, TRANSACTION_FIELDS
+from models import db, Business, Transaction
+
+LEDGER_ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+PAGE_SIZES = (100, 1000, 10000)
+LEAN_FIELDS = ['id', 'timestamp', 'amount', 'type', 'category', 'description']
+REPEAT = 5
+
+
+def seed():
+    biz = Business(name='Bench Store')
+    db.session.add(biz)
+    db.session.flush()
+    now = datetime.utcnow()
+    metadata = json.dumps({"notes": "x" * 1500, "tags": ["bench"] * 20})
+    db.session.execute(Transaction.__table__.insert(), [{
+        "business_id": biz.id,
+        "amount": 100 + i % 50,
+        "category": "Sales",
+        "type": "Sale" if i % 4 else "Expense",
+        "description": f"Bench row {i}",
+        "timestamp": now - timedelta(minutes=i),
+        "receipt_url": f"/api/receipts/receipt_{i}.jpg",
+        "ai_metadata": metadata,
+        "profit": 10.0,
+        "cogs": 90.0,
+        "quantity": 1
+    } for i in range(LEDGER_ROWS)])
+    db.session.commit()
+    return biz.id
+
+
+def entity_page(business_id, n):
+    txns = Transaction.query.filter_by(business_id=business_id).order_by(Transaction.timestamp.desc()).limit(n).all()
+    return [{
+        "id": t.id, "amount": t.amount, "category": t.category, "type": t.type,
+        "timestamp": t.timestamp.isoformat(), "description": t.description,
+        "receipt_url": t.receipt_url, "ai_metadata": t.ai_metadata, "profit": t.profit,
+        "cogs": t.cogs, "inventory_item_id": t.inventory_item_id, "quantity": t.quantity
+    } for t in txns]
+
+
+def tuple_page(business_id, n, names):
+    columns = [TRANSACTION_FIELDS[f] for f in names]
+    rows = db.session.query(*columns).filter(Transaction.business_id == business_id) \
+        .order_by(Transaction.timestamp.desc()).limit(n).all()
+    ts_idx = names.index('timestamp')
+    result = []
+    for row in rows:
+        data = dict(zip(names, row))
+        data['timestamp'] = row[ts_idx].isoformat()
+        result.append(data)
+    return result
+
+
+def measure(fn):
+    timings = []
+    for _ in range(REPEAT):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        json.dumps(fn())
+        timings.append(time.perf_counter() - start)
+    db.session.expunge_all()
+    tracemalloc.start()
+    json.dumps(fn())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings) * 1000, peak / 1024 / 1024
+
+
+def main():
+    with app.app_context():
+        print(f"Seeding {LEDGER_ROWS} transactions into {_tmp.name}...")
+        business_id = seed()
+        paths = [
+            ("ORM entities", lambda n: entity_page(business_id, n)),
+            ("tuples, all fields", lambda n: tuple_page(business_id, n, list(TRANSACTION_FIELDS))),
+            ("tuples, fields=" + ",".join(LEAN_FIELDS[2:]), lambda n: tuple_page(business_id, n, LEAN_FIELDS)),
+        ]
+        print(f"\n{'rows/page':>10}  {'path':<48} {'ms (best)':>10} {'peak MiB':>10}")
+        for n in PAGE_SIZES:
+            for name, fn in paths:
+                ms, mib = measure(lambda: fn(n))
+                print(f"{n:>10}  {name:<48} {ms:>10.1f} {mib:>10.2f}")
+    os.unlink(_tmp.name)
+
+
+if __name__ == "__main__":
+    main()
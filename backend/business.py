@@ -1,24 +1,175 @@
-from flask import request, jsonify
+from flask import request, jsonify, g, has_request_context
 from functools import wraps
-from flask_jwt_extended import decode_token, verify_jwt_in_request, get_jwt_identity
-from models import BusinessMember, User
+from flask_jwt_extended import decode_token, verify_jwt_in_request, get_jwt_identity, get_jwt
+from models import db, BusinessMember, User
+from sqlalchemy import select, update
+from analytics_cache import MemoryCacheBackend
+import threading
+
+# Tokens carry extra claims so the common case needs no DB round trip:
+#   uid   - user id
+#   roles - {"<business_id>": role} for every membership at issue time
+#   mv    - User.membership_version at issue time
+# Any membership change bumps membership_version, which makes older claims stale;
+# stale or missing claims fall back to the User/BusinessMember lookups.
+#
+# Those lookups (and the version check itself) go through a small resolver that
+# memoises per request on flask.g and across requests in a bounded TTL cache.
+# Membership writes and admin deletes evict the affected keys in this worker;
+# other workers pick the change up within IDENTITY_CACHE_TTL seconds.
+IDENTITY_CACHE_TTL = 30
+IDENTITY_CACHE_MAX_ENTRIES = 4096
+
+_identity_cache = MemoryCacheBackend(max_entries=IDENTITY_CACHE_MAX_ENTRIES, ttl=IDENTITY_CACHE_TTL)
+_MISSING = object()
+
+
+class _LookupStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_hits = 0
+        self.cache_hits = 0
+        self.db_lookups = 0
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        return {
+            "lookups_avoided": self.request_hits + self.cache_hits,
+            "request_hits": self.request_hits,
+            "cache_hits": self.cache_hits,
+            "db_lookups": self.db_lookups,
+            "entries": len(_identity_cache)
+        }
+
+
+_stats = _LookupStats()
+
+
+def identity_stats():
+    return _stats.as_dict()
+
+
+def _resolve(key, load):
+    """Request memo -> TTL cache -> load(). Values are stored boxed so None can be cached."""
+    memo = None
+    if has_request_context():
+        memo = g.setdefault('_identity_memo', {})
+        value = memo.get(key, _MISSING)
+        if value is not _MISSING:
+            _stats.incr('request_hits')
+            return value
+
+    boxed = _identity_cache.get(key)
+    if boxed is not None:
+        _stats.incr('cache_hits')
+        value = boxed[0]
+    else:
+        _stats.incr('db_lookups')
+        value = load()
+        _identity_cache.set(key, (value,))
+
+    if memo is not None:
+        memo[key] = value
+    return value
+
+
+def _forget(*keys):
+    memo = g.get('_identity_memo') if has_request_context() else None
+    for key in keys:
+        _identity_cache.delete(key)
+        if memo:
+            memo.pop(key, None)
+
+
+def resolve_user(email):
+    """(user_id, is_master_admin) for an email, or (None, False)."""
+    def load():
+        row = db.session.execute(select(User.id, User.is_master_admin).where(User.email == email)).first()
+        return (row[0], bool(row[1])) if row else (None, False)
+    return _resolve(('user', email), load)
+
+
+def forget_user(user):
+    """Evict a deleted user from the identity caches."""
+    _forget(('user', user.email), ('mv', user.id))
+
+
+def membership_claims(user):
+    """Additional JWT claims for create_access_token()."""
+    return {
+        "uid": user.id,
+        "roles": {str(m.business_id): m.role for m in user.memberships},
+        "mv": user.membership_version or 0
+    }
+
+
+def bump_membership_version(*user_ids, business_id=None):
+    """Invalidate outstanding token claims (and cached roles) for these users."""
+    user_ids = [uid for uid in user_ids if uid is not None]
+    if not user_ids:
+        return
+    db.session.execute(
+        update(User).where(User.id.in_(user_ids)).values(membership_version=User.membership_version + 1)
+    )
+    keys = [('mv', uid) for uid in user_ids]
+    if business_id is not None:
+        keys += [('role', uid, int(business_id)) for uid in user_ids]
+    _forget(*keys)
+
+
+def _current_membership_version(user_id):
+    return _resolve(('mv', user_id), lambda: db.session.execute(
+        select(User.membership_version).where(User.id == user_id)).scalar())
+
+
+def claims_member(claims, business_id):
+    """(user_id, role) from current token claims, or None when the caller must ask the DB."""
+    uid, roles = claims.get('uid'), claims.get('roles')
+    if uid is None or roles is None:
+        return None
+    if _current_membership_version(uid) != claims.get('mv'):
+        return None
+    return uid, roles.get(str(business_id))
+
+
+def _db_member(email, business_id):
+    user_id, _ = resolve_user(email)
+    if not user_id:
+        return None, None
+    return user_id, get_member_role(user_id, business_id)
+
+
+def get_token_member(token, business_id):
+    """Resolve (user_id, role) for a raw bearer token; role is None for non-members."""
+    try:
+        decoded = decode_token(token)
+    except Exception as e:
+        print(f"Token decode error: {e}")
+        return None, None
+    member = claims_member(decoded, business_id)
+    if member:
+        return member
+    return _db_member(decoded['sub'], business_id)
+
 
 def get_user_id(token):
     try:
         decoded = decode_token(token)
         # identity is email in our app.py
-        # We need to look up User by email to get ID
-        email = decoded['sub']
-        user = User.query.filter_by(email=email).first()
-        return user.id if user else None
+        return resolve_user(decoded['sub'])[0]
     except Exception as e:
         print(f"Token decode error: {e}")
         return None
 
 def get_member_role(user_id, business_id):
     if not user_id: return None
-    member = BusinessMember.query.filter_by(user_id=user_id, business_id=business_id).first()
-    return member.role if member else None
+    business_id = int(business_id)
+    return _resolve(('role', user_id, business_id), lambda: db.session.execute(
+        select(BusinessMember.role).where(BusinessMember.user_id == user_id, BusinessMember.business_id == business_id)
+    ).scalar())
 
 def role_required(allowed_roles):
     def decorator(f):
@@ -26,21 +177,28 @@ def role_required(allowed_roles):
         def decorated_function(*args, **kwargs):
             try:
                 verify_jwt_in_request()
-                current_user_email = get_jwt_identity()
-                user = User.query.filter_by(email=current_user_email).first()
-                
+
                 # Try to get business_id from URL kwargs, then args, then json
                 business_id = kwargs.get('business_id') or request.args.get('business_id')
                 if not business_id and request.is_json:
                     business_id = request.json.get('business_id')
-                
-                if not user or not business_id:
+
+                if not business_id:
                     return jsonify({"message": "User or Business ID missing"}), 400
-                
-                membership = BusinessMember.query.filter_by(user_id=user.id, business_id=business_id).first()
-                if not membership or membership.role not in allowed_roles:
+
+                member = claims_member(get_jwt(), business_id)
+                if member:
+                    user_id, role = member
+                else:
+                    user_id, role = _db_member(get_jwt_identity(), business_id)
+                    if not user_id:
+                        return jsonify({"message": "User or Business ID missing"}), 400
+
+                if role not in allowed_roles:
                     return jsonify({"message": f"Access denied. Required roles: {allowed_roles}"}), 403
-                
+
+                # Handlers can read the resolved membership instead of looking it up again
+                g.user_id, g.member_role = user_id, role
                 return f(*args, **kwargs)
             except Exception as e:
                  return jsonify({"message": f"Authorization error: {str(e)}"}), 401
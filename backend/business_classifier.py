@@ -0,0 +1,233 @@
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sqlalchemy import select
+from models import db, Transaction
+from analytics_cache import MemoryCacheBackend
+import model_registry
+import changes
+
+# Per-business expense classifiers, learned from each shop's own categorised expenses.
+# Features come from a HashingVectorizer, which has no vocabulary to fit or store, and
+# the model is an SGDClassifier trained with partial_fit, so an update only streams the
+# rows that changed since the last one:
+#   - the first fit scans the business's expenses in id order, TRAIN_BATCH at a time
+#   - later fits read transaction ids from the change feed after the saved `seq`, and
+#     learn only rows whose (description, category) differs from what was learned for
+#     them, so an amount fix does not feed the same example in again
+# The learned {transaction id: crc32 of (description, category)} map lives in its own
+# file next to the model; it is only read while fitting, and its size is `samples`.
+# Rows whose category was filled in by the model (Transaction.category_suggested) are
+# never learned from, or the model would end up training on its own guesses.
+#
+# Between fits the weights are kept sparsified: hashed features a shop never used stay
+# exactly zero, so a model costs memory in proportion to its vocabulary rather than
+# N_FEATURES x classes. Models are saved under MODEL_DIR/business/ and held in an LRU
+# of MODEL_CACHE_MAX_ENTRIES businesses per worker; a lookup stats the file, so a fit
+# done by another worker is picked up on the next request.
+
+N_FEATURES = 2 ** 18
+TRAIN_BATCH = 1000
+# A shop's model only answers once it has learned from this many rows
+MIN_SAMPLES = 20
+MODEL_CACHE_MAX_ENTRIES = int(os.environ.get('BUSINESS_MODEL_CACHE_MAX_ENTRIES', 256))
+# Bump when features or learner change, so saved models are refitted from scratch
+MODEL_VERSION = 2
+
+_vectorizer = HashingVectorizer(n_features=N_FEATURES, ngram_range=(1, 2), alternate_sign=False, norm='l2')
+_cache = MemoryCacheBackend(max_entries=MODEL_CACHE_MAX_ENTRIES, ttl=7 * 24 * 3600)
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='business-classifier')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _model_path(business_id):
+    return os.path.join(model_registry.MODEL_DIR, 'business', f"{business_id}.joblib")
+
+
+def _learned_path(business_id):
+    return os.path.join(model_registry.MODEL_DIR, 'business', f"{business_id}.learned.joblib")
+
+
+def _example_key(description, category):
+    from ai_service import normalise_description
+    return zlib.crc32(f"{normalise_description(description)}\x00{category}".encode())
+
+
+def _new_classifier():
+    return SGDClassifier(loss='log_loss', alpha=1e-4, random_state=0)
+
+
+def _features(descriptions):
+    # Imported here to avoid a circular import (ai_service builds the global model)
+    from ai_service import normalise_description
+    return _vectorizer.transform([normalise_description(d) for d in descriptions])
+
+
+def load(business_id):
+    """The saved model for a business ({"clf", "seq", "samples", "version"}) or None."""
+    path = _model_path(business_id)
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        _cache.delete(business_id)
+        return None
+    cached = _cache.get(business_id)
+    if cached is not None and cached[0] == mtime:
+        _cache.stats.incr('hits')
+        return cached[1]
+    _cache.stats.incr('misses')
+    model = joblib.load(path, mmap_mode='r')
+    if model.get("version") != MODEL_VERSION:
+        return None
+    _cache.set(business_id, (mtime, model))
+    return model
+
+
+def _save(business_id, model, learned):
+    path = _model_path(business_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    model["clf"].sparsify()
+    # Model first: if we stop in between, the older map only makes a few rows be learned again
+    model_registry.write_atomic(path, lambda tmp: joblib.dump(model, tmp))
+    model_registry.write_atomic(_learned_path(business_id), lambda tmp: joblib.dump(learned, tmp))
+    _cache.delete(business_id)
+
+
+def _confirmed_expenses(business_id):
+    return [
+        Transaction.business_id == business_id,
+        Transaction.type == 'Expense',
+        Transaction.category.isnot(None),
+        Transaction.category != '',
+        Transaction.description.isnot(None),
+        Transaction.description != '',
+        Transaction.category_suggested.isnot(True)
+    ]
+
+
+def _all_categories(business_id):
+    from ai_service import EXPENSE_CATEGORIES
+    found = db.session.execute(
+        select(Transaction.category).where(*_confirmed_expenses(business_id)).distinct()
+    ).scalars().all()
+    return sorted(set(EXPENSE_CATEGORIES) | set(found))
+
+
+def _learn(clf, rows, classes, learned):
+    """partial_fit on (id, description, category) rows and note them as learned."""
+    _, descriptions, labels = zip(*rows)
+    clf.partial_fit(_features(descriptions), np.array(labels), classes=classes)
+    for txn_id, description, category in rows:
+        learned[txn_id] = _example_key(description, category)
+
+
+def _fit_from_scratch(business_id):
+    # Read the feed position first: anything written during the scan is learned (again) next time
+    seq = changes.current_seq(business_id)
+    classes = np.array(_all_categories(business_id))
+    clf = _new_classifier()
+    learned = {}
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(Transaction.id, Transaction.description, Transaction.category)
+            .where(*_confirmed_expenses(business_id), Transaction.id > last_id)
+            .order_by(Transaction.id)
+            .limit(TRAIN_BATCH)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        _learn(clf, [tuple(r) for r in rows], classes, learned)
+    return {"clf": clf, "seq": seq, "samples": len(learned), "version": MODEL_VERSION}, learned
+
+
+def _fit_changes(business_id, model, learned):
+    """Learn rows changed since model["seq"]; None when a new category needs a full refit."""
+    clf = model["clf"]
+    clf.densify()
+    seq = model["seq"]
+    while True:
+        latest, next_seq, has_more = changes.since(business_id, seq, limit=TRAIN_BATCH)
+        ids = [entity_id for (entity, entity_id), (_, op) in latest.items()
+               if entity == changes.TRANSACTION and op == 'upsert']
+        if ids:
+            rows = db.session.execute(
+                select(Transaction.id, Transaction.description, Transaction.category)
+                .where(*_confirmed_expenses(business_id), Transaction.id.in_(ids))
+            ).all()
+            rows = [tuple(r) for r in rows if learned.get(r[0]) != _example_key(r[1], r[2])]
+            if rows:
+                if not {r[2] for r in rows} <= set(clf.classes_):
+                    return None
+                _learn(clf, rows, clf.classes_, learned)
+        seq = next_seq
+        if not has_more:
+            break
+    model["seq"] = seq
+    model["samples"] = len(learned)
+    return model
+
+
+def train(business_id):
+    """Bring a business's model up to date with its change feed; returns the model (None if no data)."""
+    current = changes.current_seq(business_id)
+    model = load(business_id)
+    if model is not None and model["seq"] >= current:
+        return model
+    learned = None
+    if model is not None and os.path.exists(_learned_path(business_id)):
+        # Loaded memory-mapped (read-only); fit on a private copy
+        learned = joblib.load(_learned_path(business_id))
+        model = _fit_changes(business_id, joblib.load(_model_path(business_id)), learned)
+    else:
+        model = None
+    if model is None:
+        model, learned = _fit_from_scratch(business_id)
+    if not model["samples"]:
+        return None
+    _save(business_id, model, learned)
+    return model
+
+
+def _run(app, business_id):
+    with app.app_context():
+        try:
+            train(business_id)
+        except Exception as e:
+            print(f"ERROR training classifier for business {business_id}: {str(e)}")
+        finally:
+            db.session.remove()
+            with _pending_lock:
+                _pending.discard(business_id)
+
+
+def enqueue(app, business_id):
+    """Queue a background fit unless one is already queued for this business."""
+    with _pending_lock:
+        if business_id in _pending:
+            return None
+        _pending.add(business_id)
+    return _executor.submit(_run, app, business_id)
+
+
+def is_stale(business_id, model):
+    return model is None or model["seq"] < changes.current_seq(business_id)
+
+
+def predict(model, descriptions):
+    """(category, probability) per description from a business model."""
+    probs = model["clf"].predict_proba(_features(descriptions))
+    best = probs.argmax(axis=1)
+    classes = model["clf"].classes_
+    return [(str(classes[k]), float(row[k])) for k, row in zip(best, probs)]
+
+
+def cache_stats():
+    return dict(_cache.stats.as_dict(), entries=len(_cache))
@@ -0,0 +1,56 @@
+from models import db, Business, ChangeLog
+from sqlalchemy import update, select, insert, func
+from datetime import datetime
+
+# Change feed for incremental sync. Every write path that inserts, updates or
+# deletes a Transaction or InventoryItem calls record() in the same DB
+# transaction, which appends ChangeLog rows numbered from a per-business counter
+# (Business.change_seq). The counter is bumped with an UPDATE on the business row,
+# so concurrent writers to one business are ordered by commit and a client that
+# has seen seq N never misses a later change with a smaller number.
+#
+# The log only says *which* rows changed; GET /changes reads their current state,
+# so several edits of the same row collapse into one entry per poll.
+
+TRANSACTION = 'transaction'
+INVENTORY_ITEM = 'inventory_item'
+
+
+def record(business_id, entity, entity_ids, op='upsert'):
+    """Append changes for these ids; op is 'upsert' or 'delete'."""
+    ids = [int(i) for i in entity_ids if i is not None]
+    if not ids:
+        return
+    last = db.session.execute(
+        update(Business).where(Business.id == business_id)
+        .values(change_seq=func.coalesce(Business.change_seq, 0) + len(ids))
+        .returning(Business.change_seq)
+    ).scalar()
+    first = last - len(ids) + 1
+    now = datetime.utcnow()
+    db.session.execute(insert(ChangeLog), [
+        {"business_id": business_id, "seq": first + n, "entity": entity, "entity_id": entity_id,
+         "op": op, "created_at": now}
+        for n, entity_id in enumerate(ids)
+    ])
+
+
+def current_seq(business_id):
+    return db.session.execute(select(Business.change_seq).where(Business.id == business_id)).scalar() or 0
+
+
+def since(business_id, seq, limit=500):
+    """Changes after `seq`, latest op per row: ({(entity, id): (seq, op)}, next_seq, has_more)."""
+    rows = db.session.execute(
+        select(ChangeLog.seq, ChangeLog.entity, ChangeLog.entity_id, ChangeLog.op)
+        .where(ChangeLog.business_id == business_id, ChangeLog.seq > seq)
+        .order_by(ChangeLog.seq)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    latest = {}
+    for row_seq, entity, entity_id, op in rows:
+        latest[(entity, entity_id)] = (row_seq, op)
+    next_seq = rows[-1][0] if rows else seq
+    return latest, next_seq, has_more
@@ -0,0 +1,98 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+# Point the app at a throwaway database before it is imported.
+# Set TEST_DATABASE_URL to run the suite against a local Postgres instead.
+_tmpdir = tempfile.mkdtemp(prefix='bulkbins-test-')
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', 'sqlite:///' + os.path.join(_tmpdir, 'test.db'))
+os.environ['IMPORT_FOLDER'] = _tmpdir
+os.environ['UPLOAD_FOLDER'] = os.path.join(_tmpdir, 'receipts')
+os.environ['MODEL_DIR'] = os.path.join(_tmpdir, 'models')
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask_jwt_extended import create_access_token
+from app import app as flask_app
+from models import db, User, Business, BusinessMember, Transaction, InventoryItem
+import rollups
+from business import membership_claims
+
+
+@pytest.fixture
+def app():
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        yield flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def seed_business(n_items=5, days=60, role='Owner', email=None):
+    """Create a user + business with inventory and a few months of sales/expenses."""
+    email = email or f"user{datetime.utcnow().timestamp()}@test.local"
+    user = User(username=email.split('@')[0], email=email)
+    user.set_password('secret')
+    biz = Business(name='Test Store')
+    db.session.add_all([user, biz])
+    db.session.flush()
+    db.session.add(BusinessMember(user_id=user.id, business_id=biz.id, role=role))
+
+    items = []
+    for i in range(n_items):
+        item = InventoryItem(
+            business_id=biz.id, name=f"Item {i}", stock_quantity=50, reorder_level=5,
+            cost_price=10.0, selling_price=15.0 + i, category='Produce', lead_time=2
+        )
+        db.session.add(item)
+        items.append(item)
+    db.session.flush()
+
+    today = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+    for d in range(days):
+        ts = today - timedelta(days=d)
+        for item in items:
+            db.session.add(Transaction(
+                business_id=biz.id, inventory_item_id=item.id, amount=item.selling_price * 2,
+                quantity=2, category=item.category, type='Sale', timestamp=ts,
+                description=f"Sold {item.name}", profit=(item.selling_price - item.cost_price) * 2,
+                cogs=item.cost_price * 2
+            ))
+        db.session.add(Transaction(
+            business_id=biz.id, amount=40.0, quantity=1, category='Utilities', type='Expense',
+            timestamp=ts, description='Electricity bill', profit=-40.0, cogs=40.0
+        ))
+    db.session.flush()
+    rollups.rebuild(biz.id)
+    db.session.commit()
+    return user, biz, items
+
+
+def auth_headers(user):
+    return {"Authorization": f"Bearer {create_access_token(identity=user.email, additional_claims=membership_claims(user))}"}
+
+
+def capture_statements(fn, keep=None):
+    """Run fn() and record the SQL it sends: (result, [(statement, parameters), ...]).
+
+    keep(statement) narrows the capture, e.g. to SELECTs or to one table.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if keep is None or keep(statement):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        result = fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return result, statements
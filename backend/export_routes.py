@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify, send_file, current_app
 from models import db, Transaction, Business, User, BusinessMember
-from business import get_user_id, get_member_role
+from business import get_token_member
 from sqlalchemy import func
 from datetime import datetime, timedelta
 import io
@@ -13,18 +13,20 @@ import matplotlib.pyplot as plt
 import numpy as np
 import os
 import tempfile
+import rollups
 
 export_bp = Blueprint("export", __name__)
 
+PDF_MAX_ROWS = 300
 
-def _get_auth(req):
-    """Extract user_id from Authorization header."""
+
+def _get_auth(req, business_id):
+    """Extract (user_id, role) from the Authorization header."""
     auth = req.headers.get("Authorization")
     if not auth:
         return None, None
     token = auth.split(" ")[1]
-    user_id = get_user_id(token)
-    return user_id, token
+    return get_token_member(token, business_id)
 
 
 def _parse_dates(req):
@@ -42,14 +44,49 @@ def _parse_dates(req):
     return start_date, end_date
 
 
-def _fetch_transactions(business_id, start_date=None, end_date=None):
+def _fetch_transactions(business_id, start_date=None, end_date=None, limit=None):
     """Fetch transactions with optional date filtering."""
     query = Transaction.query.filter_by(business_id=business_id)
     if start_date:
         query = query.filter(Transaction.timestamp >= start_date)
     if end_date:
         query = query.filter(Transaction.timestamp <= end_date)
-    return query.order_by(Transaction.timestamp.desc()).all()
+    query = query.order_by(Transaction.timestamp.desc())
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def _day_range(start_date, end_date):
+    """Export dates are whole days, so they map directly onto the daily rollup."""
+    return (start_date.date() if start_date else None, end_date.date() if end_date else None)
+
+
+def _fetch_summary(business_id, start_date=None, end_date=None):
+    """Totals, monthly series and expense categories for a report, read from the daily rollup."""
+    start_day, end_day = _day_range(start_date, end_date)
+    totals = rollups.period_totals(business_id, start_day, end_day)
+
+    monthly = {}
+    sale_profit = 0
+    for day, txn_type, amount, _, profit, _ in rollups.daily_totals(business_id, start_day, end_day):
+        month_key = day.strftime('%Y-%m')
+        if month_key not in monthly:
+            monthly[month_key] = {'sales': 0, 'expenses': 0, 'profit': 0}
+        if txn_type == 'Sale':
+            monthly[month_key]['sales'] += amount
+            monthly[month_key]['profit'] += profit
+            sale_profit += profit
+        else:
+            monthly[month_key]['expenses'] += amount
+
+    categories = {}
+    for cat, _, amount in rollups.category_totals(business_id, start_day, end_day, txn_type='Expense'):
+        cat = cat or 'Other'
+        categories[cat] = categories.get(cat, 0) + amount
+
+    totals['sale_profit'] = sale_profit
+    return {"totals": totals, "monthly": monthly, "expense_categories": categories}
 
 
 def _build_csv(transactions):
@@ -124,23 +161,9 @@ def _build_excel(transactions, business_name, start_date, end_date):
     return output.getvalue()
 
 
-def _generate_chart(chart_type, transactions, business_name):
+def _generate_chart(chart_type, summary, business_name):
     """Generate a chart image and return the temp file path."""
-    sales = [t for t in transactions if t.type == 'Sale']
-    expenses = [t for t in transactions if t.type == 'Expense']
-
-    # Group by month
-    monthly = {}
-    for t in transactions:
-        if t.timestamp:
-            month_key = t.timestamp.strftime('%Y-%m')
-            if month_key not in monthly:
-                monthly[month_key] = {'sales': 0, 'expenses': 0, 'profit': 0}
-            if t.type == 'Sale':
-                monthly[month_key]['sales'] += t.amount
-                monthly[month_key]['profit'] += (t.profit or 0)
-            else:
-                monthly[month_key]['expenses'] += t.amount
+    monthly = summary['monthly']
 
     if not monthly:
         return None
@@ -179,10 +202,7 @@ def _generate_chart(chart_type, transactions, business_name):
         ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: f'₹{x:,.0f}'))
 
     elif chart_type == 'expense_breakdown':
-        cat_totals = {}
-        for t in expenses:
-            cat = t.category or 'Other'
-            cat_totals[cat] = cat_totals.get(cat, 0) + t.amount
+        cat_totals = summary['expense_categories']
         if cat_totals:
             colors = ['#3e8c4e', '#ef4444', '#f97316', '#3b82f6', '#8b5cf6', '#ec4899', '#14b8a6']
             categories = list(cat_totals.keys())
@@ -211,13 +231,15 @@ def _clean_text(text):
     return text.encode('latin-1', 'replace').decode('latin-1')
 
 
-def _build_pdf(transactions, business, user, start_date, end_date):
-    """Generate a chart-rich PDF report."""
-    sales = [t for t in transactions if t.type == 'Sale']
-    expenses = [t for t in transactions if t.type == 'Expense']
-    total_sales = sum(t.amount for t in sales)
-    total_expenses = sum(t.amount for t in expenses)
-    total_profit = sum(t.profit or 0 for t in sales)
+def _build_pdf(transactions, summary, business, user, start_date, end_date):
+    """Generate a chart-rich PDF report.
+
+    Totals and charts come from the rollup summary; `transactions` only feeds the
+    detail table, so callers can pass just the first PDF_MAX_ROWS rows.
+    """
+    total_sales = summary['totals']['sales']
+    total_expenses = summary['totals']['expenses']
+    total_profit = summary['totals']['sale_profit']
     net = total_sales - total_expenses
 
     date_range = "All Time"
@@ -329,15 +351,15 @@ def _build_pdf(transactions, business, user, start_date, end_date):
     chart_files = []
     
     # Income vs Expense Chart (Full Width)
-    chart_path = _generate_chart('profit_loss', transactions, business.name)
+    chart_path = _generate_chart('profit_loss', summary, business.name)
     if chart_path:
         chart_files.append(chart_path)
         pdf.image(chart_path, x=10, w=190)
         pdf.ln(5)
     
     # Side by Side Charts
-    trend_path = _generate_chart('profit_trend', transactions, business.name)
-    breakdown_path = _generate_chart('expense_breakdown', transactions, business.name)
+    trend_path = _generate_chart('profit_trend', summary, business.name)
+    breakdown_path = _generate_chart('expense_breakdown', summary, business.name)
     
     if trend_path and breakdown_path:
         y_pos = pdf.get_y()
@@ -382,7 +404,7 @@ def _build_pdf(transactions, business, user, start_date, end_date):
     base_fill_color = (255, 255, 255)
     alt_fill_color = (248, 250, 252)
 
-    for idx, t in enumerate(transactions[:300]): # Limit rows
+    for idx, t in enumerate(transactions[:PDF_MAX_ROWS]): # Limit rows
         if pdf.get_y() > 270:
             pdf.add_page()
             # Re-print header
@@ -447,16 +469,17 @@ def _build_pdf(transactions, business, user, start_date, end_date):
 # ──────────────────────────────────────────────────────
 @export_bp.route("/businesses/<int:business_id>/export/transactions", methods=["GET"])
 def export_transactions(business_id):
-    user_id, _ = _get_auth(request)
+    user_id, role = _get_auth(request, business_id)
     if not user_id:
         return jsonify({"error": "Unauthorized"}), 401
-    role = get_member_role(user_id, business_id)
     if not role:
         return jsonify({"error": "Forbidden"}), 403
 
     fmt = request.args.get('format', 'csv').lower()
     start_date, end_date = _parse_dates(request)
-    transactions = _fetch_transactions(business_id, start_date, end_date)
+    # The PDF only lists the first PDF_MAX_ROWS rows; its totals and charts come from the rollup
+    transactions = _fetch_transactions(business_id, start_date, end_date,
+                                       limit=PDF_MAX_ROWS if fmt == 'pdf' else None)
     business = Business.query.get(business_id)
     user = User.query.get(user_id)
 
@@ -477,7 +500,8 @@ def export_transactions(business_id):
             download_name=f'{business.name}_report_{datetime.now().strftime("%Y%m%d")}.xlsx'
         )
     elif fmt == 'pdf':
-        data = _build_pdf(transactions, business, user, start_date, end_date)
+        summary = _fetch_summary(business_id, start_date, end_date)
+        data = _build_pdf(transactions, summary, business, user, start_date, end_date)
         return send_file(
             io.BytesIO(data),
             mimetype='application/pdf',
@@ -499,10 +523,9 @@ def email_report(business_id):
         if not mail:
             return jsonify({"error": "Email service not configured"}), 500
 
-        user_id, _ = _get_auth(request)
+        user_id, role = _get_auth(request, business_id)
         if not user_id:
             return jsonify({"error": "Unauthorized"}), 401
-        role = get_member_role(user_id, business_id)
         if not role:
             return jsonify({"error": "Forbidden"}), 403
 
@@ -513,7 +536,11 @@ def email_report(business_id):
             
         start_date, end_date = _parse_dates(request)
 
-        transactions = _fetch_transactions(business_id, start_date, end_date)
+        # Only CSV/Excel attachments need every row; totals come from the rollup
+        needs_all_rows = any(f.lower() in ('csv', 'excel') for f in formats)
+        transactions = _fetch_transactions(business_id, start_date, end_date,
+                                           limit=None if needs_all_rows else PDF_MAX_ROWS)
+        summary = _fetch_summary(business_id, start_date, end_date)
         business = Business.query.get(business_id)
         user = User.query.get(user_id)
 
@@ -524,8 +551,8 @@ def email_report(business_id):
         if start_date and end_date:
             date_range = f"{start_date.strftime('%d %b %Y')} - {end_date.strftime('%d %b %Y')}"
 
-        total_sales = sum(t.amount for t in transactions if t.type == 'Sale')
-        total_expenses = sum(t.amount for t in transactions if t.type == 'Expense')
+        total_sales = summary['totals']['sales']
+        total_expenses = summary['totals']['expenses']
         net = total_sales - total_expenses
 
         # Build email
@@ -542,7 +569,7 @@ Formats: {fmt_str}
 Total Sales: Rs. {total_sales:,.2f}
 Total Expenses: Rs. {total_expenses:,.2f}
 Net Profit: Rs. {net:,.2f}
-Transactions: {len(transactions)}
+Transactions: {summary['totals']['count']}
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
 Exported by: {user.username} ({user.email})
@@ -569,7 +596,7 @@ The detailed reports are attached to this email.
                 filename = f'{business.name}_report.xlsx'
                 mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
             else: # pdf or others
-                file_data = _build_pdf(transactions, business, user, start_date, end_date)
+                file_data = _build_pdf(transactions, summary, business, user, start_date, end_date)
                 filename = f'{business.name}_report.pdf'
                 mimetype = 'application/pdf'
 
@@ -0,0 +1,163 @@
+import json
+import os
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import update, or_, and_
+from models import db, ImportJob
+import importer
+
+# Background CSV imports. The upload endpoint saves the file, creates an ImportJob
+# and hands its id to a small in-process thread pool; the worker streams the file
+# through importer.import_file and commits the rows, rollup and job progress together
+# after every chunk. A job that fails (or whose worker died) resumes from its last
+# committed chunk. Jobs are claimed with a conditional UPDATE, so when several
+# gunicorn workers try to pick up the same job only one of them runs it.
+
+IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', 2))
+# A running job whose heartbeat is older than this is treated as abandoned
+STALE_AFTER = timedelta(minutes=5)
+
+_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix='import-job')
+
+
+def create_job(app, business_id, user_id, upload, fmt):
+    """Persist an uploaded file and queue an import job for it. The caller commits, then calls enqueue()."""
+    folder = os.path.join(app.config['IMPORT_FOLDER'], 'import_jobs')
+    os.makedirs(folder, exist_ok=True)
+    filepath = os.path.join(folder, f"{business_id}_{uuid.uuid4().hex}{importer.suffix_for(fmt)}")
+    upload.save(filepath)
+
+    job = ImportJob(
+        business_id=business_id,
+        user_id=user_id,
+        filename=upload.filename,
+        filepath=filepath,
+        status='queued',
+        total_rows=importer.count_rows(filepath, fmt)
+    )
+    db.session.add(job)
+    return job
+
+
+def enqueue(app, job_id):
+    return _executor.submit(run_job, app, job_id)
+
+
+def _claim(job_id):
+    """Atomically move a job to 'running'; False if someone else has it (or it is finished)."""
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(ImportJob)
+        .where(ImportJob.id == job_id, or_(
+            ImportJob.status.in_(['queued', 'failed']),
+            and_(ImportJob.status == 'running', ImportJob.updated_at < now - STALE_AFTER)
+        ))
+        .values(status='running', started_at=now, updated_at=now, finished_at=None, message=None,
+                run_offset=ImportJob.processed)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _load_report(job):
+    return {
+        "processed": job.processed or 0,
+        "imported": job.imported or 0,
+        "skipped": job.skipped or 0,
+        "duplicates": job.duplicates or 0,
+        "errors": json.loads(job.errors) if job.errors else [],
+        "date_format": job.date_format,
+        "date_format_ambiguous": bool(job.date_format_ambiguous)
+    }
+
+
+def _save_report(job, report):
+    job.processed = report["processed"]
+    job.imported = report["imported"]
+    job.skipped = report["skipped"]
+    job.duplicates = report["duplicates"]
+    job.errors = json.dumps(report["errors"])
+    job.date_format = report["date_format"]
+    job.date_format_ambiguous = report["date_format_ambiguous"]
+    job.updated_at = datetime.utcnow()
+
+
+def run_job(app, job_id):
+    with app.app_context():
+        try:
+            if not _claim(job_id):
+                return
+            job = db.session.get(ImportJob, job_id)
+
+            def on_chunk(report):
+                # Rows, rollup deltas and progress land in the same commit
+                _save_report(job, report)
+                db.session.commit()
+
+            chunk_size = app.config.get('IMPORT_CHUNK_SIZE', importer.CHUNK_SIZE)
+            fmt = importer.detect_format(job.filepath)
+            importer.import_file(job.filepath, job.business_id, fmt=fmt, chunk_size=chunk_size,
+                                 report=_load_report(job), on_chunk=on_chunk)
+
+            # Keep the latest CSV upload where the CSV forecaster (ai/csv-analysis) looks for it
+            if fmt == 'csv':
+                shutil.copyfile(job.filepath, os.path.join(app.config['IMPORT_FOLDER'], f"sales_data_{job.business_id}.csv"))
+            job.status = 'completed'
+            job.finished_at = job.updated_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"ERROR in import job {job_id}: {str(e)}")
+            db.session.execute(
+                update(ImportJob).where(ImportJob.id == job_id)
+                .values(status='failed', message=str(e)[:500], updated_at=datetime.utcnow())
+            )
+            db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def resume_interrupted(app):
+    """Queue jobs left behind by a restart (still queued, or running with a stale heartbeat)."""
+    with app.app_context():
+        cutoff = datetime.utcnow() - STALE_AFTER
+        ids = [job_id for (job_id,) in db.session.query(ImportJob.id).filter(or_(
+            ImportJob.status == 'queued',
+            and_(ImportJob.status == 'running', ImportJob.updated_at < cutoff)
+        ))]
+    for job_id in ids:
+        enqueue(app, job_id)
+    return ids
+
+
+def job_status(job):
+    """Progress payload for the status endpoint."""
+    now = job.finished_at or datetime.utcnow()
+    rows_per_sec = eta = None
+    if job.started_at:
+        elapsed = (now - job.started_at).total_seconds()
+        done_this_run = (job.processed or 0) - (job.run_offset or 0)
+        if elapsed > 0 and done_this_run > 0:
+            rows_per_sec = round(done_this_run / elapsed, 1)
+            if job.status == 'running':
+                eta = round(max((job.total_rows or 0) - job.processed, 0) / rows_per_sec, 1)
+    return {
+        "id": job.id,
+        "status": job.status,
+        "filename": job.filename,
+        "total_rows": job.total_rows,
+        "processed": job.processed,
+        "imported": job.imported,
+        "rejected": job.skipped,
+        "duplicates": job.duplicates,
+        "rejections": json.loads(job.errors) if job.errors else [],
+        "date_format": job.date_format,
+        "date_format_ambiguous": job.date_format_ambiguous,
+        "rows_per_sec": rows_per_sec,
+        "eta_seconds": eta,
+        "message": job.message,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
@@ -0,0 +1,406 @@
+import csv
+import gzip
+import hashlib
+import time
+from contextlib import contextmanager
+from datetime import datetime, date, timezone
+from sqlalchemy import insert, select
+import pandas as pd
+from models import db, Transaction
+from analytics_cache import bump_data_version
+import rollups
+import changes
+
+# Streaming importer: reads the file CHUNK_SIZE rows at a time and writes each
+# chunk with one Core executemany INSERT plus one rollup update, so memory stays
+# flat regardless of file size and no Transaction objects are built.
+#
+# Formats: .csv, .csv.gz (decompressed as it streams), .xlsx (openpyxl read-only
+# mode) and .parquet (pyarrow record batches, reading only the alias columns).
+# pyarrow/openpyxl are imported lazily, only when such a file is uploaded. Every
+# format yields the same lower-cased row dicts, so normalise_row() handles all.
+#
+# Dates: the format is detected once per file from the first chunk, each chunk is
+# parsed with pandas.to_datetime(format=...), and only the rows that don't match
+# go through the per-row strptime cascade. Rows whose date can't be parsed at all
+# are skipped and reported rather than stamped with the current time.
+#
+# Re-uploads: every imported row gets a fingerprint (see assign_fingerprints) in
+# an indexed column, and each chunk drops rows whose fingerprint is already in the
+# ledger with one batched IN lookup, so overlapping statements aren't doubled.
+
+CHUNK_SIZE = 5000
+# Order matters: it breaks ties when a sample fits several formats (e.g. 01/02/2026)
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d', '%d-%m-%y')
+DATE_SAMPLE_SIZE = 500
+MAX_REPORTED_ERRORS = 20
+FINGERPRINT_BATCH = 900 # Stays under SQLite's bound-parameter limit on older builds
+
+# Upload suffix -> format (longest suffix wins, so .csv.gz isn't taken for .csv)
+FILE_FORMATS = {'.csv.gz': 'csv.gz', '.csv': 'csv', '.parquet': 'parquet', '.xlsx': 'xlsx'}
+# Columns normalise_row() can use; Parquet files are read with just these
+ALIAS_COLUMNS = {'date', 'timestamp', 'txn_date', 'amount', 'revenue', 'cost', 'value',
+                 'category', 'expense_type', 'type', 'description', 'notes'}
+
+
+def detect_format(filename):
+    name = (filename or '').lower()
+    for suffix, fmt in FILE_FORMATS.items():
+        if name.endswith(suffix):
+            return fmt
+    return None
+
+
+def suffix_for(fmt):
+    return next(suffix for suffix, f in FILE_FORMATS.items() if f == fmt)
+
+
+def _parse_date(date_str):
+    """Slow path for a single value: the format cascade, then ISO 8601 (with time)."""
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(date_str, fmt)
+        except ValueError:
+            pass
+    try:
+        return datetime.fromisoformat(date_str)
+    except ValueError:
+        return None
+
+
+def detect_date_format(samples):
+    """Pick the format that parses the most sample values.
+
+    Returns (format, ambiguous). ambiguous is True when a day/month swap of the
+    chosen format fits the sample equally well, i.e. no value had a day above 12.
+    """
+    samples = [s for s in samples if s and isinstance(s, str)][:DATE_SAMPLE_SIZE]
+    if not samples:
+        return None, False
+    series = pd.Series(samples)
+    scores = {fmt: int(pd.to_datetime(series, format=fmt, errors='coerce').notna().sum()) for fmt in DATE_FORMATS}
+    best = max(DATE_FORMATS, key=lambda fmt: scores[fmt]) # max() keeps the first on ties
+    if scores[best] == 0:
+        return None, False
+    swapped = best.replace('%d', '%D').replace('%m', '%d').replace('%D', '%m')
+    ambiguous = swapped != best and scores.get(swapped, 0) == scores[best]
+    return best, ambiguous
+
+
+def _as_naive_datetime(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    return datetime(value.year, value.month, value.day)
+
+
+def parse_dates(values, fmt):
+    """Vectorised parse of a chunk of date values; misses fall back to _parse_date (None if hopeless).
+
+    XLSX/Parquet cells that already hold dates are passed through as-is.
+    """
+    result = [None] * len(values)
+    text_idx = []
+    for i, value in enumerate(values):
+        if isinstance(value, (datetime, date)):
+            result[i] = _as_naive_datetime(value)
+        else:
+            text_idx.append(i)
+    if not text_idx:
+        return result
+
+    strings = [str(values[i]).strip() for i in text_idx]
+    if fmt:
+        parsed = pd.to_datetime(pd.Series(strings), format=fmt, errors='coerce')
+        fast = pd.DatetimeIndex(parsed).to_pydatetime()
+        missed = parsed.isna().to_numpy()
+    else:
+        fast, missed = [None] * len(strings), [True] * len(strings)
+    for i, text, dt, miss in zip(text_idx, strings, fast, missed):
+        result[i] = _parse_date(text) if miss else dt
+    return result
+
+
+def _first(row, *keys):
+    for key in keys:
+        value = row.get(key)
+        if value is not None and value != '':
+            return value
+    return None
+
+
+def normalise_row(row, business_id):
+    """Map one source row (lower-cased keys) onto Transaction columns, or None to skip it."""
+    # Flexible key matching
+    date_value = _first(row, 'date', 'timestamp', 'txn_date')
+    amount_value = _first(row, 'amount', 'revenue', 'cost', 'value')
+    category = _first(row, 'category', 'expense_type')
+    txn_type = _first(row, 'type') or ('Expense' if _first(row, 'expense_type') else 'Sale')
+    description = _first(row, 'description', 'notes') or 'Imported'
+
+    if date_value is None or amount_value is None:
+        return None # Skip empty rows
+
+    # Map transaction type standard
+    raw_type = str(txn_type).capitalize().strip()
+    if 'Sale' in raw_type:
+        final_type = 'Sale'
+    else:
+        final_type = 'Expense' # Default fallback
+
+    return {
+        "business_id": business_id,
+        "timestamp": date_value.strip() if isinstance(date_value, str) else date_value, # Parsed per chunk by parse_dates()
+        "type": final_type,
+        "category": str(category) if category is not None else 'Others',
+        "_uncategorised": category is None, # Filled in by auto_categorise(); not a column
+        "category_suggested": False,
+        "amount": float(amount_value),
+        "description": str(description),
+        "quantity": 1,
+        "inventory_item_id": None, # Importing generic transactions
+        "profit": 0.0,
+        "cogs": 0.0
+    }
+
+
+def _csv_rows(textfile):
+    reader = csv.DictReader(textfile)
+    for row in reader:
+        yield reader.line_num, {k.lower().strip(): v for k, v in row.items() if k}
+
+
+def _xlsx_rows(workbook):
+    rows = workbook.active.iter_rows(values_only=True)
+    header = next(rows, None) or ()
+    keys = [str(h).lower().strip() if h is not None else None for h in header]
+    for line_num, values in enumerate(rows, start=2):
+        yield line_num, {k: v for k, v in zip(keys, values) if k}
+
+
+def _parquet_rows(parquet_file, chunk_size):
+    # Column-wise read of only the columns the alias rules use
+    names = [n for n in parquet_file.schema_arrow.names if n.lower().strip() in ALIAS_COLUMNS]
+    keys = [n.lower().strip() for n in names]
+    line_num = 1
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=names):
+        columns = [batch.column(i).to_pylist() for i in range(batch.num_columns)]
+        for values in zip(*columns):
+            line_num += 1
+            yield line_num, dict(zip(keys, values))
+
+
+@contextmanager
+def open_rows(filepath, fmt, chunk_size=CHUNK_SIZE):
+    """Yield an iterator of (line_number, row) for any supported format."""
+    if fmt == 'csv':
+        with open(filepath, 'r', encoding='utf-8-sig', newline='') as f: # Handle BOM
+            yield _csv_rows(f)
+    elif fmt == 'csv.gz':
+        with gzip.open(filepath, 'rt', encoding='utf-8-sig', newline='') as f:
+            yield _csv_rows(f)
+    elif fmt == 'xlsx':
+        from openpyxl import load_workbook
+        workbook = load_workbook(filepath, read_only=True, data_only=True)
+        try:
+            yield _xlsx_rows(workbook)
+        finally:
+            workbook.close()
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(filepath)
+        try:
+            yield _parquet_rows(parquet_file, chunk_size)
+        finally:
+            parquet_file.close()
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def iter_chunks(rows, chunk_size=CHUNK_SIZE):
+    """Group (line_number, row) pairs into lists of chunk_size."""
+    chunk = []
+    for item in rows:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def count_rows(filepath, fmt='csv'):
+    """Cheap data-row estimate for progress/ETA."""
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(filepath).metadata.num_rows
+    if fmt == 'xlsx':
+        from openpyxl import load_workbook
+        workbook = load_workbook(filepath, read_only=True)
+        try:
+            return max((workbook.active.max_row or 1) - 1, 0)
+        finally:
+            workbook.close()
+    # CSV: newlines minus the header (decompressing on the fly for .csv.gz)
+    lines = 0
+    with (gzip.open(filepath, 'rb') if fmt == 'csv.gz' else open(filepath, 'rb')) as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            lines += block.count(b'\n')
+    return max(lines - 1, 0)
+
+
+def insert_chunk(business_id, rows):
+    """Bulk insert normalised rows and fold them into the rollup."""
+    if not rows:
+        return
+    ids = db.session.execute(insert(Transaction).returning(Transaction.id), rows).scalars().all()
+    changes.record(business_id, changes.TRANSACTION, ids)
+    rollups.apply_entries([
+        (business_id, r["timestamp"].date(), r["type"], r["category"],
+         r["amount"], r["cogs"], r["profit"], None, r["quantity"])
+        for r in rows
+    ])
+
+
+def auto_categorise(rows):
+    """Suggest categories for expense rows that came without one, one classifier batch per chunk.
+
+    Runs after fingerprinting, so fingerprints do not depend on the model's answer.
+    """
+    todo = [r for r in rows if r.pop("_uncategorised", False) and r["type"] == 'Expense']
+    if not todo:
+        return
+    from ai_service import ai_service
+    suggestions = ai_service.classify_expenses([r["description"] for r in todo], business_id=todo[0]["business_id"])
+    for row, category in zip(todo, suggestions):
+        row["category"] = category
+        row["category_suggested"] = True
+
+
+def new_report():
+    return {"processed": 0, "imported": 0, "skipped": 0, "duplicates": 0, "errors": [],
+            "date_format": None, "date_format_ambiguous": False}
+
+
+def content_key(row):
+    """Digest of the fields that identify a statement line."""
+    raw = "|".join((str(row["business_id"]), row["timestamp"].isoformat(), f"{row['amount']:.2f}",
+                    row["type"], row["category"] or "", row["description"] or ""))
+    return hashlib.sha256(raw.encode()).digest()
+
+
+def assign_fingerprints(rows, occurrences):
+    """Fingerprint = content + occurrence number within the file.
+
+    Identical lines inside one statement (two equal sales on the same day) stay
+    distinct, while the same lines in an overlapping re-upload map to the same
+    fingerprints. `occurrences` carries the per-content counts across chunks.
+    """
+    for row in rows:
+        key = content_key(row)
+        n = occurrences.get(key, 0)
+        occurrences[key] = n + 1
+        row["fingerprint"] = hashlib.sha256(key + str(n).encode()).hexdigest()
+
+
+def known_fingerprints(business_id, fingerprints):
+    """Fingerprints already in the ledger, looked up with batched IN queries on the index."""
+    known = set()
+    fingerprints = list(fingerprints)
+    for i in range(0, len(fingerprints), FINGERPRINT_BATCH):
+        batch = fingerprints[i:i + FINGERPRINT_BATCH]
+        known.update(db.session.execute(
+            select(Transaction.fingerprint).where(Transaction.business_id == business_id,
+                                                  Transaction.fingerprint.in_(batch))
+        ).scalars())
+    return known
+
+
+def import_file(filepath, business_id, fmt=None, chunk_size=CHUNK_SIZE, report=None, on_chunk=None):
+    """Import a CSV / CSV.GZ / XLSX / Parquet file into the ledger and return an import report.
+
+    Pass a previous report to resume after its `processed` rows. on_chunk(report) runs
+    after each chunk is written (background jobs commit there); otherwise the caller commits.
+    Rows whose fingerprint is already in the ledger are counted as duplicates and skipped.
+    """
+    started = time.perf_counter()
+    report = report or new_report()
+    report.setdefault("duplicates", 0)
+    errors = report["errors"]
+    resumed_from = report["processed"]
+    occurrences = {}
+    row_index = 0
+
+    def reject(line_num, message):
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": line_num, "error": message})
+
+    fmt = fmt or detect_format(filepath)
+    with open_rows(filepath, fmt, chunk_size) as rows:
+        for chunk in iter_chunks(rows, chunk_size):
+            # When resuming, rows before `resumed_from` are only replayed to rebuild the
+            # occurrence counts; their outcome is already in the report.
+            replay = row_index < resumed_from
+            if replay and row_index + len(chunk) > resumed_from:
+                split = resumed_from - row_index
+                fresh_chunk, chunk = chunk[split:], chunk[:split]
+            else:
+                fresh_chunk = None
+            for part, replaying in ((chunk, replay), (fresh_chunk, False)):
+                if not part:
+                    continue
+                row_index += len(part)
+                _import_part(business_id, part, report, occurrences, reject, replaying)
+                if not replaying and on_chunk:
+                    on_chunk(report)
+
+    elapsed = time.perf_counter() - started
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_sec"] = round((report["processed"] - resumed_from) / elapsed, 1) if elapsed > 0 else None
+    return report
+
+
+def _import_part(business_id, chunk, report, occurrences, reject, replay=False):
+    rows, lines = [], []
+    for line_num, row in chunk:
+        try:
+            values = normalise_row(row, business_id)
+        except (ValueError, TypeError, AttributeError) as row_error:
+            values = None
+            if not replay:
+                reject(line_num, str(row_error))
+        if values is None:
+            if not replay:
+                report["skipped"] += 1
+            continue
+        rows.append(values)
+        lines.append(line_num)
+
+    if report["date_format"] is None and not replay:
+        report["date_format"], report["date_format_ambiguous"] = \
+            detect_date_format([r["timestamp"] for r in rows])
+
+    parsed = []
+    for values, line_num, dt in zip(rows, lines, parse_dates([r["timestamp"] for r in rows], report["date_format"])):
+        if dt is None:
+            if not replay:
+                report["skipped"] += 1
+                reject(line_num, f"Unrecognised date: {values['timestamp']}")
+            continue
+        values["timestamp"] = dt
+        parsed.append(values)
+
+    assign_fingerprints(parsed, occurrences)
+    if replay:
+        return
+
+    known = known_fingerprints(business_id, [r["fingerprint"] for r in parsed])
+    fresh = [r for r in parsed if r["fingerprint"] not in known]
+    auto_categorise(fresh)
+    if fresh:
+        insert_chunk(business_id, fresh)
+        bump_data_version(business_id)
+    report["duplicates"] += len(parsed) - len(fresh)
+    report["imported"] += len(fresh)
+    report["processed"] += len(chunk)
@@ -0,0 +1,31 @@
+import sqlite3
+import os
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+db_path = os.path.join(basedir, 'bulkbins.db')
+
+def migrate():
+    print(f"Connecting to {db_path}...")
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
+    try:
+        # Check if column exists
+        cursor.execute("PRAGMA table_info(\"transaction\")")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'category_suggested' not in columns:
+            print("Adding 'category_suggested' column to 'transaction' table...")
+            cursor.execute("ALTER TABLE \"transaction\" ADD COLUMN category_suggested BOOLEAN DEFAULT 0")
+            conn.commit()
+            print("Migration successful: Added 'category_suggested' column.")
+        else:
+            print("Column 'category_suggested' already exists in 'transaction' table.")
+            
+    except Exception as e:
+        print(f"Error during migration: {str(e)}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,31 @@
+import sqlite3
+import os
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+db_path = os.path.join(basedir, 'bulkbins.db')
+
+def migrate():
+    print(f"Connecting to {db_path}...")
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
+    try:
+        # Check if column exists
+        cursor.execute("PRAGMA table_info(business)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'data_version' not in columns:
+            print("Adding 'data_version' column to 'business' table...")
+            cursor.execute("ALTER TABLE business ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0")
+            conn.commit()
+            print("Migration successful: Added 'data_version' column.")
+        else:
+            print("Column 'data_version' already exists in 'business' table.")
+            
+    except Exception as e:
+        print(f"Error during migration: {str(e)}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,40 @@
+import sqlite3
+import os
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+db_path = os.path.join(basedir, 'bulkbins.db')
+
+def migrate():
+    print(f"Connecting to {db_path}...")
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
+    try:
+        # Check if column exists
+        cursor.execute("PRAGMA table_info(\"transaction\")")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'fingerprint' not in columns:
+            print("Adding 'fingerprint' column to 'transaction' table...")
+            cursor.execute("ALTER TABLE \"transaction\" ADD COLUMN fingerprint VARCHAR(64)")
+            print("Added 'fingerprint' column.")
+        else:
+            print("Column 'fingerprint' already exists in 'transaction' table.")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_transaction_business_fingerprint ON \"transaction\" (business_id, fingerprint)")
+
+        cursor.execute("PRAGMA table_info(import_job)")
+        job_columns = [column[1] for column in cursor.fetchall()]
+        if job_columns and 'duplicates' not in job_columns:
+            print("Adding 'duplicates' column to 'import_job' table...")
+            cursor.execute("ALTER TABLE import_job ADD COLUMN duplicates INTEGER DEFAULT 0")
+
+        conn.commit()
+        print("Migration successful.")
+            
+    except Exception as e:
+        print(f"Error during migration: {str(e)}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
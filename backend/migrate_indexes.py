@@ -0,0 +1,28 @@
+from app import app, db
+from models import Transaction, InventoryItem
+
+# db.create_all() skips tables that already exist, so indexes added to the
+# models later never reach older databases. This creates any that are missing
+# (works for both SQLite and Postgres).
+
+def migrate():
+    with app.app_context():
+        print(f"Connecting to {db.engine.url.render_as_string(hide_password=True)}...")
+        for table in (Transaction.__table__, InventoryItem.__table__):
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                try:
+                    index.create(bind=db.engine, checkfirst=True)
+                    print(f"Index '{index.name}' on '{table.name}' is in place.")
+                except Exception as e:
+                    print(f"Error creating index '{index.name}': {str(e)}")
+
+        # Refresh planner statistics so the new indexes get picked up
+        try:
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql("ANALYZE")
+            print("Planner statistics refreshed.")
+        except Exception as e:
+            print(f"Could not run ANALYZE: {str(e)}")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,31 @@
+import sqlite3
+import os
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+db_path = os.path.join(basedir, 'bulkbins.db')
+
+def migrate():
+    print(f"Connecting to {db_path}...")
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
+    try:
+        # Check if column exists
+        cursor.execute("PRAGMA table_info(user)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'membership_version' not in columns:
+            print("Adding 'membership_version' column to 'user' table...")
+            cursor.execute("ALTER TABLE user ADD COLUMN membership_version INTEGER NOT NULL DEFAULT 0")
+            conn.commit()
+            print("Migration successful: Added 'membership_version' column.")
+        else:
+            print("Column 'membership_version' already exists in 'user' table.")
+            
+    except Exception as e:
+        print(f"Error during migration: {str(e)}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,53 @@
+import hashlib
+import os
+import shutil
+from app import app, db
+from models import Transaction
+import receipts
+
+# Move receipts saved under the old flat, timestamp-prefixed names into the
+# content-addressed store and point their transactions at the new URLs.
+# Duplicates collapse into one file. Each transaction is committed before its old
+# file is removed, so an interrupted run never leaves a row pointing at nothing.
+# Safe to re-run.
+
+def migrate():
+    with app.app_context():
+        folder = app.config['UPLOAD_FOLDER']
+        txns = Transaction.query.filter(Transaction.receipt_url.like(receipts.URL_PREFIX + '%')).all()
+        moved = 0
+        try:
+            for txn in txns:
+                old_url = txn.receipt_url
+                name = old_url[len(receipts.URL_PREFIX):]
+                if receipts.parse_name(name):
+                    continue # Already content-addressed
+                src = os.path.join(folder, name)
+                if not os.path.isfile(src):
+                    print(f"Missing receipt file for transaction {txn.id}: {name}")
+                    continue
+                digest = hashlib.sha256()
+                with open(src, 'rb') as f:
+                    for chunk in iter(lambda: f.read(receipts.CHUNK_SIZE), b''):
+                        digest.update(chunk)
+                sha256, ext = digest.hexdigest(), receipts._extension(name)
+                target = os.path.join(folder, receipts.relative_path(sha256, ext))
+                if not os.path.exists(target): # Otherwise the same content is already stored
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    tmp = target + '.tmp'
+                    shutil.copyfile(src, tmp)
+                    os.replace(tmp, target)
+                receipts.acquire(sha256, ext, os.path.getsize(target))
+                txn.receipt_url = receipts.url_for_blob(sha256, ext)
+                db.session.commit()
+                # Only now is the flat copy unused (unless another row still names it)
+                if not Transaction.query.filter_by(receipt_url=old_url).count():
+                    os.remove(src)
+                moved += 1
+            print(f"Migration successful: {moved} receipts moved into the content-addressed store.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error during migration: {str(e)}")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+import joblib
+import sklearn
+
+# Fitted models live on disk as joblib artefacts, one manifest per model name:
+#   MODEL_DIR/<name>.json               -> {"artifact", "version", "data_hash", "sklearn", "trained_at"}
+#   MODEL_DIR/<name>-v<version>-<hash>.joblib
+# get_or_train() loads the artefact when the manifest still matches the code's
+# model version, the training-data hash and the installed sklearn version, and only
+# fits (and saves) a new one when any of those changed. Artefacts are written
+# uncompressed and loaded with mmap_mode='r', so the numpy arrays inside (weights,
+# idf vectors) are shared page cache between gunicorn workers instead of copies.
+
+MODEL_DIR = os.environ.get('MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_artifacts'))
+
+_lock = threading.Lock()
+
+
+def data_hash(samples):
+    """Stable digest of a training set (any JSON-serialisable sequence)."""
+    raw = json.dumps(list(samples), sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _manifest_path(name):
+    return os.path.join(MODEL_DIR, f"{name}.json")
+
+
+def read_manifest(name):
+    try:
+        with open(_manifest_path(name)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_atomic(path, write):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def save(name, model, version, digest):
+    """Persist a fitted model and point the manifest at it; returns the manifest."""
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    artifact = f"{name}-v{version}-{digest[:12]}.joblib"
+    write_atomic(os.path.join(MODEL_DIR, artifact), lambda tmp: joblib.dump(model, tmp))
+    manifest = {
+        "artifact": artifact,
+        "version": version,
+        "data_hash": digest,
+        "sklearn": sklearn.__version__,
+        "trained_at": datetime.utcnow().isoformat()
+    }
+    def write_manifest(tmp):
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=2)
+    write_atomic(_manifest_path(name), write_manifest)
+
+    # Older artefacts of this model are no longer referenced
+    for old in os.listdir(MODEL_DIR):
+        if old.startswith(f"{name}-v") and old.endswith('.joblib') and old != artifact:
+            try:
+                os.remove(os.path.join(MODEL_DIR, old))
+            except OSError:
+                pass
+    return manifest
+
+
+def load(name, mmap_mode='r'):
+    """The current artefact for `name`, or None if there is none."""
+    manifest = read_manifest(name)
+    if not manifest:
+        return None
+    path = os.path.join(MODEL_DIR, manifest["artifact"])
+    if not os.path.exists(path):
+        return None
+    return joblib.load(path, mmap_mode=mmap_mode)
+
+
+def is_current(manifest, version, digest):
+    return bool(manifest) and manifest.get("version") == version and manifest.get("data_hash") == digest \
+        and manifest.get("sklearn") == sklearn.__version__
+
+
+def get_or_train(name, samples, train, version=1):
+    """Load `name` if its artefact matches (version, samples); otherwise fit it with train(samples) and save it."""
+    samples = list(samples)
+    digest = data_hash(samples)
+    with _lock:
+        if is_current(read_manifest(name), version, digest):
+            model = load(name)
+            if model is not None:
+                return model
+        model = train(samples)
+        save(name, model, version, digest)
+        return model
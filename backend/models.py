@@ -11,6 +11,7 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(128))
     is_master_admin = db.Column(db.Boolean, default=False)
+    membership_version = db.Column(db.Integer, default=0, server_default='0', nullable=False) # Bumped when memberships change; stales JWT role claims
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # Relationships
@@ -28,11 +29,18 @@ class Business(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     currency = db.Column(db.String(10), default='INR')
     email = db.Column(db.String(120), nullable=True)
+    data_version = db.Column(db.Integer, default=0, server_default='0', nullable=False) # Bumped on every data write (see analytics_cache.py)
+    change_seq = db.Column(db.Integer, default=0, server_default='0', nullable=False) # Last ChangeLog.seq handed out (see changes.py)
     
     # Relationships
     members = db.relationship('BusinessMember', backref='business', lazy=True, cascade="all, delete-orphan")
     transactions = db.relationship('Transaction', backref='business', lazy=True, cascade="all, delete-orphan")
     items = db.relationship('InventoryItem', backref='business', lazy=True, cascade="all, delete-orphan")
+    daily_summaries = db.relationship('DailySummary', backref='business', lazy=True, cascade="all, delete-orphan")
+    item_daily_sales = db.relationship('ItemDailySales', backref='business', lazy=True, cascade="all, delete-orphan")
+    import_jobs = db.relationship('ImportJob', backref='business', lazy=True, cascade="all, delete-orphan")
+    change_log = db.relationship('ChangeLog', backref='business', lazy=True, cascade="all, delete-orphan")
+    recompute_jobs = db.relationship('RecomputeJob', backref='business', lazy=True, cascade="all, delete-orphan")
 
 class BusinessMember(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -57,10 +65,22 @@ class Transaction(db.Model):
     ai_metadata = db.Column(db.Text, nullable=True) # JSON structured data for AI profit analysis
     profit = db.Column(db.Float, default=0.0)
     cogs = db.Column(db.Float, default=0.0)
+    fingerprint = db.Column(db.String(64), nullable=True) # Set on imported rows only (see importer.assign_fingerprints)
+    category_suggested = db.Column(db.Boolean, default=False) # Category came from the classifier, not a person
 
     # Relationship
     inventory_item = db.relationship('InventoryItem', backref='transactions', lazy=True)
 
+    # Hot-path indexes: ledger listing / date-range sums per business, per-type sums,
+    # per-product velocity lookups (inventory_item_id + type + date window) and
+    # import de-duplication by fingerprint
+    __table_args__ = (
+        db.Index('ix_transaction_business_timestamp', 'business_id', 'timestamp'),
+        db.Index('ix_transaction_business_type_timestamp', 'business_id', 'type', 'timestamp'),
+        db.Index('ix_transaction_item_type_timestamp', 'inventory_item_id', 'type', 'timestamp'),
+        db.Index('ix_transaction_business_fingerprint', 'business_id', 'fingerprint'),
+    )
+
 class InventoryItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     business_id = db.Column(db.Integer, db.ForeignKey('business.id'), nullable=False)
@@ -72,3 +92,108 @@ class InventoryItem(db.Model):
     selling_price = db.Column(db.Float)
     category = db.Column(db.String(50))
     lead_time = db.Column(db.Integer, default=1) # Lead time in days
+
+    daily_sales = db.relationship('ItemDailySales', backref='item', lazy=True, cascade="all, delete-orphan")
+
+    __table_args__ = (db.Index('ix_inventory_item_business', 'business_id'),)
+
+class DailySummary(db.Model):
+    # Per-day P&L rollup of Transaction, maintained alongside every ledger write (see rollups.py)
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey('business.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    type = db.Column(db.String(20)) # Sale or Expense
+    category = db.Column(db.String(50))
+    amount = db.Column(db.Float, default=0.0)
+    cogs = db.Column(db.Float, default=0.0)
+    profit = db.Column(db.Float, default=0.0)
+    count = db.Column(db.Integer, default=0)
+
+    __table_args__ = (db.UniqueConstraint('business_id', 'day', 'type', 'category', name='unique_daily_summary'),)
+
+class ItemDailySales(db.Model):
+    # Per-item daily sales rollup used for velocity / demand forecasting (see rollups.py)
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey('business.id'), nullable=False)
+    inventory_item_id = db.Column(db.Integer, db.ForeignKey('inventory_item.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    quantity = db.Column(db.Integer, default=0)
+    revenue = db.Column(db.Float, default=0.0)
+    profit = db.Column(db.Float, default=0.0)
+    count = db.Column(db.Integer, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('inventory_item_id', 'day', name='unique_item_daily_sales'),
+        db.Index('ix_item_daily_sales_business_day', 'business_id', 'day'),
+    )
+
+class ImportJob(db.Model):
+    # Background CSV import (see import_jobs.py). Progress is committed with each
+    # chunk of rows, so `processed` is always a safe point to resume from.
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey('business.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=True) # Who uploaded it; not a FK so user deletes don't touch job history
+    filename = db.Column(db.String(255))
+    filepath = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), default='queued') # queued, running, completed, failed
+    total_rows = db.Column(db.Integer, default=0)
+    processed = db.Column(db.Integer, default=0) # Data rows committed (imported + skipped)
+    imported = db.Column(db.Integer, default=0)
+    skipped = db.Column(db.Integer, default=0)
+    duplicates = db.Column(db.Integer, default=0) # Rows already in the ledger (matching fingerprint)
+    errors = db.Column(db.Text, nullable=True) # JSON list of {"line", "error"}
+    date_format = db.Column(db.String(20), nullable=True)
+    date_format_ambiguous = db.Column(db.Boolean, default=False)
+    message = db.Column(db.String(500), nullable=True)
+    run_offset = db.Column(db.Integer, default=0) # `processed` when the current run started
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True) # Heartbeat, bumped with every committed chunk
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class ChangeLog(db.Model):
+    # One row per insert/update/delete of a Transaction or InventoryItem (see changes.py).
+    # seq is per business and strictly increasing, so clients sync with ?since=<seq>.
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey('business.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    entity = db.Column(db.String(20), nullable=False) # 'transaction' or 'inventory_item'
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False) # 'upsert' or 'delete'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('business_id', 'seq', name='unique_change_seq'),)
+
+class RecomputeJob(db.Model):
+    # Background profit/COGS recomputation after a cost_price correction (see recompute_jobs.py).
+    # Items are processed in groups; each group's ledger update and rollup deltas commit together.
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey('business.id'), nullable=False, index=True)
+    inventory_item_id = db.Column(db.Integer, nullable=True) # None = every item of the business
+    start_date = db.Column(db.Date, nullable=True)
+    end_date = db.Column(db.Date, nullable=True) # Inclusive
+    status = db.Column(db.String(20), default='queued') # queued, running, completed, failed
+    total_items = db.Column(db.Integer, default=0)
+    processed_items = db.Column(db.Integer, default=0)
+    updated_rows = db.Column(db.Integer, default=0) # Transactions whose profit/cogs actually changed
+    message = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True) # Heartbeat, bumped with every committed group
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class ReceiptBlob(db.Model):
+    # One stored receipt file, addressed by content (see receipts.py)
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False)
+    ext = db.Column(db.String(10), nullable=False, default='')
+    size = db.Column(db.Integer, nullable=True)
+    content_type = db.Column(db.String(100), nullable=True)
+    refcount = db.Column(db.Integer, nullable=False, default=0) # Transactions whose receipt_url points here
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    released_at = db.Column(db.DateTime, nullable=True) # When refcount last dropped to 0
+
+    __table_args__ = (
+        db.UniqueConstraint('sha256', 'ext', name='unique_receipt_blob'),
+        db.Index('ix_receipt_blob_orphans', 'refcount', 'released_at'),
+    )
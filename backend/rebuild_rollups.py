@@ -0,0 +1,23 @@
+import sys
+from app import app, db
+import rollups
+from analytics_cache import bump_data_version
+
+# Recompute the DailySummary rollup from the raw ledger.
+# Usage: python rebuild_rollups.py [business_id]
+
+def rebuild(business_id=None):
+    with app.app_context():
+        target = f"business {business_id}" if business_id else "all businesses"
+        print(f"Rebuilding daily rollup for {target}...")
+        try:
+            buckets = rollups.rebuild(business_id)
+            bump_data_version(business_id)
+            db.session.commit()
+            print(f"Rebuild complete: {buckets} daily buckets written.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error during rebuild: {str(e)}")
+
+if __name__ == "__main__":
+    rebuild(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,76 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import receipts
+
+# Thumbnails and viewing copies for receipt photos. Phone photos are several MB;
+# the ledger only needs a small thumbnail and the viewer a screen-sized JPEG, so
+# after a new receipt is stored a background worker writes
+#   <sha256>.thumb.jpg  (THUMB_EDGE px on the long side)
+#   <sha256>.view.jpg   (VIEW_EDGE px, recompressed)
+# next to the original, which is left untouched for audit. The names derive from
+# the original's hash, so the API can hand out the URLs before the files exist
+# (receipts.serve falls back to the original meanwhile).
+#
+# Pillow is imported lazily; without it receipts are simply served full size.
+# build_variants() needs no app context, so backfill_receipt_images.py can run it
+# in worker processes.
+
+THUMB_EDGE = 320
+VIEW_EDGE = 1600
+VARIANT_SIZES = {'thumb': (THUMB_EDGE, 70), 'view': (VIEW_EDGE, 82)} # max edge px, JPEG quality
+IMAGE_WORKERS = int(os.environ.get('RECEIPT_IMAGE_WORKERS', 1))
+
+_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='receipt-images')
+
+
+def build_variants(folder, sha256, ext, force=False):
+    """Write the missing variants of one stored receipt; returns how many were written."""
+    if ext not in receipts.IMAGE_EXTENSIONS:
+        return 0
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return 0
+
+    targets = {v: os.path.join(folder, receipts.variant_relative_path(sha256, v)) for v in VARIANT_SIZES}
+    todo = [v for v, path in targets.items() if force or not os.path.exists(path)]
+    if not todo:
+        return 0
+
+    with Image.open(os.path.join(folder, receipts.relative_path(sha256, ext))) as im:
+        # Let the JPEG decoder downscale while decoding; far cheaper than a full-size decode
+        im.draft('RGB', (VIEW_EDGE * 2, VIEW_EDGE * 2))
+        im = ImageOps.exif_transpose(im)
+        if im.mode in ('RGBA', 'LA', 'P'):
+            im = im.convert('RGBA')
+            flat = Image.new('RGB', im.size, (255, 255, 255))
+            flat.paste(im, mask=im.getchannel('A'))
+            im = flat
+        elif im.mode != 'RGB':
+            im = im.convert('RGB')
+
+        for variant in sorted(todo, key=lambda v: -VARIANT_SIZES[v][0]):
+            edge, quality = VARIANT_SIZES[variant]
+            copy = im.copy()
+            copy.thumbnail((edge, edge), Image.LANCZOS) # Never upscales
+            tmp = targets[variant] + '.tmp'
+            copy.save(tmp, 'JPEG', quality=quality, optimize=True, progressive=True)
+            os.replace(tmp, targets[variant])
+    return len(todo)
+
+
+def _run(folder, sha256, ext):
+    try:
+        build_variants(folder, sha256, ext)
+    except Exception as e:
+        print(f"ERROR building receipt variants for {sha256}: {str(e)}")
+
+
+def enqueue(app, receipt_url):
+    """Queue variant generation for a stored receipt (no-op for legacy or non-image receipts)."""
+    if not receipt_url or not receipt_url.startswith(receipts.URL_PREFIX):
+        return None
+    parsed = receipts.parse_name(receipt_url[len(receipts.URL_PREFIX):])
+    if not parsed or parsed[1] not in receipts.IMAGE_EXTENSIONS:
+        return None
+    return _executor.submit(_run, app.config['UPLOAD_FOLDER'], *parsed)
@@ -0,0 +1,340 @@
+import hashlib
+import hmac
+import mimetypes
+import os
+import re
+import tempfile
+import time
+from datetime import datetime, timedelta
+from flask import current_app, request, send_file
+from sqlalchemy import update, select, delete, insert, func, case, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import db, ReceiptBlob, Transaction
+
+# Receipts are stored by content: the upload is streamed to a temp file in chunks
+# while its SHA-256 is computed, then moved to
+#   UPLOAD_FOLDER/ab/cd/abcd...ef.jpg
+# (two levels of fan-out keep every directory small). The same photo uploaded
+# twice - or re-sent with every edit - is stored once. ReceiptBlob.refcount counts
+# the transactions pointing at a file; deleting or replacing a receipt releases a
+# reference, and reclaim_orphans() removes files nobody has used for a grace period.
+# Receipts saved before this scheme (flat, timestamp-prefixed names) keep working.
+# If the DB transaction that wrote a new file does not commit, the file is not removed
+# on the spot (another upload of the same bytes may already rely on it); instead an
+# unreferenced ReceiptBlob row is committed for it, so reclaim_orphans() deletes it
+# after the grace period unless someone has taken a reference by then.
+#
+# Serving: receipts are opened from plain links, so API payloads carry signed URLs
+# (?bid=&exp=&sig=, HMAC over name/business/expiry with SECRET_KEY) that stay valid
+# for one to two SIGNED_URL_TTL windows; a Bearer token with access to a transaction
+# using the receipt works too. Content-addressed files never change, so they go out
+# with an immutable Cache-Control and their hash as ETag; conditional and Range
+# requests are answered by send_file. With RECEIPT_SENDFILE = 'nginx' | 'apache' the
+# bytes are handed to the front proxy (X-Accel-Redirect / X-Sendfile) instead.
+
+CHUNK_SIZE = 64 * 1024
+# Released blobs are kept this long before the file is removed, so an upload of the
+# same content racing with a delete never points at a vanished file
+RECLAIM_GRACE = timedelta(minutes=10)
+URL_PREFIX = '/api/receipts/'
+SIGNED_URL_TTL = 3600
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+LEGACY_MAX_AGE = 3600
+# A variant that is not built yet is answered with the original, cacheable only briefly
+PENDING_MAX_AGE = 60
+
+_NAME_RE = re.compile(r'^([0-9a-f]{64})(\.[a-z0-9]{1,8})?$')
+# Derived copies built by receipt_images.py next to the original: <sha256>.thumb.jpg, <sha256>.view.jpg
+VARIANTS = ('thumb', 'view')
+_VARIANT_RE = re.compile(r'^([0-9a-f]{64})\.(thumb|view)\.jpg$')
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff'}
+
+
+def _folder():
+    return current_app.config['UPLOAD_FOLDER']
+
+
+def _extension(filename):
+    ext = os.path.splitext(filename or '')[1].lower()
+    return ext if re.fullmatch(r'\.[a-z0-9]{1,8}', ext) else ''
+
+
+def parse_name(filename):
+    """(sha256, ext) for a content-addressed receipt name, or None for a legacy one."""
+    m = _NAME_RE.match(filename or '')
+    return (m.group(1), m.group(2) or '') if m else None
+
+
+def parse_variant(filename):
+    """(sha256, variant) for a thumbnail / viewing-copy name, or None."""
+    m = _VARIANT_RE.match(filename or '')
+    return (m.group(1), m.group(2)) if m else None
+
+
+def relative_path(sha256, ext):
+    return os.path.join(sha256[:2], sha256[2:4], sha256 + ext)
+
+
+def variant_relative_path(sha256, variant):
+    return relative_path(sha256, f".{variant}.jpg")
+
+
+def path_for(filename):
+    """On-disk path of a receipt name (content-addressed or legacy flat)."""
+    parsed = parse_name(filename)
+    if parsed:
+        return os.path.join(_folder(), relative_path(*parsed))
+    return os.path.join(_folder(), filename)
+
+
+def url_for_blob(sha256, ext):
+    return f"{URL_PREFIX}{sha256}{ext}"
+
+
+def store(upload):
+    """Stream an uploaded file into the store and take a reference; returns its receipt URL."""
+    folder = _folder()
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = upload.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+
+        sha256, ext = digest.hexdigest(), _extension(upload.filename)
+        acquire(sha256, ext, size, upload.mimetype)
+
+        target = os.path.join(folder, relative_path(sha256, ext))
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+            db.session.info.setdefault(_NEW_FILES, []).append((sha256, ext, size, upload.mimetype))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return url_for_blob(sha256, ext)
+
+
+_NEW_FILES = 'receipts_new_files'
+
+
+@event.listens_for(Session, 'after_commit')
+def _keep_new_files(session):
+    session.info.pop(_NEW_FILES, None)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _track_uncommitted_files(session, transaction):
+    # Only the outermost transaction decides; acquire() uses savepoints
+    if transaction.parent is not None:
+        return
+    for sha256, ext, size, content_type in session.info.pop(_NEW_FILES, None) or ():
+        try:
+            # Own connection: the session's transaction is already gone
+            with db.engine.begin() as conn:
+                conn.execute(insert(ReceiptBlob).values(
+                    sha256=sha256, ext=ext, size=size, content_type=content_type,
+                    refcount=0, released_at=datetime.utcnow()))
+        except IntegrityError:
+            pass # A row exists: the file is referenced, or already queued for reclaim
+        except Exception as e:
+            print(f"ERROR tracking uncommitted receipt {sha256}{ext}: {str(e)}")
+
+
+def acquire(sha256, ext, size=None, content_type=None):
+    """Add a reference to a blob, creating its row on first use."""
+    result = db.session.execute(
+        update(ReceiptBlob).where(ReceiptBlob.sha256 == sha256, ReceiptBlob.ext == ext)
+        .values(refcount=ReceiptBlob.refcount + 1, released_at=None)
+    )
+    if result.rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(ReceiptBlob(sha256=sha256, ext=ext, size=size, content_type=content_type, refcount=1))
+    except IntegrityError:
+        # A concurrent upload of the same content created the row first
+        db.session.execute(
+            update(ReceiptBlob).where(ReceiptBlob.sha256 == sha256, ReceiptBlob.ext == ext)
+            .values(refcount=ReceiptBlob.refcount + 1, released_at=None)
+        )
+
+
+def release(receipt_url):
+    """Drop one reference to the receipt behind this URL (legacy URLs are ignored)."""
+    if not receipt_url or not receipt_url.startswith(URL_PREFIX):
+        return
+    parsed = parse_name(receipt_url[len(URL_PREFIX):])
+    if not parsed:
+        return
+    sha256, ext = parsed
+    db.session.execute(
+        update(ReceiptBlob).where(ReceiptBlob.sha256 == sha256, ReceiptBlob.ext == ext, ReceiptBlob.refcount > 0)
+        .values(refcount=ReceiptBlob.refcount - 1,
+                released_at=case((ReceiptBlob.refcount <= 1, datetime.utcnow()), else_=None))
+    )
+
+
+def reclaim_orphans(grace=RECLAIM_GRACE, limit=500):
+    """Delete unreferenced blobs released more than `grace` ago, and their files. Commits; returns the count."""
+    cutoff = datetime.utcnow() - grace
+    candidates = db.session.execute(
+        select(ReceiptBlob.id, ReceiptBlob.sha256, ReceiptBlob.ext)
+        .where(ReceiptBlob.refcount <= 0, ReceiptBlob.released_at <= cutoff)
+        .limit(limit)
+    ).all()
+    reclaimed = 0
+    for blob_id, sha256, ext in candidates:
+        # Re-check the refcount in the DELETE itself: a new upload may have taken a reference
+        gone = db.session.execute(
+            delete(ReceiptBlob).where(ReceiptBlob.id == blob_id, ReceiptBlob.refcount <= 0)
+        ).rowcount
+        db.session.commit()
+        if gone:
+            for rel in [relative_path(sha256, ext)] + [variant_relative_path(sha256, v) for v in VARIANTS]:
+                try:
+                    os.remove(os.path.join(_folder(), rel))
+                except FileNotFoundError:
+                    pass
+            reclaimed += 1
+    return reclaimed
+
+
+def recount():
+    """Reset refcounts from the ledger (after bulk deletes that bypassed release()). Caller commits."""
+    counts = {}
+    rows = db.session.execute(
+        select(Transaction.receipt_url, func.count(Transaction.id))
+        .where(Transaction.receipt_url.like(URL_PREFIX + '%'))
+        .group_by(Transaction.receipt_url)
+    ).all()
+    for url, n in rows:
+        parsed = parse_name(url[len(URL_PREFIX):])
+        if parsed:
+            counts[parsed] = n
+    now = datetime.utcnow()
+    for blob in ReceiptBlob.query.all():
+        n = counts.get((blob.sha256, blob.ext), 0)
+        if n != blob.refcount:
+            blob.refcount = n
+            blob.released_at = None if n else (blob.released_at or now)
+    return len(counts)
+
+
+# ── Serving ──────────────────────────────────────────
+
+def signing_window():
+    """Index of the current signing window; signed URLs only change when it does."""
+    return int(time.time() // SIGNED_URL_TTL)
+
+
+def _signature(name, business_id, expires):
+    key = current_app.config['SECRET_KEY'].encode()
+    return hmac.new(key, f"{name}:{business_id}:{expires}".encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def signed_url(receipt_url, business_id):
+    """receipt_url plus a signature valid until the end of the next signing window."""
+    if not receipt_url or not receipt_url.startswith(URL_PREFIX):
+        return receipt_url
+    name = receipt_url[len(URL_PREFIX):]
+    expires = (signing_window() + 2) * SIGNED_URL_TTL
+    return f"{receipt_url}?bid={business_id}&exp={expires}&sig={_signature(name, business_id, expires)}"
+
+
+def sign_urls(data, business_id):
+    """Replace data['receipt_url'] with a signed link and add the thumbnail / viewing-copy links.
+
+    Variant links are only offered for content-addressed images; until the background
+    job has built them they fall back to the original (see serve()).
+    """
+    receipt_url = data.get('receipt_url')
+    if not receipt_url:
+        return data
+    parsed = receipt_url.startswith(URL_PREFIX) and parse_name(receipt_url[len(URL_PREFIX):])
+    for variant in VARIANTS:
+        url = None
+        if parsed and parsed[1] in IMAGE_EXTENSIONS:
+            url = signed_url(f"{URL_PREFIX}{parsed[0]}.{variant}.jpg", business_id)
+        data[f"receipt_{variant}_url"] = url
+    data['receipt_url'] = signed_url(receipt_url, business_id)
+    return data
+
+
+def verify_signature(name, args):
+    """True if the query string carries an unexpired signature for this receipt."""
+    try:
+        business_id, expires = int(args.get('bid', '')), int(args.get('exp', ''))
+    except ValueError:
+        return False
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(_signature(name, business_id, expires), args.get('sig', ''))
+
+
+def business_ids_using(name):
+    variant = parse_variant(name)
+    if variant:
+        match = Transaction.receipt_url.like(URL_PREFIX + variant[0] + '%')
+    else:
+        match = Transaction.receipt_url == URL_PREFIX + name
+    return db.session.execute(select(Transaction.business_id).where(match).distinct()).scalars().all()
+
+
+def serve(name):
+    """Response for a receipt the caller is allowed to see (conditional, ranged, optionally offloaded)."""
+    variant = parse_variant(name)
+    pending = False
+    if variant:
+        parsed = (variant[0], f".{variant[1]}.jpg")
+        path = os.path.join(_folder(), variant_relative_path(*variant))
+        if not os.path.isfile(path):
+            blob = ReceiptBlob.query.filter_by(sha256=variant[0]).first()
+            if blob is None:
+                return current_app.response_class(status=404)
+            parsed, name, pending = None, variant[0] + blob.ext, True
+            path = os.path.join(_folder(), relative_path(variant[0], blob.ext))
+    else:
+        parsed = parse_name(name)
+        path = path_for(name)
+    if not os.path.isfile(path):
+        return current_app.response_class(status=404)
+
+    if parsed:
+        # Content-addressed (variants are derived from the hash, so they never change either)
+        etag = f"{variant[0]}.{variant[1]}" if variant else parsed[0]
+        max_age, immutable = IMMUTABLE_MAX_AGE, True
+    else:
+        etag, max_age, immutable = True, PENDING_MAX_AGE if pending else LEGACY_MAX_AGE, False
+
+    mode = current_app.config.get('RECEIPT_SENDFILE')
+    if mode in ('nginx', 'apache'):
+        if parsed and request.if_none_match.contains(etag):
+            resp = current_app.response_class(status=304)
+        else:
+            resp = current_app.response_class(mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+            if mode == 'nginx':
+                prefix = current_app.config.get('RECEIPT_ACCEL_PREFIX', '/protected-receipts/')
+                rel = os.path.relpath(path, _folder())
+                resp.headers['X-Accel-Redirect'] = prefix + rel.replace(os.sep, '/')
+            else:
+                resp.headers['X-Sendfile'] = os.path.abspath(path)
+        if parsed:
+            resp.set_etag(etag)
+    else:
+        resp = send_file(path, etag=etag, conditional=True, max_age=max_age)
+
+    # Private: the URL is signed per business, shared caches must not keep it
+    resp.cache_control.public = False
+    resp.cache_control.private = True
+    resp.cache_control.max_age = max_age
+    resp.cache_control.immutable = immutable
+    return resp
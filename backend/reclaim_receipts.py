@@ -0,0 +1,32 @@
+import sys
+from datetime import timedelta
+from app import app, db
+import receipts
+
+# Remove receipt files no transaction points at any more.
+# Usage: python reclaim_receipts.py [--recount] [grace_minutes]
+#   --recount  first recompute refcounts from the ledger (needed after business
+#              deletes or delete_imports.py, which drop transactions in bulk)
+
+def reclaim(recount=False, grace_minutes=None):
+    with app.app_context():
+        try:
+            if recount:
+                referenced = receipts.recount()
+                db.session.commit()
+                print(f"Refcounts recomputed: {referenced} receipts referenced by the ledger.")
+            grace = timedelta(minutes=grace_minutes) if grace_minutes is not None else receipts.RECLAIM_GRACE
+            total = 0
+            while True:
+                n = receipts.reclaim_orphans(grace=grace)
+                total += n
+                if n == 0:
+                    break
+            print(f"Reclaim complete: {total} orphaned receipt files removed.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error during reclaim: {str(e)}")
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != '--recount']
+    reclaim('--recount' in sys.argv, int(args[0]) if args else None)
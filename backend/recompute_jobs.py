@@ -0,0 +1,173 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, time
+from sqlalchemy import update, select, func, or_, and_
+from models import db, RecomputeJob, Transaction, InventoryItem
+from analytics_cache import bump_data_version
+import rollups
+import changes
+
+# Profit/COGS recomputation after an item's cost_price is corrected. Sales keep the
+# profit and cogs worked out when they were recorded, so a correction has to be
+# pushed back into history. Each step is one set-based statement for a group of items:
+#   UPDATE "transaction" SET cogs = inventory_item.cost_price * quantity,
+#                            profit = amount - inventory_item.cost_price * quantity
+#   FROM inventory_item WHERE ... AND (cogs or profit differ)
+# preceded by a grouped SELECT of the same rows that gives the rollup deltas, so the
+# ledger and the rollups move together in each step's commit. Only rows whose values
+# actually change are touched, which makes a re-run (or a resumed job) cheap.
+
+ITEMS_PER_STEP = 50
+# A running job whose heartbeat is older than this is treated as abandoned
+STALE_AFTER = timedelta(minutes=5)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='recompute-job')
+
+
+def create_job(business_id, inventory_item_id=None, start_date=None, end_date=None):
+    """Queue a recomputation. The caller commits, then calls enqueue()."""
+    job = RecomputeJob(
+        business_id=business_id,
+        inventory_item_id=inventory_item_id,
+        start_date=start_date,
+        end_date=end_date,
+        status='queued'
+    )
+    db.session.add(job)
+    return job
+
+
+def enqueue(app, job_id):
+    return _executor.submit(run_job, app, job_id)
+
+
+def _claim(job_id):
+    """Atomically move a job to 'running'; False if someone else has it (or it is finished)."""
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(RecomputeJob)
+        .where(RecomputeJob.id == job_id, or_(
+            RecomputeJob.status.in_(['queued', 'failed']),
+            and_(RecomputeJob.status == 'running', RecomputeJob.updated_at < now - STALE_AFTER)
+        ))
+        .values(status='running', started_at=now, updated_at=now, finished_at=None, message=None,
+                processed_items=0)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _item_ids(job):
+    if job.inventory_item_id:
+        return [job.inventory_item_id]
+    return db.session.execute(
+        select(InventoryItem.id).where(InventoryItem.business_id == job.business_id).order_by(InventoryItem.id)
+    ).scalars().all()
+
+
+def recompute_items(job, item_ids):
+    """Bring profit/cogs of the job's sales of these items in line with current cost prices; rows changed."""
+    new_cogs = InventoryItem.cost_price * Transaction.quantity
+    new_profit = Transaction.amount - new_cogs
+    conds = [
+        Transaction.business_id == job.business_id,
+        Transaction.type == 'Sale',
+        Transaction.inventory_item_id.in_(item_ids),
+        Transaction.inventory_item_id == InventoryItem.id,
+        Transaction.quantity.isnot(None),
+        InventoryItem.cost_price.isnot(None),
+        or_(Transaction.cogs.is_(None), Transaction.profit.is_(None),
+            Transaction.cogs != new_cogs, Transaction.profit != new_profit)
+    ]
+    if job.start_date:
+        conds.append(Transaction.timestamp >= datetime.combine(job.start_date, time.min))
+    if job.end_date:
+        conds.append(Transaction.timestamp < datetime.combine(job.end_date + timedelta(days=1), time.min))
+
+    # Lock the business before reading: a concurrent edit of one of these sales would
+    # otherwise land between the delta SELECT and the UPDATE and the rollup would drift
+    rollups.lock_businesses([job.business_id])
+    day_col = func.date(Transaction.timestamp)
+    deltas = db.session.execute(
+        select(day_col, Transaction.type, Transaction.category, Transaction.inventory_item_id,
+               func.sum(new_cogs - func.coalesce(Transaction.cogs, 0)),
+               func.sum(new_profit - func.coalesce(Transaction.profit, 0)))
+        .where(*conds)
+        .group_by(day_col, Transaction.type, Transaction.category, Transaction.inventory_item_id)
+    ).all()
+    if not deltas:
+        return 0
+
+    ids = db.session.execute(
+        update(Transaction).where(*conds).values(cogs=new_cogs, profit=new_profit)
+        .returning(Transaction.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    rollups.apply_cost_deltas(job.business_id, deltas)
+    changes.record(job.business_id, changes.TRANSACTION, ids)
+    return len(ids)
+
+
+def run_job(app, job_id):
+    with app.app_context():
+        try:
+            if not _claim(job_id):
+                return
+            job = db.session.get(RecomputeJob, job_id)
+            item_ids = _item_ids(job)
+            job.total_items = len(item_ids)
+            db.session.commit()
+
+            for start in range(0, len(item_ids), ITEMS_PER_STEP):
+                group = item_ids[start:start + ITEMS_PER_STEP]
+                updated = recompute_items(job, group)
+                if updated:
+                    bump_data_version(job.business_id)
+                # Ledger rows, rollup deltas and progress land in the same commit
+                job.processed_items = start + len(group)
+                job.updated_rows = (job.updated_rows or 0) + updated
+                job.updated_at = datetime.utcnow()
+                db.session.commit()
+
+            job.status = 'completed'
+            job.finished_at = job.updated_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"ERROR in recompute job {job_id}: {str(e)}")
+            db.session.execute(
+                update(RecomputeJob).where(RecomputeJob.id == job_id)
+                .values(status='failed', message=str(e)[:500], updated_at=datetime.utcnow())
+            )
+            db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def resume_interrupted(app):
+    """Queue jobs left behind by a restart (still queued, or running with a stale heartbeat)."""
+    with app.app_context():
+        cutoff = datetime.utcnow() - STALE_AFTER
+        ids = [job_id for (job_id,) in db.session.query(RecomputeJob.id).filter(or_(
+            RecomputeJob.status == 'queued',
+            and_(RecomputeJob.status == 'running', RecomputeJob.updated_at < cutoff)
+        ))]
+    for job_id in ids:
+        enqueue(app, job_id)
+    return ids
+
+
+def job_status(job):
+    """Progress payload for the status endpoint."""
+    return {
+        "id": job.id,
+        "status": job.status,
+        "inventory_item_id": job.inventory_item_id,
+        "start_date": job.start_date.isoformat() if job.start_date else None,
+        "end_date": job.end_date.isoformat() if job.end_date else None,
+        "total_items": job.total_items,
+        "processed_items": job.processed_items,
+        "updated_rows": job.updated_rows,
+        "message": job.message,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
@@ -0,0 +1,365 @@
+from models import db, Business, Transaction, DailySummary, ItemDailySales
+from sqlalchemy import func, case, and_, true, update
+from datetime import datetime, date, timedelta
+from collections import defaultdict
+import numpy as np
+
+# DailySummary holds one row per (business, day, type, category) with the summed
+# amount / cogs / profit and the number of ledger rows behind it. Every write path
+# applies its delta here before committing, so the rollup is always in the same
+# DB transaction as the ledger change and the dashboards never scan raw rows.
+#
+# ItemDailySales is the same idea per (inventory item, day) for Sales only, and
+# feeds velocity, demand forecasting and profitability as dense per-item arrays.
+#
+# Buckets are updated read-modify-write, so every writer first locks the rows of the
+# businesses it touches (a no-op UPDATE: a row lock on Postgres, the write lock on
+# SQLite). Concurrent writers to one business then apply their deltas one after the
+# other instead of losing an increment or both inserting the same new bucket.
+
+
+def _as_date(value):
+    """func.date() comes back as a string on SQLite and a date on Postgres."""
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def entry(txn):
+    """Snapshot the fields of a transaction that the rollup depends on."""
+    ts = txn.timestamp or datetime.utcnow()
+    item_id = int(txn.inventory_item_id) if txn.inventory_item_id else None
+    return (int(txn.business_id), ts.date(), txn.type, txn.category,
+            txn.amount or 0.0, txn.cogs or 0.0, txn.profit or 0.0,
+            item_id, txn.quantity or 0)
+
+
+def lock_businesses(business_ids):
+    """Take the per-business write lock that orders rollup writers (see the note above)."""
+    # Sorted, so two writers spanning several businesses cannot deadlock. No autoflush:
+    # pending ledger edits are flushed after the lock, so every writer locks business
+    # before transaction rows, in the same order as the recompute job
+    with db.session.no_autoflush:
+        for business_id in sorted(business_ids):
+            db.session.execute(
+                update(Business).where(Business.id == business_id).values(change_seq=Business.change_seq)
+            )
+
+
+def apply_entries(entries, sign=1):
+    """Add (sign=1) or remove (sign=-1) snapshotted transactions from the rollup."""
+    deltas = defaultdict(lambda: [0.0, 0.0, 0.0, 0])
+    item_deltas = defaultdict(lambda: [0, 0.0, 0.0, 0])
+    for business_id, day, txn_type, category, amount, cogs, profit, item_id, quantity in entries:
+        d = deltas[(business_id, day, txn_type, category)]
+        d[0] += sign * amount
+        d[1] += sign * cogs
+        d[2] += sign * profit
+        d[3] += sign
+        if txn_type == 'Sale' and item_id:
+            d = item_deltas[(business_id, item_id, day)]
+            d[0] += sign * quantity
+            d[1] += sign * amount
+            d[2] += sign * profit
+            d[3] += sign
+    if not deltas:
+        return
+
+    # Fetch every existing bucket we touch in one query per business
+    existing = {}
+    by_business = defaultdict(set)
+    for business_id, day, _, _ in deltas:
+        by_business[business_id].add(day)
+    lock_businesses(by_business)
+    for business_id, days in by_business.items():
+        rows = DailySummary.query.filter(
+            DailySummary.business_id == business_id,
+            DailySummary.day.in_(days)
+        ).all()
+        for r in rows:
+            existing[(r.business_id, r.day, r.type, r.category)] = r
+
+    for key, (amount, cogs, profit, count) in deltas.items():
+        row = existing.get(key)
+        if row is None:
+            if count <= 0:
+                continue # Nothing to remove from (e.g. rollup not built yet)
+            business_id, day, txn_type, category = key
+            row = DailySummary(business_id=business_id, day=day, type=txn_type, category=category,
+                               amount=0.0, cogs=0.0, profit=0.0, count=0)
+            db.session.add(row)
+        row.amount = (row.amount or 0) + amount
+        row.cogs = (row.cogs or 0) + cogs
+        row.profit = (row.profit or 0) + profit
+        row.count = (row.count or 0) + count
+        if row.count <= 0:
+            db.session.delete(row)
+
+    if item_deltas:
+        _apply_item_deltas(item_deltas)
+
+
+def _apply_item_deltas(item_deltas):
+    existing = {}
+    by_business = defaultdict(set)
+    for business_id, item_id, day in item_deltas:
+        by_business[business_id].add(day)
+    for business_id, days in by_business.items():
+        item_ids = {i for b, i, _ in item_deltas if b == business_id}
+        rows = ItemDailySales.query.filter(
+            ItemDailySales.business_id == business_id,
+            ItemDailySales.inventory_item_id.in_(item_ids),
+            ItemDailySales.day.in_(days)
+        ).all()
+        for r in rows:
+            existing[(r.business_id, r.inventory_item_id, r.day)] = r
+
+    for key, (quantity, revenue, profit, count) in item_deltas.items():
+        row = existing.get(key)
+        if row is None:
+            if count <= 0:
+                continue
+            business_id, item_id, day = key
+            row = ItemDailySales(business_id=business_id, inventory_item_id=item_id, day=day,
+                                 quantity=0, revenue=0.0, profit=0.0, count=0)
+            db.session.add(row)
+        row.quantity = (row.quantity or 0) + quantity
+        row.revenue = (row.revenue or 0) + revenue
+        row.profit = (row.profit or 0) + profit
+        row.count = (row.count or 0) + count
+        if row.count <= 0:
+            db.session.delete(row)
+
+
+def apply_cost_deltas(business_id, deltas):
+    """Shift cogs/profit of existing buckets after a cost correction.
+
+    deltas: (day, type, category, item_id, cogs_delta, profit_delta) tuples. A cost
+    change moves neither amounts nor counts, so the buckets already exist.
+    """
+    summary = defaultdict(lambda: [0.0, 0.0])
+    items = defaultdict(float)
+    for day, txn_type, category, item_id, cogs, profit in deltas:
+        day = _as_date(day)
+        d = summary[(day, txn_type, category)]
+        d[0] += cogs
+        d[1] += profit
+        if txn_type == 'Sale' and item_id:
+            items[(int(item_id), day)] += profit
+    if not summary:
+        return
+
+    lock_businesses([business_id])
+    days = {day for day, _, _ in summary}
+    for r in DailySummary.query.filter(DailySummary.business_id == business_id, DailySummary.day.in_(days)):
+        d = summary.get((r.day, r.type, r.category))
+        if d:
+            r.cogs = (r.cogs or 0) + d[0]
+            r.profit = (r.profit or 0) + d[1]
+    if items:
+        for r in ItemDailySales.query.filter(
+            ItemDailySales.business_id == business_id,
+            ItemDailySales.inventory_item_id.in_({i for i, _ in items}),
+            ItemDailySales.day.in_({day for _, day in items})
+        ):
+            profit = items.get((r.inventory_item_id, r.day))
+            if profit:
+                r.profit = (r.profit or 0) + profit
+
+
+def record_transaction(txn):
+    apply_entries([entry(txn)], 1)
+
+
+def unrecord_transaction(txn):
+    apply_entries([entry(txn)], -1)
+
+
+def record_transactions(txns):
+    apply_entries([entry(t) for t in txns], 1)
+
+
+def rebuild(business_id=None):
+    """Recompute the rollups from the raw ledger (all businesses, or just one)."""
+    for model in (DailySummary, ItemDailySales):
+        delete_q = model.query
+        if business_id is not None:
+            delete_q = delete_q.filter(model.business_id == business_id)
+        delete_q.delete(synchronize_session=False)
+
+    day_col = func.date(Transaction.timestamp)
+    q = db.session.query(
+        Transaction.business_id, day_col, Transaction.type, Transaction.category,
+        func.sum(Transaction.amount), func.sum(Transaction.cogs),
+        func.sum(Transaction.profit), func.count(Transaction.id)
+    )
+    if business_id is not None:
+        q = q.filter(Transaction.business_id == business_id)
+    q = q.group_by(Transaction.business_id, day_col, Transaction.type, Transaction.category)
+
+    rows = [{
+        "business_id": b, "day": _as_date(d), "type": t, "category": c,
+        "amount": float(a or 0), "cogs": float(cg or 0), "profit": float(p or 0), "count": n
+    } for b, d, t, c, a, cg, p, n in q.all()]
+    if rows:
+        db.session.bulk_insert_mappings(DailySummary, rows)
+
+    q = db.session.query(
+        Transaction.business_id, Transaction.inventory_item_id, day_col,
+        func.sum(Transaction.quantity), func.sum(Transaction.amount),
+        func.sum(Transaction.profit), func.count(Transaction.id)
+    ).filter(Transaction.type == 'Sale', Transaction.inventory_item_id.isnot(None))
+    if business_id is not None:
+        q = q.filter(Transaction.business_id == business_id)
+    q = q.group_by(Transaction.business_id, Transaction.inventory_item_id, day_col)
+
+    item_rows = [{
+        "business_id": b, "inventory_item_id": i, "day": _as_date(d),
+        "quantity": int(qty or 0), "revenue": float(a or 0), "profit": float(p or 0), "count": n
+    } for b, i, d, qty, a, p, n in q.all()]
+    if item_rows:
+        db.session.bulk_insert_mappings(ItemDailySales, item_rows)
+    return len(rows) + len(item_rows)
+
+
+# ── Readers ──────────────────────────────────────────
+
+def _range(q, business_id, start_day, end_day):
+    q = q.filter(DailySummary.business_id == business_id)
+    if start_day is not None:
+        q = q.filter(DailySummary.day >= start_day)
+    if end_day is not None:
+        q = q.filter(DailySummary.day <= end_day)
+    return q
+
+
+def period_totals(business_id, start_day=None, end_day=None):
+    """Sales/COGS/expense totals for a day range in one conditional-aggregate query."""
+    is_sale = DailySummary.type == 'Sale'
+    is_expense = DailySummary.type == 'Expense'
+    q = db.session.query(
+        func.sum(case((is_sale, DailySummary.amount), else_=0)),
+        func.sum(case((is_sale, DailySummary.cogs), else_=0)),
+        func.sum(case((is_expense, DailySummary.amount), else_=0)),
+        func.sum(DailySummary.profit),
+        func.sum(DailySummary.count)
+    )
+    sales, cogs, expenses, profit, count = _range(q, business_id, start_day, end_day).one()
+    return {
+        "sales": float(sales or 0), "cogs": float(cogs or 0), "expenses": float(expenses or 0),
+        "profit": float(profit or 0), "count": int(count or 0)
+    }
+
+
+def window_totals(business_id, windows):
+    """Totals for several day windows in a single conditional-aggregate pass.
+
+    `windows` maps a name to (start_day, end_day), either bound may be None.
+    Returns {name: {"sales", "cogs", "expenses"}}.
+    """
+    is_sale = DailySummary.type == 'Sale'
+    is_expense = DailySummary.type == 'Expense'
+    columns = []
+    for start_day, end_day in windows.values():
+        bounds = []
+        if start_day is not None:
+            bounds.append(DailySummary.day >= start_day)
+        if end_day is not None:
+            bounds.append(DailySummary.day <= end_day)
+        in_window = and_(*bounds) if bounds else true()
+        columns += [
+            func.sum(case((and_(in_window, is_sale), DailySummary.amount), else_=0)),
+            func.sum(case((and_(in_window, is_sale), DailySummary.cogs), else_=0)),
+            func.sum(case((and_(in_window, is_expense), DailySummary.amount), else_=0)),
+        ]
+
+    # Only read the days the widest window needs
+    starts = [w[0] for w in windows.values()]
+    earliest = None if any(d is None for d in starts) else min(starts)
+    row = _range(db.session.query(*columns), business_id, earliest, None).one()
+
+    result = {}
+    for n, name in enumerate(windows):
+        sales, cogs, expenses = row[n * 3:n * 3 + 3]
+        result[name] = {"sales": float(sales or 0), "cogs": float(cogs or 0), "expenses": float(expenses or 0)}
+    return result
+
+
+def daily_totals(business_id, start_day=None, end_day=None):
+    """[(day, type, amount, cogs, profit, count)] ordered by day."""
+    q = db.session.query(
+        DailySummary.day, DailySummary.type,
+        func.sum(DailySummary.amount), func.sum(DailySummary.cogs),
+        func.sum(DailySummary.profit), func.sum(DailySummary.count)
+    )
+    q = _range(q, business_id, start_day, end_day)
+    q = q.group_by(DailySummary.day, DailySummary.type).order_by(DailySummary.day)
+    return [(_as_date(d), t, float(a or 0), float(c or 0), float(p or 0), int(n or 0))
+            for d, t, a, c, p, n in q.all()]
+
+
+def category_totals(business_id, start_day=None, end_day=None, txn_type=None):
+    """[(category, type, amount)] summed over a day range."""
+    q = db.session.query(DailySummary.category, DailySummary.type, func.sum(DailySummary.amount))
+    q = _range(q, business_id, start_day, end_day)
+    if txn_type:
+        q = q.filter(DailySummary.type == txn_type)
+    q = q.group_by(DailySummary.category, DailySummary.type)
+    return [(c, t, float(a or 0)) for c, t, a in q.all()]
+
+
+def item_quantities(business_id, start_day=None, end_day=None):
+    """{inventory_item_id: units sold} over a day range, in one GROUP BY."""
+    q = db.session.query(ItemDailySales.inventory_item_id, func.sum(ItemDailySales.quantity))
+    q = q.filter(ItemDailySales.business_id == business_id)
+    if start_day is not None:
+        q = q.filter(ItemDailySales.day >= start_day)
+    if end_day is not None:
+        q = q.filter(ItemDailySales.day <= end_day)
+    return {i: int(qty or 0) for i, qty in q.group_by(ItemDailySales.inventory_item_id).all()}
+
+
+def item_sales(business_id, item_ids, days=90, end_day=None):
+    """Dense per-item sales arrays aligned with `item_ids`.
+
+    Returns a dict with:
+      quantity       (len(item_ids), days) units sold per day, last column = end_day
+      volume, revenue, profit, count   all-time totals per item (1-D)
+    """
+    end_day = end_day or datetime.utcnow().date()
+    start_day = end_day - timedelta(days=days - 1)
+    index = {item_id: n for n, item_id in enumerate(item_ids)}
+    n_items = len(item_ids)
+
+    quantity = np.zeros((n_items, days))
+    rows = db.session.query(
+        ItemDailySales.inventory_item_id, ItemDailySales.day, ItemDailySales.quantity
+    ).filter(
+        ItemDailySales.business_id == business_id,
+        ItemDailySales.day >= start_day,
+        ItemDailySales.day <= end_day
+    ).all()
+    rows = [r for r in rows if r[0] in index]
+    if rows:
+        item_idx = np.fromiter((index[r[0]] for r in rows), dtype=int, count=len(rows))
+        day_idx = np.fromiter(((_as_date(r[1]) - start_day).days for r in rows), dtype=int, count=len(rows))
+        qty = np.fromiter((r[2] or 0 for r in rows), dtype=float, count=len(rows))
+        np.add.at(quantity, (item_idx, day_idx), qty)
+
+    volume = np.zeros(n_items)
+    revenue = np.zeros(n_items)
+    profit = np.zeros(n_items)
+    count = np.zeros(n_items, dtype=int)
+    totals = db.session.query(
+        ItemDailySales.inventory_item_id, func.sum(ItemDailySales.quantity),
+        func.sum(ItemDailySales.revenue), func.sum(ItemDailySales.profit), func.sum(ItemDailySales.count)
+    ).filter(ItemDailySales.business_id == business_id).group_by(ItemDailySales.inventory_item_id).all()
+    for item_id, qty, rev, prof, n in totals:
+        if item_id in index:
+            k = index[item_id]
+            volume[k], revenue[k], profit[k], count[k] = qty or 0, rev or 0, prof or 0, n or 0
+
+    return {
+        "item_ids": list(item_ids), "start_day": start_day, "end_day": end_day,
+        "quantity": quantity, "volume": volume, "revenue": revenue, "profit": profit, "count": count
+    }
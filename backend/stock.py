@@ -0,0 +1,63 @@
+from models import db, InventoryItem
+from sqlalchemy import update, select
+import changes
+
+# Stock moves are single conditional UPDATEs:
+#   UPDATE inventory_item SET stock_quantity = stock_quantity - q
+#    WHERE id = :id AND business_id = :b AND stock_quantity >= q
+#   RETURNING cost_price, selling_price, stock_quantity
+# The check and the write happen in one statement, so two terminals selling the
+# same SKU at once can never both pass the check on a stale read. Postgres holds
+# the row lock from the UPDATE until commit; SQLite serialises writers on the file.
+# No row is returned when the item is missing or short, and nothing is changed.
+
+
+def _as_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def take(business_id, item_id, quantity):
+    """Decrement stock if at least `quantity` is left; the updated row (cost_price, selling_price, stock_quantity) or None."""
+    item_id = _as_id(item_id)
+    if item_id is None:
+        return None
+    row = db.session.execute(
+        update(InventoryItem)
+        .where(InventoryItem.id == item_id, InventoryItem.business_id == business_id,
+               InventoryItem.stock_quantity >= quantity)
+        .values(stock_quantity=InventoryItem.stock_quantity - quantity)
+        .returning(InventoryItem.cost_price, InventoryItem.selling_price, InventoryItem.stock_quantity)
+    ).first()
+    if row is not None:
+        changes.record(business_id, changes.INVENTORY_ITEM, [item_id])
+    return row
+
+
+def give_back(business_id, item_id, quantity):
+    """Return stock from a reverted/deleted sale. False if the item no longer exists."""
+    item_id = _as_id(item_id)
+    if item_id is None or not quantity:
+        return False
+    result = db.session.execute(
+        update(InventoryItem)
+        .where(InventoryItem.id == item_id, InventoryItem.business_id == business_id)
+        .values(stock_quantity=InventoryItem.stock_quantity + quantity)
+    )
+    if result.rowcount != 1:
+        return False
+    changes.record(business_id, changes.INVENTORY_ITEM, [item_id])
+    return True
+
+
+def available(business_id, item_id):
+    """Current stock for an error message after take() failed; None if the item does not exist."""
+    item_id = _as_id(item_id)
+    if item_id is None:
+        return None
+    return db.session.execute(
+        select(InventoryItem.stock_quantity)
+        .where(InventoryItem.id == item_id, InventoryItem.business_id == business_id)
+    ).scalar()
@@ -0,0 +1,42 @@
+from conftest import seed_business, auth_headers
+import analytics_cache
+
+
+def test_dashboard_is_cached_until_a_write(client):
+    user, biz, items = seed_business(n_items=3, days=10)
+    headers = auth_headers(user)
+    cache = analytics_cache.get_cache()
+    cache.clear()
+    url = f"/api/businesses/{biz.id}/ai/dashboard?granularity=daily"
+
+    first = client.get(url, headers=headers)
+    hits = cache.stats.hits
+    second = client.get(url, headers=headers)
+    assert second.status_code == 200
+    assert cache.stats.hits == hits + 1
+    assert second.get_json() == first.get_json()
+
+    resp = client.post(f"/api/businesses/{biz.id}/transactions", headers=headers, json={
+        "type": "Sale", "amount": 1000, "category": "Sales", "description": "big sale"
+    })
+    assert resp.status_code == 201
+
+    misses = cache.stats.misses
+    third = client.get(url, headers=headers)
+    assert cache.stats.misses == misses + 1
+    assert third.get_json()["total_sales"] > first.get_json()["total_sales"]
+
+
+def test_other_business_is_not_invalidated(client):
+    user_a, biz_a, _ = seed_business(n_items=2, days=5)
+    user_b, biz_b, _ = seed_business(n_items=2, days=5)
+    url = f"/api/businesses/{biz_a.id}/ai/pnl?granularity=daily"
+    client.get(url, headers=auth_headers(user_a))
+
+    client.post(f"/api/businesses/{biz_b.id}/transactions", headers=auth_headers(user_b), json={
+        "type": "Expense", "amount": 10, "category": "Utilities"
+    })
+
+    hits = analytics_cache.get_cache().stats.hits
+    client.get(url, headers=auth_headers(user_a))
+    assert analytics_cache.get_cache().stats.hits == hits + 1
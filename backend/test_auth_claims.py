@@ -0,0 +1,62 @@
+from conftest import seed_business, auth_headers, capture_statements
+from models import db
+
+
+def _identity_queries(fn):
+    result, statements = capture_statements(
+        fn, keep=lambda s: 'FROM user' in s or 'FROM business_member' in s)
+    return result, [s for s, _ in statements]
+
+
+def test_login_token_carries_membership_claims(client):
+    user, biz, _ = seed_business(n_items=1, days=1)
+    resp = client.post('/api/login', json={"email": user.email, "password": "secret"})
+    token = resp.get_json()["token"]
+
+    from flask_jwt_extended import decode_token
+    claims = decode_token(token)
+    assert claims["uid"] == user.id
+    assert claims["roles"] == {str(biz.id): "Owner"}
+    assert claims["mv"] == user.membership_version
+
+
+def test_claims_authorise_without_identity_queries(client):
+    user, biz, items = seed_business(n_items=2, days=2, role='Accountant')
+    headers = auth_headers(user)
+    client.get(f"/api/businesses/{biz.id}/inventory", headers=headers)  # warm the version cache
+
+    urls = [
+        f"/api/businesses/{biz.id}/inventory",
+        f"/api/businesses/{biz.id}/ai/dashboard",
+        f"/api/businesses/{biz.id}/export/transactions?format=csv",
+    ]
+    for url in urls:
+        resp, statements = _identity_queries(lambda: client.get(url, headers=headers))
+        assert resp.status_code == 200, url
+        assert statements == [], url
+
+    # update_inventory reuses the role resolved by role_required
+    resp, statements = _identity_queries(lambda: client.put(
+        f"/api/businesses/{biz.id}/inventory/{items[0].id}", headers=headers, json={"stock_quantity": 7}))
+    assert resp.status_code == 200
+    assert statements == []
+
+
+def test_stale_claims_fall_back_to_the_database(client):
+    owner, biz, _ = seed_business(n_items=1, days=1)
+    staff, _, _ = seed_business(n_items=1, days=1)
+    owner_headers = auth_headers(owner)
+
+    assert client.post(f"/api/businesses/{biz.id}/members", headers=owner_headers,
+                       json={"email": staff.email, "role": "Analyst"}).status_code == 201
+    db.session.refresh(staff)
+    analyst_headers = auth_headers(staff)
+    assert client.get(f"/api/businesses/{biz.id}/ai/pnl", headers=analyst_headers).status_code == 200
+
+    # Demote to Staff: the old token still says Analyst but its version is stale
+    assert client.put(f"/api/businesses/{biz.id}/members/{staff.id}", headers=owner_headers,
+                      json={"role": "Staff"}).status_code == 200
+    assert client.get(f"/api/businesses/{biz.id}/ai/pnl", headers=analyst_headers).status_code == 403
+
+    client.delete(f"/api/businesses/{biz.id}/members/{staff.id}", headers=owner_headers)
+    assert client.get(f"/api/businesses/{biz.id}/ai/dashboard", headers=analyst_headers).status_code == 403
@@ -0,0 +1,102 @@
+from datetime import datetime
+from conftest import seed_business, auth_headers
+from models import db, Transaction
+from analytics_cache import MemoryCacheBackend
+from ai_service import ai_service
+import business_classifier
+
+SHOP_HISTORY = [
+    ("Kiran dairy weekly settlement", "Supplier Payments"),
+    ("Paid Kiran dairy invoice", "Supplier Payments"),
+    ("Chai and biscuits for staff", "Staff Welfare"),
+    ("Staff chai break snacks", "Staff Welfare"),
+]
+
+
+def _add_expenses(business_id, history, times, suggested=False):
+    db.session.add_all([
+        Transaction(business_id=business_id, amount=100.0, quantity=1, category=category, type='Expense',
+                    timestamp=datetime(2026, 3, 1), description=description, category_suggested=suggested)
+        for _ in range(times) for description, category in history
+    ])
+    db.session.commit()
+
+
+def test_learns_shop_categories_incrementally(client):
+    user, biz, _ = seed_business(n_items=1, days=3)
+    headers = auth_headers(user)
+    _add_expenses(biz.id, SHOP_HISTORY, 5)
+    # Categories filled in by the model itself are never learned from
+    _add_expenses(biz.id, [("Kiran dairy weekly settlement", "Rent")], 10, suggested=True)
+
+    model = business_classifier.train(biz.id)
+    assert model["samples"] == 3 + 5 * len(SHOP_HISTORY)
+    assert "Rent" in model["clf"].classes_ and "Supplier Payments" in model["clf"].classes_
+
+    resp = client.post(f"/api/businesses/{biz.id}/ai/classify/batch", headers=headers,
+                       json={"descriptions": ["Kiran dairy settlement", "chai for staff", "Electricity bill"]})
+    assert resp.status_code == 200
+    assert resp.get_json()["suggestions"][:2] == ["Supplier Payments", "Staff Welfare"]
+    # Shops without their own model get the global suggestion
+    other_user, other, _ = seed_business(n_items=1, days=1, email="other@example.com")
+    single = client.post(f"/api/businesses/{other.id}/ai/classify", headers=auth_headers(other_user),
+                         json={"description": "Kiran dairy settlement"})
+    assert single.get_json()["suggestion"] != "Supplier Payments"
+
+    # A new confirmed row is learned from the change feed, not by rescanning history
+    created = client.post(f"/api/businesses/{biz.id}/transactions", headers=headers, json={
+        "type": "Expense", "amount": 80, "category": "Staff Welfare", "description": "Staff chai"})
+    assert created.status_code == 201
+    updated = business_classifier.train(biz.id)
+    assert updated["samples"] == model["samples"] + 1
+    assert not business_classifier.is_stale(biz.id, business_classifier.load(biz.id))
+    assert business_classifier.train(biz.id)["samples"] == updated["samples"]
+
+    # Edits that leave description and category alone are not learned again
+    client.put(f"/api/businesses/{biz.id}/transactions/{created.get_json()['id']}", headers=headers, json={"amount": 81})
+    assert business_classifier.train(biz.id)["samples"] == updated["samples"]
+    # A recategorised row is learned with its new label but still counts once
+    client.put(f"/api/businesses/{biz.id}/transactions/{created.get_json()['id']}", headers=headers,
+               json={"category": "Supplier Payments"})
+    assert business_classifier.train(biz.id)["samples"] == updated["samples"]
+
+    # Confirming a suggested category makes that row learnable
+    txn = Transaction.query.filter_by(business_id=biz.id, category_suggested=True).first()
+    client.put(f"/api/businesses/{biz.id}/transactions/{txn.id}", headers=headers, json={"category": "Supplier Payments"})
+    assert business_classifier.train(biz.id)["samples"] == updated["samples"] + 1
+
+
+def test_new_category_refits_and_requests_train_in_background(client):
+    user, biz, _ = seed_business(n_items=1, days=1)
+    headers = auth_headers(user)
+    _add_expenses(biz.id, SHOP_HISTORY, 5)
+
+    client.post(f"/api/businesses/{biz.id}/ai/classify", headers=headers, json={"description": "Kiran dairy"})
+    business_classifier._executor.submit(lambda: None).result() # Drain the single training worker
+    model = business_classifier.load(biz.id)
+    assert model["samples"] == 1 + 5 * len(SHOP_HISTORY)
+
+    _add_expenses(biz.id, [("Diwali decorations", "Festivals")], 1)
+    client.post(f"/api/businesses/{biz.id}/transactions", headers=headers, json={
+        "type": "Expense", "amount": 50, "category": "Festivals", "description": "Diwali lights"})
+    refit = business_classifier.train(biz.id)
+    assert "Festivals" in refit["clf"].classes_
+    assert refit["samples"] == model["samples"] + 2
+
+
+def test_models_are_lru_cached_across_businesses(client, monkeypatch):
+    monkeypatch.setattr(business_classifier, '_cache', MemoryCacheBackend(max_entries=2, ttl=3600))
+    ids = []
+    for n in range(3):
+        _, biz, _ = seed_business(n_items=1, days=1, email=f"shop{n}@example.com")
+        _add_expenses(biz.id, SHOP_HISTORY, 5)
+        business_classifier.train(biz.id)
+        ids.append(biz.id)
+
+    for business_id in ids:
+        assert ai_service.business_model(business_id) is not None
+    stats = business_classifier.cache_stats()
+    assert stats["entries"] == 2 and stats["evictions"] >= 1
+    # Weights are stored sparse: only the hashed features the shop used take memory
+    clf = business_classifier.load(ids[0])["clf"]
+    assert clf.coef_.nnz < clf.coef_.shape[0] * clf.coef_.shape[1] / 100
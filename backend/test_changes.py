@@ -0,0 +1,53 @@
+from conftest import seed_business, auth_headers
+
+
+def _poll(client, biz_id, headers, since, **params):
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    resp = client.get(f"/api/businesses/{biz_id}/changes?since={since}&{query}", headers=headers)
+    assert resp.status_code == 200
+    return resp.get_json()
+
+
+def test_changes_feed_tracks_writes_and_deletes(client):
+    user, biz, items = seed_business(n_items=2, days=1)
+    headers = auth_headers(user)
+    base = f"/api/businesses/{biz.id}"
+
+    start = client.get(f"{base}/changes", headers=headers).get_json()["next_since"]
+    assert _poll(client, biz.id, headers, start)["changes"] == []
+
+    sale = client.post(f"{base}/transactions", headers=headers,
+                       json={"type": "Sale", "inventory_item_id": items[0].id, "quantity": 3}).get_json()["id"]
+    expense = client.post(f"{base}/transactions", headers=headers,
+                          json={"type": "Expense", "amount": 10, "category": "Rent"}).get_json()["id"]
+    client.delete(f"{base}/transactions/{expense}", headers=headers)
+    client.put(f"{base}/inventory/{items[1].id}", headers=headers, json={"selling_price": 99})
+
+    body = _poll(client, biz.id, headers, start)
+    by_key = {(c["entity"], c["id"]): c for c in body["changes"]}
+    assert by_key[("transaction", sale)]["data"]["quantity"] == 3
+    assert by_key[("transaction", expense)] == {
+        "seq": by_key[("transaction", expense)]["seq"], "entity": "transaction", "op": "delete", "id": expense}
+    assert by_key[("inventory_item", items[0].id)]["data"]["stock_quantity"] == 47
+    assert by_key[("inventory_item", items[1].id)]["data"]["selling_price"] == 99
+    assert [c["seq"] for c in body["changes"]] == sorted(c["seq"] for c in body["changes"])
+    assert not body["has_more"]
+
+    # Nothing new since the last poll
+    assert _poll(client, biz.id, headers, body["next_since"])["changes"] == []
+
+
+def test_changes_feed_pages_with_limit(client):
+    user, biz, items = seed_business(n_items=1, days=1)
+    headers = auth_headers(user)
+    start = client.get(f"/api/businesses/{biz.id}/changes", headers=headers).get_json()["next_since"]
+    client.post(f"/api/businesses/{biz.id}/transactions/batch", headers=headers,
+                json={"transactions": [{"type": "Expense", "amount": n + 1} for n in range(5)]})
+
+    seen, since, more = [], start, True
+    while more:
+        body = _poll(client, biz.id, headers, since, limit=2)
+        seen += [c["id"] for c in body["changes"]]
+        since, more = body["next_since"], body["has_more"]
+    assert len(seen) == len(set(seen)) == 5
+    assert client.get(f"/api/businesses/{biz.id}/changes?since=-1", headers=headers).status_code == 400
@@ -0,0 +1,53 @@
+from conftest import seed_business, auth_headers
+from models import db, Transaction
+from ai_service import ai_service, normalise_description
+from test_importer import _import
+
+
+def test_batch_matches_single_and_uses_cache(client):
+    user, _, _ = seed_business(n_items=1, days=1)
+    headers = auth_headers(user)
+    descriptions = ["Electricity bill for March", "Staff salary", "", "ELECTRICITY  bill for march!", "Google Ads"]
+    ai_service.classify_cache.clear()
+
+    resp = client.post("/api/ai/classify/batch", headers=headers, json={"descriptions": descriptions})
+    assert resp.status_code == 200
+    suggestions = resp.get_json()["suggestions"]
+    assert suggestions[0] == suggestions[3]
+    assert suggestions[2] == "Others"
+    assert set(suggestions) <= set(ai_service.classifier.classes_) | {"Others"}
+    for description, suggestion in zip(descriptions, suggestions):
+        single = client.post("/api/ai/classify", headers=headers, json={"description": description})
+        assert single.get_json()["suggestion"] == suggestion
+
+    # Three distinct non-empty descriptions were classified; the rest came from the cache
+    assert len(ai_service.classify_cache) == 3
+    assert normalise_description("ELECTRICITY  bill for march!") == "electricity bill for march"
+    assert client.post("/api/ai/classify/batch", headers=headers, json={"descriptions": "x"}).status_code == 400
+
+
+def test_import_fills_missing_expense_categories(client, monkeypatch):
+    user, biz, _ = seed_business(n_items=1, days=1)
+    batches = []
+
+    def fake_classify(descriptions, business_id=None):
+        assert business_id == biz.id
+        batches.append(list(descriptions))
+        return ["Utilities"] * len(descriptions)
+
+    monkeypatch.setattr(ai_service, "classify_expenses", fake_classify)
+    text = ("date,type,category,amount,description\n"
+            "2026-03-01,Expense,,1200,Electricity bill\n"
+            "2026-03-02,Expense,Rent,900,Shop rent\n"
+            "2026-03-03,Sale,,50,Counter sale\n")
+    report = _import(client, auth_headers(user), biz.id, text)
+    assert report["imported"] == 3
+    assert batches == [["Electricity bill"]]
+
+    db.session.expire_all()
+    categories = {t.description: t.category for t in Transaction.query.filter(
+        Transaction.business_id == biz.id, Transaction.description.in_(["Electricity bill", "Shop rent", "Counter sale"]))}
+    assert categories == {"Electricity bill": "Utilities", "Shop rent": "Rent", "Counter sale": "Others"}
+
+    # Fingerprints don't depend on the suggestion, so a re-upload is still recognised
+    assert _import(client, auth_headers(user), biz.id, text)["duplicates"] == 3
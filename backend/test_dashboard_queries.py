@@ -0,0 +1,37 @@
+from conftest import seed_business, auth_headers, capture_statements
+
+# Auth lookups + products + period totals + item velocities + chart series
+# + expense breakdown + top products. Must not depend on catalogue size.
+MAX_DASHBOARD_QUERIES = 10
+
+
+def _count_queries(client, url, headers):
+    resp, statements = capture_statements(lambda: client.get(url, headers=headers))
+    assert resp.status_code == 200, resp.data[:200]
+    return len(statements)
+
+
+def test_dashboard_query_count_is_constant(client):
+    small_user, small_biz, _ = seed_business(n_items=3, days=20)
+    large_user, large_biz, _ = seed_business(n_items=60, days=20)
+
+    for granularity in ('daily', 'weekly', 'monthly'):
+        small = _count_queries(client, f"/api/businesses/{small_biz.id}/ai/dashboard?granularity={granularity}",
+                               auth_headers(small_user))
+        large = _count_queries(client, f"/api/businesses/{large_biz.id}/ai/dashboard?granularity={granularity}",
+                               auth_headers(large_user))
+        assert small == large, f"{granularity}: {small} queries for 3 products, {large} for 60"
+        assert large <= MAX_DASHBOARD_QUERIES, f"{granularity}: {large} queries"
+
+
+def test_dashboard_totals(client):
+    user, biz, items = seed_business(n_items=2, days=40)
+    data = client.get(f"/api/businesses/{biz.id}/ai/dashboard?granularity=monthly", headers=auth_headers(user)).get_json()
+
+    # seed_business: each item sells 2 units/day at selling_price, plus a 40.0 expense per day
+    daily_sales = sum(i.selling_price * 2 for i in items)
+    assert round(data["total_sales"], 2) == round(daily_sales * 30, 2)
+    assert round(data["total_expenses"], 2) == 40.0 * 30
+    assert len(data["weekly_analysis"]) == 6
+    assert len(data["monthly_profit_trend"]) == 6
+    assert data["expense_breakdown"] == [{"category": "Utilities", "amount": 40.0 * 40}]
@@ -0,0 +1,76 @@
+from conftest import seed_business, auth_headers, capture_statements
+
+ENDPOINTS = [
+    "/api/businesses/{id}/transactions?limit=20",
+    "/api/businesses/{id}/inventory",
+    "/api/businesses/{id}/members",
+    "/api/businesses/{id}/ai/dashboard?granularity=weekly",
+    "/api/businesses/{id}/ai/pnl?granularity=daily",
+    "/api/businesses/{id}/ai/advanced-analytics",
+    "/api/businesses/{id}/ai/export-data",
+]
+
+
+def test_repeat_poll_returns_304(client):
+    user, biz, _ = seed_business(n_items=3, days=10)
+    headers = auth_headers(user)
+
+    for template in ENDPOINTS:
+        url = template.format(id=biz.id)
+        first = client.get(url, headers=headers)
+        assert first.status_code == 200, url
+        etag = first.headers.get('ETag')
+        assert etag and not etag.startswith('W/'), url
+
+        second, statements = capture_statements(lambda: client.get(url, headers={**headers, 'If-None-Match': etag}))
+        queries = len(statements)
+        assert second.status_code == 304, url
+        assert second.data == b''
+        assert second.headers['ETag'] == etag
+        # Auth check plus the data-version lookup; the view itself never runs
+        assert queries <= 4, (url, queries)
+
+
+def test_etag_changes_with_params_and_writes(client):
+    user, biz, items = seed_business(n_items=3, days=10)
+    headers = auth_headers(user)
+    url = f"/api/businesses/{biz.id}/inventory"
+
+    etag = client.get(url, headers=headers).headers['ETag']
+    other = client.get(f"/api/businesses/{biz.id}/transactions?limit=5", headers=headers).headers['ETag']
+    paged = client.get(f"/api/businesses/{biz.id}/transactions?limit=5&page=2", headers=headers).headers['ETag']
+    assert other != paged
+
+    resp = client.put(f"/api/businesses/{biz.id}/inventory/{items[0].id}", headers=headers, json={"stock_quantity": 99})
+    assert resp.status_code == 200
+
+    fresh = client.get(url, headers={**headers, 'If-None-Match': etag})
+    assert fresh.status_code == 200
+    assert fresh.headers['ETag'] != etag
+
+
+def test_member_changes_invalidate_members_etag(client):
+    owner, biz, _ = seed_business(n_items=1, days=1)
+    staff, _, _ = seed_business(n_items=1, days=1)
+    headers = auth_headers(owner)
+    url = f"/api/businesses/{biz.id}/members"
+
+    etag = client.get(url, headers=headers).headers['ETag']
+    resp = client.post(url, headers=headers, json={"email": staff.email, "role": "Staff"})
+    assert resp.status_code == 201
+
+    fresh = client.get(url, headers={**headers, 'If-None-Match': etag})
+    assert fresh.status_code == 200
+    assert len(fresh.get_json()) == 2
+
+
+def test_no_etag_before_authentication(client):
+    user, biz, _ = seed_business(n_items=2, days=3)
+    outsider, _, _ = seed_business(n_items=1, days=1)
+    url = f"/api/businesses/{biz.id}/ai/export-data"
+    etag = client.get(url, headers=auth_headers(user)).headers['ETag']
+
+    for headers in ({'Authorization': 'x'}, auth_headers(outsider)):
+        resp = client.get(url, headers={**headers, 'If-None-Match': etag})
+        assert resp.status_code in (401, 403)
+        assert 'ETag' not in resp.headers
@@ -0,0 +1,53 @@
+from flask_jwt_extended import create_access_token
+
+from conftest import seed_business, auth_headers
+from business import identity_stats
+from models import db, User
+
+
+def _plain_headers(user):
+    # Token without membership claims, so every check goes through the resolver
+    return {"Authorization": f"Bearer {create_access_token(identity=user.email)}"}
+
+
+def test_repeat_requests_skip_identity_lookups(client):
+    user, biz, _ = seed_business(n_items=1, days=1)
+    headers = _plain_headers(user)
+    url = f"/api/businesses/{biz.id}/inventory"
+
+    assert client.get(url, headers=headers).status_code == 200
+    before = identity_stats()
+    for _ in range(5):
+        assert client.get(url, headers=headers).status_code == 200
+    after = identity_stats()
+    assert after["db_lookups"] == before["db_lookups"]
+    assert after["lookups_avoided"] >= before["lookups_avoided"] + 10
+
+
+def test_member_changes_evict_cached_roles(client):
+    owner, biz, _ = seed_business(n_items=1, days=1)
+    other, _, _ = seed_business(n_items=1, days=1)
+    owner_headers = auth_headers(owner)
+    other_headers = _plain_headers(other)
+    url = f"/api/businesses/{biz.id}/ai/pnl"
+
+    assert client.get(url, headers=other_headers).status_code == 403  # caches "not a member"
+    client.post(f"/api/businesses/{biz.id}/members", headers=owner_headers, json={"email": other.email, "role": "Analyst"})
+    assert client.get(url, headers=other_headers).status_code == 200
+
+    client.put(f"/api/businesses/{biz.id}/members/{other.id}", headers=owner_headers, json={"role": "Staff"})
+    assert client.get(url, headers=other_headers).status_code == 403
+
+
+def test_admin_delete_user_evicts_identity(client):
+    admin, _, _ = seed_business(n_items=1, days=1)
+    admin.is_master_admin = True
+    victim, biz, _ = seed_business(n_items=1, days=1)
+    db.session.commit()
+    victim_headers = _plain_headers(victim)
+    url = f"/api/businesses/{biz.id}/inventory"
+
+    assert client.get(url, headers=victim_headers).status_code == 200
+    assert client.delete(f"/api/admin/users/{victim.id}", headers=auth_headers(admin)).status_code == 200
+    assert client.get(url, headers=victim_headers).status_code != 200
+    assert "identity" in client.get("/api/admin/cache-stats", headers=auth_headers(admin)).get_json()
@@ -0,0 +1,247 @@
+import io
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from flask import current_app
+
+from conftest import seed_business, auth_headers
+from models import db, Transaction
+from test_rollups import _assert_matches_ledger
+import importer
+
+CSV = """Date,Type,Category,Amount,Description
+2026-01-05,Sale,Produce,120.50,Mangoes
+05-01-2026,expense,Rent,900,January rent
+01/06/2026,Sales,Dairy,45,
+,Sale,Produce,10,no date
+2026-01-07,Sale,Produce,not-a-number,bad amount
+2026-01-07,Sale,Bakery,30,Bread
+"""
+
+ALIAS_CSV = """txn_date,value,expense_type,notes
+2026-02-01,55,Utilities,Power bill
+2026-02-02,12.5,,Walk-in sale
+"""
+
+
+def _upload(client, headers, business_id, text, name='sales.csv'):
+    return client.post(f"/api/businesses/{business_id}/transaction-import", headers=headers,
+                       data={"file": (io.BytesIO(text.encode()), name)}, content_type='multipart/form-data')
+
+
+def _wait(client, headers, status_url, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(status_url, headers=headers).get_json()
+        if status["status"] in ("completed", "failed"):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"import job did not finish: {status}")
+
+
+def _import(client, headers, business_id, text):
+    resp = _upload(client, headers, business_id, text)
+    assert resp.status_code == 202
+    db.session.expire_all()
+    return _wait(client, headers, resp.get_json()["status_url"])
+
+
+def test_import_reports_counts_and_updates_rollup(client):
+    user, biz, _ = seed_business(n_items=1, days=2)
+    report = _import(client, auth_headers(user), biz.id, CSV)
+    assert report["status"] == "completed"
+    assert report["total_rows"] == report["processed"] == 6
+    assert report["imported"] == 4
+    assert report["rejected"] == 2
+    assert report["rejections"][0]["line"] == 6
+    assert report["rows_per_sec"] > 0
+    db.session.expire_all()
+
+    types = {t.description: t.type for t in Transaction.query.filter_by(business_id=biz.id, category='Rent')}
+    assert types == {"January rent": "Expense"}
+    assert os.path.exists(os.path.join(current_app.config['IMPORT_FOLDER'], f"sales_data_{biz.id}.csv"))
+    _assert_matches_ledger(biz.id)
+
+
+def test_import_column_aliases(client):
+    user, biz, _ = seed_business(n_items=1, days=1)
+    assert _import(client, auth_headers(user), biz.id, ALIAS_CSV)["imported"] == 2
+
+    rows = {t.description: (t.type, t.category, t.amount)
+            for t in Transaction.query.filter(Transaction.business_id == biz.id,
+                                              Transaction.description.in_(["Power bill", "Walk-in sale"]))}
+    assert rows == {"Power bill": ("Expense", "Utilities", 55.0), "Walk-in sale": ("Sale", "Others", 12.5)}
+
+
+def test_import_streams_in_chunks(app, tmp_path):
+    _, biz, _ = seed_business(n_items=1, days=1)
+    path = tmp_path / "big.csv"
+    with open(path, 'w') as f:
+        f.write("date,amount,type,category\n")
+        for i in range(2500):
+            f.write(f"2026-03-{1 + i % 28:02d},{i % 97 + 1},{'Sale' if i % 3 else 'Expense'},Bulk\n")
+
+    report = importer.import_file(str(path), biz.id, chunk_size=400)
+    db.session.commit()
+    assert report["imported"] == 2500
+    assert Transaction.query.filter_by(business_id=biz.id, category='Bulk').count() == 2500
+    _assert_matches_ledger(biz.id)
+
+
+def test_date_format_is_detected_per_file(client):
+    user, biz, _ = seed_business(n_items=1, days=1)
+    # The first rows fit mm/dd too; the third settles it as dd/mm for the whole file
+    text = "date,amount,category,type\n01/02/2026,10,DDMM,Sale\n03/04/2026,10,DDMM,Sale\n25/04/2026,10,DDMM,Sale\nsometime,10,DDMM,Sale\n"
+    report = _import(client, auth_headers(user), biz.id, text)
+    assert report["date_format"] == "%d/%m/%Y"
+    assert report["date_format_ambiguous"] is False
+    assert report["imported"] == 3
+    assert report["rejections"] == [{"line": 5, "error": "Unrecognised date: sometime"}]
+
+    days = sorted(t.timestamp.strftime("%Y-%m-%d") for t in Transaction.query.filter_by(business_id=biz.id, category='DDMM'))
+    assert days == ["2026-02-01", "2026-04-03", "2026-04-25"]
+
+
+def test_ambiguous_dates_are_flagged():
+    assert importer.detect_date_format(["01/02/2026", "03/04/2026"]) == ("%m/%d/%Y", True)
+    assert importer.detect_date_format(["2026-01-02", "2026-01-03 10:00"]) == ("%Y-%m-%d", False)
+    assert importer.parse_dates(["2026-01-05", "2026-01-05 10:30", "junk"], "%Y-%m-%d")[1:] == [
+        importer.datetime(2026, 1, 5, 10, 30), None
+    ]
+
+
+def test_failed_job_resumes_from_last_committed_chunk(client, monkeypatch):
+    user, biz, _ = seed_business(n_items=1, days=1)
+    headers = auth_headers(user)
+    text = "date,amount,type,category\n" + "".join(f"2026-04-{1 + i % 28:02d},{i + 1},Sale,Resume\n" for i in range(50))
+    client.application.config['IMPORT_CHUNK_SIZE'] = 10
+
+    calls = {"n": 0}
+    real_insert = importer.insert_chunk
+
+    def flaky_insert(business_id, rows):
+        calls["n"] += 1
+        if calls["n"] == 3:
+            raise RuntimeError("disk full")
+        real_insert(business_id, rows)
+
+    monkeypatch.setattr(importer, "insert_chunk", flaky_insert)
+    try:
+        resp = _upload(client, headers, biz.id, text)
+        status_url = resp.get_json()["status_url"]
+        failed = _wait(client, headers, status_url)
+        assert failed["status"] == "failed"
+        assert failed["processed"] == 20
+        assert "disk full" in failed["message"]
+
+        resumed = client.post(status_url + "/resume", headers=headers)
+        assert resumed.status_code == 202
+        done = _wait(client, headers, status_url)
+    finally:
+        client.application.config['IMPORT_CHUNK_SIZE'] = importer.CHUNK_SIZE
+
+    assert done["status"] == "completed"
+    assert done["processed"] == done["imported"] == 50
+    db.session.expire_all()
+    amounts = sorted(t.amount for t in Transaction.query.filter_by(business_id=biz.id, category='Resume'))
+    assert amounts == [float(i + 1) for i in range(50)]
+    _assert_matches_ledger(biz.id)
+
+
+def test_reimport_skips_known_rows(client):
+    user, biz, _ = seed_business(n_items=1, days=1)
+    headers = auth_headers(user)
+    lines = [f"2026-05-{1 + i % 20:02d},{10 + i},Sale,Dedup,Line {i}\n" for i in range(30)]
+    # Two identical lines in the same statement are both real sales
+    lines.append("2026-05-03,99,Sale,Dedup,Twin\n")
+    lines.append("2026-05-03,99,Sale,Dedup,Twin\n")
+    header = "date,amount,type,category,description\n"
+
+    first = _import(client, headers, biz.id, header + "".join(lines))
+    assert first["imported"] == 32 and first["duplicates"] == 0
+
+    again = _import(client, headers, biz.id, header + "".join(lines))
+    assert again["imported"] == 0 and again["duplicates"] == 32
+
+    extra = [f"2026-06-{1 + i:02d},{500 + i},Expense,Dedup,New {i}\n" for i in range(5)]
+    overlap = _import(client, headers, biz.id, header + "".join(lines[10:] + extra))
+    assert overlap["imported"] == 5 and overlap["duplicates"] == 22
+
+    db.session.expire_all()
+    assert Transaction.query.filter_by(business_id=biz.id, category='Dedup').count() == 37
+    assert Transaction.query.filter_by(business_id=biz.id, description='Twin').count() == 2
+    _assert_matches_ledger(biz.id)
+
+
+def _rows_for(business_id, category):
+    db.session.expire_all()
+    return sorted((t.timestamp.strftime("%Y-%m-%d"), t.type, t.amount, t.description)
+                  for t in Transaction.query.filter_by(business_id=business_id, category=category))
+
+
+EXPECTED_FORMAT_ROWS = [
+    ("2026-07-01", "Sale", 120.0, "Mangoes"),
+    ("2026-07-02", "Expense", 45.5, "Imported"),
+]
+
+
+def test_import_csv_gz(app, tmp_path):
+    import gzip
+    _, biz, _ = seed_business(n_items=1, days=1)
+    path = tmp_path / "export.csv.gz"
+    with gzip.open(path, 'wt') as f:
+        f.write("Date,Amount,Type,Category,Description\n2026-07-01,120,Sale,Gz,Mangoes\n2026-07-02,45.5,Expense,Gz,\n")
+
+    assert importer.detect_format(str(path)) == 'csv.gz'
+    assert importer.count_rows(str(path), 'csv.gz') == 2
+    assert importer.import_file(str(path), biz.id)["imported"] == 2
+    assert _rows_for(biz.id, 'Gz') == EXPECTED_FORMAT_ROWS
+
+
+def test_import_xlsx(app, tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    _, biz, _ = seed_business(n_items=1, days=1)
+    path = tmp_path / "store.xlsx"
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["Date", "Amount", "Type", "Category", "Notes"])
+    ws.append([datetime(2026, 7, 1), 120, "Sale", "Xlsx", "Mangoes"])  # real date cell
+    ws.append(["2026-07-02", 45.5, "Expense", "Xlsx", None])           # text date
+    ws.append([None, None, None, None, None])
+    wb.save(path)
+
+    report = importer.import_file(str(path), biz.id)
+    assert report["imported"] == 2 and report["skipped"] == 1
+    assert _rows_for(biz.id, 'Xlsx') == EXPECTED_FORMAT_ROWS
+
+
+def test_import_parquet_via_endpoint(client, tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    user, biz, _ = seed_business(n_items=1, days=1)
+    table = pa.table({
+        "Timestamp": pa.array([datetime(2026, 7, 1, 9, 30), datetime(2026, 7, 2)], pa.timestamp("us")),
+        "Revenue": [120.0, 45.5],
+        "Type": ["Sale", "Expense"],
+        "Category": ["Parquet", "Parquet"],
+        "Description": ["Mangoes", None],
+        "Unused_blob": ["x" * 1000, "y" * 1000],
+    })
+    path = tmp_path / "erp.parquet"
+    pq.write_table(table, path)
+
+    headers = auth_headers(user)
+    with open(path, 'rb') as f:
+        resp = client.post(f"/api/businesses/{biz.id}/transaction-import", headers=headers,
+                           data={"file": (f, "erp.parquet")}, content_type='multipart/form-data')
+    assert resp.status_code == 202
+    status = _wait(client, headers, resp.get_json()["status_url"])
+    assert status["status"] == "completed"
+    assert status["total_rows"] == status["imported"] == 2
+    assert _rows_for(biz.id, 'Parquet') == EXPECTED_FORMAT_ROWS
+
+    bad = _upload(client, headers, biz.id, "whatever", name="notes.txt")
+    assert bad.status_code == 400
@@ -0,0 +1,51 @@
+import os
+import model_registry
+import ai_service as ai_module
+from ai_service import BulkBinsAIService, CLASSIFIER_TRAINING_DATA, fit_expense_classifier
+
+
+def _counting_fit(calls):
+    def fit(samples):
+        calls.append(len(samples))
+        return fit_expense_classifier(samples)
+    return fit
+
+
+def test_trains_once_then_loads(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry, 'MODEL_DIR', str(tmp_path))
+    calls = []
+
+    first = model_registry.get_or_train('clf', CLASSIFIER_TRAINING_DATA, _counting_fit(calls))
+    second = model_registry.get_or_train('clf', CLASSIFIER_TRAINING_DATA, _counting_fit(calls))
+    assert calls == [len(CLASSIFIER_TRAINING_DATA)]
+    assert list(second.classes_) == list(first.classes_)
+    assert list(second.predict(["Monthly store rent payment"])) == list(first.predict(["Monthly store rent payment"]))
+
+    # New data or a new model version retrains and drops the old artefact
+    model_registry.get_or_train('clf', CLASSIFIER_TRAINING_DATA + [("Shop rent", "Rent")], _counting_fit(calls))
+    model_registry.get_or_train('clf', CLASSIFIER_TRAINING_DATA, _counting_fit(calls), version=2)
+    assert len(calls) == 3
+    artefacts = [f for f in os.listdir(tmp_path) if f.endswith('.joblib')]
+    assert artefacts == [model_registry.read_manifest('clf')["artifact"]]
+
+    # A missing artefact is rebuilt rather than failing
+    os.remove(os.path.join(tmp_path, artefacts[0]))
+    model_registry.get_or_train('clf', CLASSIFIER_TRAINING_DATA, _counting_fit(calls), version=2)
+    assert len(calls) == 4
+
+
+def test_service_does_not_fit_at_construction(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry, 'MODEL_DIR', str(tmp_path))
+    calls = []
+    monkeypatch.setattr(ai_module, 'fit_expense_classifier', _counting_fit(calls))
+
+    service = BulkBinsAIService()
+    assert calls == []
+    assert model_registry.read_manifest('expense_classifier') is None
+
+    assert service.classify_expense("Electricity bill") in set(service.classifier.classes_) | {"Others"}
+    assert len(calls) == 1
+
+    # A second worker loads the saved artefact instead of fitting
+    BulkBinsAIService().classify_expense("Electricity bill")
+    assert len(calls) == 1
@@ -0,0 +1,66 @@
+from conftest import seed_business, auth_headers
+
+
+def _walk(client, url, headers):
+    ids, cursor, pages = [], '', 0
+    while cursor is not None:
+        resp = client.get(f"{url}&after={cursor}", headers=headers)
+        assert resp.status_code == 200
+        body = resp.get_json()
+        ids.extend(t["id"] for t in body["transactions"])
+        cursor = body["next_cursor"]
+        pages += 1
+    return ids, pages
+
+
+def test_cursor_walk_matches_offset_order(client):
+    # 4 items x 2 sales + 1 expense per day, all at noon: plenty of timestamp ties
+    user, biz, _ = seed_business(n_items=4, days=12)
+    headers = auth_headers(user)
+
+    full = client.get(f"/api/businesses/{biz.id}/transactions?limit=1000", headers=headers).get_json()
+    ids, pages = _walk(client, f"/api/businesses/{biz.id}/transactions?limit=7", headers)
+
+    assert len(ids) == len(set(ids)) == full["total"]
+    assert sorted(ids) == sorted(t["id"] for t in full["transactions"])
+    assert pages == -(-full["total"] // 7)
+
+
+def test_cursor_total_is_opt_in(client):
+    user, biz, _ = seed_business(n_items=2, days=3)
+    headers = auth_headers(user)
+    url = f"/api/businesses/{biz.id}/transactions?limit=5&after="
+
+    assert "total" not in client.get(url, headers=headers).get_json()
+    body = client.get(url + "&include_total=1", headers=headers).get_json()
+    assert body["total"] == 2 * 3 + 3
+    assert client.get(f"/api/businesses/{biz.id}/transactions?after=garbage", headers=headers).status_code == 400
+
+
+def test_non_positive_limit_is_clamped(client):
+    user, biz, _ = seed_business(n_items=2, days=3)
+    headers = auth_headers(user)
+    base = f"/api/businesses/{biz.id}/transactions"
+
+    for limit in (0, -5):
+        cursor = client.get(f"{base}?limit={limit}&after=", headers=headers)
+        assert cursor.status_code == 200
+        assert len(cursor.get_json()["transactions"]) == 1 and cursor.get_json()["next_cursor"]
+        offset = client.get(f"{base}?limit={limit}", headers=headers)
+        assert offset.status_code == 200
+        assert len(offset.get_json()["transactions"]) == 1
+
+
+def test_fields_projection(client):
+    user, biz, _ = seed_business(n_items=2, days=3)
+    headers = auth_headers(user)
+    base = f"/api/businesses/{biz.id}/transactions?limit=50"
+
+    full = client.get(base, headers=headers).get_json()["transactions"]
+    lean = client.get(base + "&fields=amount,type", headers=headers).get_json()["transactions"]
+    assert set(lean[0]) == {"id", "timestamp", "amount", "type"}
+    assert lean == [{k: t[k] for k in ("id", "timestamp", "amount", "type")} for t in full]
+
+    cursor = client.get(base + "&fields=amount&after=", headers=headers).get_json()
+    assert set(cursor["transactions"][0]) == {"id", "timestamp", "amount"}
+    assert client.get(base + "&fields=amount,password", headers=headers).status_code == 400
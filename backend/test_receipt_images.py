@@ -0,0 +1,71 @@
+import io
+import os
+import time
+
+from flask import current_app
+from PIL import Image
+
+from conftest import seed_business, auth_headers
+import receipts
+import receipt_images
+
+
+def _photo(size=(2400, 1800)):
+    buf = io.BytesIO()
+    Image.new('RGB', size, (200, 120, 40)).save(buf, 'JPEG', quality=95)
+    return buf.getvalue()
+
+
+def _wait_for(path, timeout=10):
+    deadline = time.time() + timeout
+    while not os.path.exists(path):
+        assert time.time() < deadline, f"{path} was not built"
+        time.sleep(0.05)
+
+
+def test_new_receipt_gets_thumbnail_and_viewing_copy(client):
+    user, biz, _ = seed_business(n_items=1, days=1)
+    headers = auth_headers(user)
+    photo = _photo()
+    client.post(f"/api/businesses/{biz.id}/transactions", headers=headers, content_type='multipart/form-data',
+                data={"type": "Expense", "amount": "5", "receipt": (io.BytesIO(photo), "IMG_1234.jpg")})
+    txn = client.get(f"/api/businesses/{biz.id}/transactions?limit=1", headers=headers).get_json()["transactions"][0]
+    sha256 = txn["receipt_url"].split('?')[0][len(receipts.URL_PREFIX):].split('.')[0]
+    assert txn["receipt_thumb_url"].startswith(f"{receipts.URL_PREFIX}{sha256}.thumb.jpg?")
+    assert txn["receipt_view_url"].startswith(f"{receipts.URL_PREFIX}{sha256}.view.jpg?")
+
+    folder = current_app.config['UPLOAD_FOLDER']
+    thumb_path = os.path.join(folder, receipts.variant_relative_path(sha256, 'thumb'))
+    _wait_for(thumb_path)
+    _wait_for(os.path.join(folder, receipts.variant_relative_path(sha256, 'view')))
+
+    thumb = client.get(txn["receipt_thumb_url"])
+    assert thumb.status_code == 200
+    assert max(Image.open(io.BytesIO(thumb.data)).size) == receipt_images.THUMB_EDGE
+    assert len(thumb.data) < len(photo) / 10
+    assert 'immutable' in thumb.headers['Cache-Control']
+    view = Image.open(io.BytesIO(client.get(txn["receipt_view_url"]).data))
+    assert view.size == (receipt_images.VIEW_EDGE, 1200)
+    # The original is left as uploaded
+    assert client.get(txn["receipt_url"]).data == photo
+
+    # Until a variant exists the original is served, cacheable only briefly
+    os.remove(thumb_path)
+    pending = client.get(txn["receipt_thumb_url"])
+    assert pending.data == photo
+    assert 'immutable' not in pending.headers['Cache-Control']
+    assert receipt_images.build_variants(folder, sha256, '.jpg') == 1
+
+
+def test_non_images_and_small_images(tmp_path):
+    sha256 = 'a' * 64
+    folder = str(tmp_path)
+    os.makedirs(os.path.dirname(os.path.join(folder, receipts.relative_path(sha256, '.png'))))
+    Image.new('RGBA', (100, 50), (0, 0, 0, 0)).save(os.path.join(folder, receipts.relative_path(sha256, '.png')))
+
+    assert receipt_images.build_variants(folder, sha256, '.pdf') == 0
+    assert receipt_images.build_variants(folder, sha256, '.png') == 2
+    thumb = Image.open(os.path.join(folder, receipts.variant_relative_path(sha256, 'thumb')))
+    assert thumb.size == (100, 50)  # never upscaled
+    assert thumb.getpixel((0, 0)) == (255, 255, 255)  # transparency flattened onto white
+    assert receipt_images.build_variants(folder, sha256, '.png') == 0
@@ -0,0 +1,63 @@
+import io
+import os
+import time
+
+from conftest import seed_business, auth_headers
+import receipts
+
+PHOTO = b"\x89PNG\r\n\x1a\n" + os.urandom(64 * 1024)
+
+
+def _receipt_url(client, headers, business_id):
+    client.post(f"/api/businesses/{business_id}/transactions", headers=headers, content_type='multipart/form-data',
+                data={"type": "Expense", "amount": "5", "receipt": (io.BytesIO(PHOTO), "scan.png")})
+    listing = client.get(f"/api/businesses/{business_id}/transactions?limit=1", headers=headers).get_json()
+    return listing["transactions"][0]["receipt_url"]
+
+
+def test_signed_receipt_is_cacheable_and_ranged(client):
+    user, biz, _ = seed_business(n_items=1, days=1)
+    url = _receipt_url(client, auth_headers(user), biz.id)
+    assert "sig=" in url
+
+    resp = client.get(url)
+    assert resp.status_code == 200 and resp.data == PHOTO
+    assert resp.mimetype == 'image/png'
+    assert 'immutable' in resp.headers['Cache-Control'] and 'private' in resp.headers['Cache-Control']
+    etag = resp.headers['ETag'].strip('"')
+    assert len(etag) == 64
+
+    assert client.get(url, headers={"If-None-Match": f'"{etag}"'}).status_code == 304
+    part = client.get(url, headers={"Range": "bytes=0-7"})
+    assert part.status_code == 206 and part.data == PHOTO[:8]
+
+
+def test_receipt_requires_signature_or_membership(client):
+    user, biz, _ = seed_business(n_items=1, days=1)
+    outsider, _, _ = seed_business(n_items=1, days=1)
+    url = _receipt_url(client, auth_headers(user), biz.id)
+    bare = url.split('?')[0]
+
+    assert client.get(bare).status_code == 401
+    assert client.get(url.replace("sig=", "sig=0")).status_code == 401
+    assert client.get(bare, headers=auth_headers(user)).status_code == 200
+    assert client.get(bare, headers=auth_headers(outsider)).status_code == 403
+
+    name = bare[len(receipts.URL_PREFIX):]
+    expired = int(time.time()) - 1
+    query = f"bid={biz.id}&exp={expired}&sig={receipts._signature(name, biz.id, expired)}"
+    assert client.get(f"{bare}?{query}").status_code == 401
+
+
+def test_receipt_offloaded_to_proxy(client):
+    user, biz, _ = seed_business(n_items=1, days=1)
+    url = _receipt_url(client, auth_headers(user), biz.id)
+    client.application.config['RECEIPT_SENDFILE'] = 'nginx'
+    try:
+        resp = client.get(url)
+    finally:
+        client.application.config['RECEIPT_SENDFILE'] = ''
+    sha256 = url.split('?')[0][len(receipts.URL_PREFIX):].split('.')[0]
+    assert resp.status_code == 200 and resp.data == b""
+    assert resp.headers['X-Accel-Redirect'] == f"/protected-receipts/{sha256[:2]}/{sha256[2:4]}/{sha256}.png"
+    assert resp.headers['ETag'] == f'"{sha256}"'
@@ -0,0 +1,143 @@
+import io
+import os
+from datetime import timedelta
+
+from flask import current_app
+
+from conftest import seed_business, auth_headers
+from models import db, ReceiptBlob
+import receipts
+
+PHOTO = b"\xff\xd8\xff\xe0" + os.urandom(200 * 1024)
+
+
+def _create(client, headers, business_id, data=PHOTO):
+    resp = client.post(f"/api/businesses/{business_id}/transactions", headers=headers, content_type='multipart/form-data',
+                       data={"type": "Expense", "amount": "5", "receipt": (io.BytesIO(data), "IMG_0001.JPG")})
+    assert resp.status_code == 201
+    return resp.get_json()["id"]
+
+
+def _blob(data=PHOTO):
+    import hashlib
+    db.session.expire_all()
+    return ReceiptBlob.query.filter_by(sha256=hashlib.sha256(data).hexdigest()).first()
+
+
+def test_identical_receipts_are_stored_once(client):
+    user, biz, _ = seed_business(n_items=1, days=1)
+    headers = auth_headers(user)
+    first = _create(client, headers, biz.id)
+    second = _create(client, headers, biz.id)
+
+    blob = _blob()
+    assert blob.refcount == 2 and blob.ext == '.jpg' and blob.size == len(PHOTO)
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], receipts.relative_path(blob.sha256, blob.ext))
+    assert os.path.dirname(path).endswith(os.path.join(blob.sha256[:2], blob.sha256[2:4]))
+    assert open(path, 'rb').read() == PHOTO
+
+    listing = client.get(f"/api/businesses/{biz.id}/transactions?limit=5", headers=headers).get_json()
+    url = next(t["receipt_url"] for t in listing["transactions"] if t["id"] == first)
+    assert client.get(url).data == PHOTO
+
+    # Deleting one transaction keeps the file for the other
+    client.delete(f"/api/businesses/{biz.id}/transactions/{first}", headers=headers)
+    assert _blob().refcount == 1
+    client.delete(f"/api/businesses/{biz.id}/transactions/{second}", headers=headers)
+    assert _blob().refcount == 0
+    assert os.path.exists(path)  # still inside the grace period
+
+    assert receipts.reclaim_orphans(grace=timedelta(0)) == 1
+    assert _blob() is None
+    assert not os.path.exists(path)
+
+
+def test_replacing_a_receipt_releases_the_old_one(client):
+    user, biz, _ = seed_business(n_items=1, days=1)
+    headers = auth_headers(user)
+    txn_id = _create(client, headers, biz.id, data=b"old receipt")
+    resp = client.put(f"/api/businesses/{biz.id}/transactions/{txn_id}", headers=headers,
+                      content_type='multipart/form-data',
+                      data={"amount": "6", "receipt": (io.BytesIO(b"new receipt"), "r.png")})
+    assert resp.status_code == 200
+    assert _blob(b"old receipt").refcount == 0
+    assert _blob(b"new receipt").refcount == 1
+
+
+def _stored_files():
+    folder = current_app.config['UPLOAD_FOLDER']
+    return {os.path.join(root, f) for root, _, files in os.walk(folder) for f in files}
+
+
+def test_rejected_sale_leaves_no_receipt_file(client):
+    user, biz, items = seed_business(n_items=1, days=1)
+    headers = auth_headers(user)
+    before = _stored_files()
+    data = b"receipt for a sale that cannot happen"
+    resp = client.post(f"/api/businesses/{biz.id}/transactions", headers=headers, content_type='multipart/form-data',
+                       data={"type": "Sale", "inventory_item_id": str(items[0].id), "quantity": "100000",
+                             "receipt": (io.BytesIO(data), "r.jpg")})
+    assert resp.status_code == 400
+    assert _blob(data) is None
+    assert _stored_files() == before
+
+
+def test_file_of_rolled_back_store_is_reclaimed_not_deleted(client):
+    from werkzeug.datastructures import FileStorage
+    with current_app.test_request_context():
+        url = receipts.store(FileStorage(io.BytesIO(b"never committed"), "x.jpg"))
+        path = receipts.path_for(url[len(receipts.URL_PREFIX):])
+        db.session.rollback()
+        # Left for reclaim: another upload of the same bytes may still take it
+        assert os.path.exists(path)
+        assert _blob(b"never committed").refcount == 0
+        assert receipts.reclaim_orphans(grace=timedelta(0)) >= 1
+        assert not os.path.exists(path)
+
+        url = receipts.store(FileStorage(io.BytesIO(b"raced"), "x.jpg"))
+        path = receipts.path_for(url[len(receipts.URL_PREFIX):])
+        db.session.rollback()
+        # A second upload of the same content reuses the file and its row
+        assert receipts.store(FileStorage(io.BytesIO(b"raced"), "x.jpg")) == url
+        db.session.commit()
+        assert _blob(b"raced").refcount == 1
+        receipts.reclaim_orphans(grace=timedelta(0))
+        assert os.path.exists(path)
+
+
+def test_interrupted_migration_keeps_every_receipt_reachable(client, monkeypatch):
+    import migrate_receipts
+    from models import Transaction
+    user, biz, _ = seed_business(n_items=1, days=1)
+    folder = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    txns = []
+    for n in range(2):
+        name = f"20240101_00000{n}_legacy{n}.jpg"
+        with open(os.path.join(folder, name), 'wb') as f:
+            f.write(f"legacy receipt {n}".encode())
+        txns.append(Transaction(business_id=biz.id, amount=1, type='Expense', receipt_url=receipts.URL_PREFIX + name))
+    db.session.add_all(txns)
+    db.session.commit()
+    ids = [t.id for t in txns]
+
+    real_acquire, calls = receipts.acquire, []
+    def failing_second(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 2:
+            raise RuntimeError("disk full")
+        return real_acquire(*args, **kwargs)
+    monkeypatch.setattr(receipts, 'acquire', failing_second)
+    migrate_receipts.migrate()
+
+    db.session.expire_all()
+    for txn_id in ids:
+        url = db.session.get(Transaction, txn_id).receipt_url
+        assert os.path.isfile(receipts.path_for(url[len(receipts.URL_PREFIX):])), url
+    assert receipts.parse_name(db.session.get(Transaction, ids[0]).receipt_url[len(receipts.URL_PREFIX):])
+
+    monkeypatch.setattr(receipts, 'acquire', real_acquire)
+    migrate_receipts.migrate()
+    db.session.expire_all()
+    assert all(receipts.parse_name(db.session.get(Transaction, i).receipt_url[len(receipts.URL_PREFIX):]) for i in ids)
+    assert not [f for f in os.listdir(folder) if f.startswith('20240101_')]
@@ -0,0 +1,88 @@
+import time
+from datetime import datetime, timedelta
+
+from conftest import seed_business, auth_headers, capture_statements
+from models import db, Transaction, InventoryItem
+import recompute_jobs
+from test_rollups import _assert_matches_ledger
+
+
+def _wait(client, headers, status_url, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(status_url, headers=headers).get_json()
+        if status["status"] in ("completed", "failed"):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"recompute job did not finish: {status}")
+
+
+def test_cost_correction_recomputes_history(client):
+    user, biz, items = seed_business(n_items=2, days=5)
+    headers = auth_headers(user)
+    item = items[0]
+
+    resp = client.put(f"/api/businesses/{biz.id}/inventory/{item.id}", headers=headers, json={"cost_price": 12})
+    assert resp.status_code == 200
+    status = _wait(client, headers, resp.get_json()["status_url"])
+    assert status["status"] == "completed"
+    assert status["processed_items"] == status["total_items"] == 1
+    assert status["updated_rows"] == 5
+
+    db.session.expire_all()
+    for t in Transaction.query.filter_by(inventory_item_id=item.id):
+        assert (t.cogs, t.profit) == (24.0, t.amount - 24.0)
+    untouched = Transaction.query.filter_by(inventory_item_id=items[1].id).first()
+    assert untouched.cogs == 20.0
+    _assert_matches_ledger(biz.id)
+
+    # Going-forward price change: history is left alone
+    resp = client.put(f"/api/businesses/{biz.id}/inventory/{item.id}", headers=headers,
+                      json={"cost_price": 13, "recompute_history": False})
+    assert "recompute_job_id" not in resp.get_json()
+
+
+def test_recompute_limited_to_date_range(client):
+    user, biz, items = seed_business(n_items=3, days=6)
+    headers = auth_headers(user)
+    for item in items:
+        item.cost_price = 11.0
+    db.session.commit()
+
+    start = (datetime.utcnow() - timedelta(days=1)).date()
+    resp = client.post(f"/api/businesses/{biz.id}/recompute-profit", headers=headers,
+                       json={"start_date": start.isoformat()})
+    assert resp.status_code == 202
+    status = _wait(client, headers, resp.get_json()["status_url"])
+    assert status["total_items"] == 3
+    assert status["updated_rows"] == 3 * 2  # today and yesterday
+
+    db.session.expire_all()
+    recent = Transaction.query.filter(Transaction.business_id == biz.id, Transaction.type == 'Sale',
+                                      Transaction.timestamp >= datetime.combine(start, datetime.min.time()))
+    assert {t.cogs for t in recent} == {22.0}
+    _assert_matches_ledger(biz.id)
+
+    # Nothing left to change on a second run
+    resp = client.post(f"/api/businesses/{biz.id}/recompute-profit", headers=headers,
+                       json={"start_date": start.isoformat()})
+    assert _wait(client, headers, resp.get_json()["status_url"])["updated_rows"] == 0
+    assert client.post(f"/api/businesses/{biz.id}/recompute-profit", headers=headers,
+                       json={"start_date": "yesterday"}).status_code == 400
+
+
+def test_recompute_step_locks_business_before_reading(client):
+    _, biz, items = seed_business(n_items=1, days=3)
+    business_id, item_id = biz.id, items[0].id
+    db.session.get(InventoryItem, item_id).cost_price = 11
+    job = recompute_jobs.create_job(business_id, inventory_item_id=item_id)
+    db.session.commit()
+    job = db.session.get(recompute_jobs.RecomputeJob, job.id)
+
+    updated, statements = capture_statements(lambda: recompute_jobs.recompute_items(job, [item_id]))
+    db.session.commit()
+    assert updated == 3
+    # Concurrent edits of these sales wait on the business row until the step commits
+    first = next(s for s, _ in statements if '"transaction"' in s or 'business SET' in s)
+    assert first.lstrip().upper().startswith('UPDATE BUSINESS'), first
+    _assert_matches_ledger(business_id)
@@ -0,0 +1,118 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from conftest import seed_business, auth_headers
+from models import db, DailySummary, ItemDailySales
+import rollups
+from ai_service import ai_service
+
+
+def _snapshot(business_id):
+    rows = DailySummary.query.filter_by(business_id=business_id).all()
+    items = ItemDailySales.query.filter_by(business_id=business_id).all()
+    return {
+        (r.day, r.type, r.category): (round(r.amount, 2), round(r.cogs, 2), round(r.profit, 2), r.count)
+        for r in rows
+    }, {
+        (r.inventory_item_id, r.day): (r.quantity, round(r.revenue, 2), round(r.profit, 2), r.count)
+        for r in items
+    }
+
+
+def _assert_matches_ledger(business_id):
+    maintained = _snapshot(business_id)
+    rollups.rebuild(business_id)
+    db.session.flush()
+    rebuilt = _snapshot(business_id)
+    db.session.rollback()
+    assert maintained == rebuilt
+
+
+def test_rollup_follows_transaction_writes(client):
+    user, biz, items = seed_business(n_items=2, days=3)
+    headers = auth_headers(user)
+    url = f"/api/businesses/{biz.id}/transactions"
+
+    resp = client.post(url, headers=headers, json={
+        "type": "Sale", "inventory_item_id": items[0].id, "quantity": 3,
+        "category": "Produce", "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M")
+    })
+    assert resp.status_code == 201
+    txn_id = resp.get_json()["id"]
+    _assert_matches_ledger(biz.id)
+
+    # Move it to another day and category
+    resp = client.put(f"{url}/{txn_id}", headers=headers, json={
+        "timestamp": "2024-02-03", "category": "Bakery", "quantity": 1
+    })
+    assert resp.status_code == 200
+    _assert_matches_ledger(biz.id)
+    assert DailySummary.query.filter_by(business_id=biz.id, category="Bakery").count() == 1
+
+    resp = client.delete(f"{url}/{txn_id}", headers=headers)
+    assert resp.status_code == 200
+    _assert_matches_ledger(biz.id)
+    assert DailySummary.query.filter_by(business_id=biz.id, category="Bakery").count() == 0
+
+
+def test_pnl_reads_rollup(client):
+    user, biz, _ = seed_business(n_items=2, days=10)
+    resp = client.get(f"/api/businesses/{biz.id}/ai/pnl?granularity=daily", headers=auth_headers(user))
+    assert resp.status_code == 200
+    rows = resp.get_json()
+    assert sum(r["sales"] for r in rows) > 0
+    totals = rollups.period_totals(biz.id)
+    assert round(sum(r["sales"] for r in rows), 2) <= round(totals["sales"], 2)
+
+
+def test_item_sales_is_dense_per_item(app):
+    user, biz, items = seed_business(n_items=3, days=10)
+    sales = rollups.item_sales(biz.id, [i.id for i in items], days=30)
+    assert sales["quantity"].shape == (3, 30)
+    # seed_business sells 2 units of every item on each of the last 10 days
+    assert sales["quantity"][:, -10:].sum() == 3 * 10 * 2
+    assert sales["quantity"][:, :-11].sum() == 0
+    assert list(sales["volume"]) == [20, 20, 20]
+
+
+
+def test_demand_forecast_averages_selling_days():
+    # Sold 4, 2 and 6 units on days 2, 4 and 6 of the window; zero days don't dilute velocity
+    forecast = ai_service.get_demand_forecast([0, 0, 4, 0, 2, 0, 6, 0])
+    assert forecast["velocity"] == 4.0
+    trend = np.poly1d(np.polyfit([0, 2, 4], [4, 2, 6], 1))
+    assert forecast["7_day"] == round(float(sum(trend(4 + i) for i in range(1, 8))), 2)
+
+    single = ai_service.get_demand_forecast([0, 3, 0, 0])
+    assert (single["velocity"], single["30_day"]) == (3.0, 90.0)
+    assert ai_service.get_demand_forecast([0, 0])["velocity"] == 0
+
+
+def test_concurrent_writes_to_one_bucket_add_up(app):
+    # Runs on the file-backed SQLite test database, or on Postgres via TEST_DATABASE_URL
+    user, biz, _ = seed_business(n_items=1, days=1)
+    headers = auth_headers(user)
+    url = f"/api/businesses/{biz.id}/transactions"
+    payload = {"type": "Expense", "amount": 3, "category": "Packaging", "timestamp": "2026-02-01"}
+    start = threading.Barrier(8)
+
+    def terminal(n):
+        client = app.test_client()
+        start.wait()
+        ids = [json.loads(client.post(url, json=payload, headers=headers).data)["id"]
+               for _ in range(12)]
+        # Every other entry is deleted again while the other terminals are still writing
+        return [client.delete(f"{url}/{i}", headers=headers).status_code
+                for i in ids[::2]]
+
+    with ThreadPoolExecutor(8) as pool:
+        statuses = [code for codes in pool.map(terminal, range(8)) for code in codes]
+    assert statuses == [200] * 48
+
+    db.session.expire_all()
+    bucket = DailySummary.query.filter_by(business_id=biz.id, category="Packaging").one()
+    assert (bucket.count, bucket.amount) == (48, 3 * 48)
@@ -0,0 +1,59 @@
+import threading
+from collections import Counter
+
+from conftest import seed_business, auth_headers
+from models import db, InventoryItem, Transaction
+
+# Runs against the file-backed SQLite test database by default; set TEST_DATABASE_URL
+# to a local Postgres to exercise row locking there.
+THREADS = 8
+SALES_PER_THREAD = 12
+
+
+def _hammer(app, url, headers, payload):
+    statuses = Counter()
+    lock = threading.Lock()
+    start = threading.Barrier(THREADS)
+
+    def terminal():
+        client = app.test_client()
+        start.wait()
+        for _ in range(SALES_PER_THREAD):
+            code = client.post(url, json=payload, headers=headers).status_code
+            with lock:
+                statuses[code] += 1
+
+    threads = [threading.Thread(target=terminal) for _ in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return statuses
+
+
+def test_concurrent_sales_never_oversell(app):
+    user, biz, items = seed_business(n_items=1, days=1)
+    item_id = items[0].id  # 50 in stock, 1 seeded sale of 2 (stock untouched by the seed)
+    statuses = _hammer(app, f"/api/businesses/{biz.id}/transactions", auth_headers(user),
+                       {"type": "Sale", "inventory_item_id": item_id, "quantity": 1})
+
+    assert statuses[201] == 50
+    assert statuses[400] == THREADS * SALES_PER_THREAD - 50
+    db.session.expire_all()
+    assert db.session.get(InventoryItem, item_id).stock_quantity == 0
+    assert Transaction.query.filter_by(inventory_item_id=item_id).count() == 1 + 50
+
+
+def test_concurrent_batches_never_oversell(app):
+    user, biz, items = seed_business(n_items=1, days=1)
+    item_id = items[0].id
+    statuses = _hammer(app, f"/api/businesses/{biz.id}/transactions/batch", auth_headers(user),
+                       {"mode": "best_effort", "transactions": [
+                           {"type": "Sale", "inventory_item_id": item_id, "quantity": 1}] * 3})
+
+    db.session.expire_all()
+    stock_left = db.session.get(InventoryItem, item_id).stock_quantity
+    sold = Transaction.query.filter_by(inventory_item_id=item_id).count() - 1
+    assert stock_left >= 0
+    assert sold == 50 - stock_left
+    assert set(statuses) <= {201, 207}
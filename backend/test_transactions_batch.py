@@ -0,0 +1,70 @@
+from conftest import seed_business, auth_headers
+from models import db, InventoryItem, Transaction
+import rollups
+
+
+def _totals(biz_id):
+    return rollups.period_totals(biz_id)
+
+
+def test_batch_applies_stock_profit_and_rollup(client):
+    user, biz, items = seed_business(n_items=2, days=2)
+    before = _totals(biz.id)
+    item = items[0]
+    batch = [
+        {"type": "Sale", "inventory_item_id": item.id, "quantity": 3, "timestamp": "2026-01-05T10:00:00"},
+        {"type": "Sale", "inventory_item_id": item.id, "quantity": 2, "amount": 40, "category": "Produce"},
+        {"type": "Expense", "amount": 12.5, "category": "Supplies"},
+    ]
+    resp = client.post(f"/api/businesses/{biz.id}/transactions/batch",
+                       json={"transactions": batch}, headers=auth_headers(user))
+    assert resp.status_code == 201
+    body = resp.get_json()
+    assert body["created"] == 3 and body["rejected"] == 0
+    ids = [r["id"] for r in body["results"]]
+
+    db.session.expire_all()
+    assert db.session.get(InventoryItem, item.id).stock_quantity == 50 - 5
+    first, second, expense = (db.session.get(Transaction, i) for i in ids)
+    assert (first.amount, first.cogs, first.profit) == (45.0, 30.0, 15.0)
+    assert (second.amount, second.cogs, second.profit) == (40.0, 20.0, 20.0)
+    assert expense.profit == -12.5
+
+    after = _totals(biz.id)
+    assert after["count"] == before["count"] + 3
+    assert round(after["profit"] - before["profit"], 2) == 15.0 + 20.0 - 12.5
+
+
+def test_atomic_batch_rolls_back_on_any_rejection(client):
+    user, biz, items = seed_business(n_items=1, days=1)
+    batch = [
+        {"type": "Sale", "inventory_item_id": items[0].id, "quantity": 30},
+        {"type": "Sale", "inventory_item_id": items[0].id, "quantity": 30},  # only 20 left
+    ]
+    resp = client.post(f"/api/businesses/{biz.id}/transactions/batch",
+                       json={"transactions": batch}, headers=auth_headers(user))
+    assert resp.status_code == 400
+    assert [r["index"] for r in resp.get_json()["results"]] == [1]
+
+    db.session.expire_all()
+    assert db.session.get(InventoryItem, items[0].id).stock_quantity == 50
+    assert Transaction.query.filter_by(business_id=biz.id).count() == 2  # seeded sale + expense
+
+
+def test_best_effort_batch_keeps_valid_entries(client):
+    user, biz, items = seed_business(n_items=1, days=1)
+    _, other_biz, other_items = seed_business(n_items=1, days=1)
+    batch = [
+        {"type": "Sale", "inventory_item_id": items[0].id, "quantity": 4},
+        {"type": "Sale", "inventory_item_id": other_items[0].id, "quantity": 1},
+        {"type": "Refund", "amount": 5},
+    ]
+    resp = client.post(f"/api/businesses/{biz.id}/transactions/batch",
+                       json={"transactions": batch, "mode": "best_effort"}, headers=auth_headers(user))
+    assert resp.status_code == 207
+    results = resp.get_json()["results"]
+    assert [r["status"] for r in results] == ["created", "rejected", "rejected"]
+
+    db.session.expire_all()
+    assert db.session.get(InventoryItem, items[0].id).stock_quantity == 46
+    assert db.session.get(InventoryItem, other_items[0].id).stock_quantity == 50
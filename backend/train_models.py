@@ -0,0 +1,35 @@
+import sys
+import model_registry
+from ai_service import CLASSIFIER_TRAINING_DATA, CLASSIFIER_VERSION, fit_expense_classifier
+
+# Build (or confirm) the saved model artefacts ahead of time, e.g. as a deploy step,
+# so no web worker ever fits a model. Only retrains when the training data,
+# the model version or the sklearn version changed.
+# With --businesses, also brings every shop's own classifier up to date.
+# Usage: python train_models.py [--businesses]
+
+def train():
+    before = model_registry.read_manifest('expense_classifier')
+    model_registry.get_or_train('expense_classifier', CLASSIFIER_TRAINING_DATA, fit_expense_classifier,
+                                version=CLASSIFIER_VERSION)
+    after = model_registry.read_manifest('expense_classifier')
+    state = "up to date" if before == after else "trained"
+    print(f"expense_classifier {state}: {after['artifact']} in {model_registry.MODEL_DIR}")
+
+def train_businesses():
+    from app import app, db
+    from models import Business
+    import business_classifier
+    with app.app_context():
+        for (business_id,) in db.session.query(Business.id).order_by(Business.id):
+            try:
+                model = business_classifier.train(business_id)
+                print(f"business {business_id}: {model['samples'] if model else 0} samples")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error training business {business_id}: {str(e)}")
+
+if __name__ == "__main__":
+    train()
+    if '--businesses' in sys.argv[1:]:
+        train_businesses()
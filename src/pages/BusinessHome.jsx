@@ -264,6 +264,23 @@ const BusinessHome = () => {
     const [showExportModal, setShowExportModal] = useState(false);
 
     // Import Functionality
+    // Imports run as background jobs on the server: poll the job until it finishes
+    const waitForImportJob = async (jobId, toastId) => {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            const response = await fetch(`${API_URL}/businesses/${id}/import-jobs/${jobId}`, {
+                headers: { 'Authorization': `Bearer ${token}` }
+            });
+            const job = await response.json();
+            if (!response.ok) throw new Error(job.message || 'Import status unavailable');
+            if (job.status === 'completed' || job.status === 'failed') return job;
+            toast.loading(`Importing transactions... ${job.processed}/${job.total_rows}`, { id: toastId });
+        }
+    };
+
+    const importSummary = (job) =>
+        `Imported ${job.imported} transactions` + (job.rejected ? ` (${job.rejected} rows rejected)` : '');
+
     const handleImportCSV = async (e) => {
         const file = e.target.files[0];
         if (!file) return;
@@ -285,7 +302,12 @@ const BusinessHome = () => {
             const data = await response.json();
 
             if (response.ok) {
-                toast.success(data.message, { id: toastId });
+                const job = await waitForImportJob(data.job_id, toastId);
+                if (job.status === 'completed') {
+                    toast.success(importSummary(job), { id: toastId });
+                } else {
+                    toast.error(job.message || "Import failed", { id: toastId });
+                }
                 fetchTransactions(); // Refresh data
             } else {
                 toast.error(data.message || "Import failed", { id: toastId });
@@ -319,7 +341,12 @@ const BusinessHome = () => {
             const data = await response.json();
 
             if (response.ok) {
-                toast.success(data.message, { id: toastId });
+                const job = await waitForImportJob(data.job_id, toastId);
+                if (job.status === 'completed') {
+                    toast.success(importSummary(job), { id: toastId });
+                } else {
+                    toast.error(job.message || 'Import failed', { id: toastId });
+                }
                 // Refresh data
                 fetchTransactions();
                 fetchAiData();
@@ -353,7 +380,12 @@ const BusinessHome = () => {
 
             const data = await response.json();
             if (response.ok) {
-                toast.success(`Imported ${data.count} transactions!`, { id: toastId });
+                const job = await waitForImportJob(data.job_id, toastId);
+                if (job.status === 'completed') {
+                    toast.success(importSummary(job), { id: toastId });
+                } else {
+                    toast.error(job.message || 'Import failed', { id: toastId });
+                }
                 fetchTransactions();
                 // Also refresh AI stats if possible
             } else {
@@ -1419,7 +1451,7 @@ const BusinessHome = () => {
                                             <div className="relative">
                                                 <input
                                                     type="file"
-                                                    accept=".csv"
+                                                    accept=".csv,.gz,.xlsx,.parquet"
                                                     ref={importInputRef}
                                                     onChange={handleImportCSV}
                                                     className="hidden"
@@ -1468,7 +1500,10 @@ const BusinessHome = () => {
                                                                 {new Date(txn.timestamp).toLocaleDateString()} • {txn.category}
                                                                 {txn.receipt_url && (
                                                                     <div className="flex items-center ml-4 space-x-3">
-                                                                        <a href={`http://localhost:5000${txn.receipt_url}`} target="_blank" rel="noreferrer" className="text-primary-400 hover:underline">View</a>
+                                                                        {txn.receipt_thumb_url && (
+                                                                            <img src={`http://localhost:5000${txn.receipt_thumb_url}`} alt="Receipt" loading="lazy" className="w-8 h-8 rounded object-cover" />
+                                                                        )}
+                                                                        <a href={`http://localhost:5000${txn.receipt_view_url || txn.receipt_url}`} target="_blank" rel="noreferrer" className="text-primary-400 hover:underline">View</a>
                                                                         <span className="text-slate-700">|</span>
                                                                         <a href={`http://localhost:5000${txn.receipt_url}`} download className="text-primary-400 hover:underline">Download</a>
                                                                     </div>